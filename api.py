@@ -0,0 +1,349 @@
+import argparse
+import asyncio
+import json
+import math
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import numpy as np
+import pandas as pd
+
+import data_helper
+from data_generator import BOOKING_STATUSES
+from jobs import enqueue
+from ledger import booking_transition_allowed
+from ranking import SORT_WEIGHTS
+from risk import load_risk_scores
+
+# Headless JSON/HTTP API over the data_helper operations, for integrations and
+# load tests that should not drive the Streamlit UI.
+#
+# The server is a small HTTP/1.1 implementation on asyncio streams (keep-alive,
+# Content-Length bodies, JSON in and out). Storage calls are blocking pandas/CSV
+# work, so they run on a bounded thread pool shared by every connection; all
+# requests reuse the same cached tables and catalog. POST /batch runs up to
+# MAX_BATCH sub-requests concurrently and returns their results in order.
+#
+#   GET  /tools/<id>
+#   GET  /users/<username>/tools
+#   GET  /search?city=&tool_type=&neighborhood=&max_price=&near=&max_km=&sort_by=&limit=
+#   POST /bookings                  {"tool_id", "renter_username", "start_date", "end_date"}
+#   POST /bookings/<id>/status      {"status"}   (queued; returns 202 and a job id)
+#   POST /batch                     {"requests": [{"method", "path", "body"}, ...]}
+#
+# Sub-requests of a batch can't be batches themselves, and a sub-request that
+# fails only fails its own result.
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+STORAGE_WORKERS = 4
+MAX_BODY_BYTES = 1 << 20
+MAX_BATCH = 100
+MAX_SEARCH_RESULTS = 100
+
+REASONS = {200: "OK", 201: "Created", 202: "Accepted", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class ApiError(Exception):
+    """An error returned to the client as {"error": message} with an HTTP status.
+
+    close=True ends the connection after the response (the body was not read).
+    """
+
+    def __init__(self, status, message, close=False):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.close = close
+
+
+def _records(df):
+    """Convert a DataFrame to JSON-safe records (NaN becomes null)"""
+    # astype(object) would widen float32 to 70.30000305175781; go through the
+    # short repr first, as _clean does for single values
+    df = df.assign(**{column: df[column].astype(str).astype(np.float64)
+                      for column in df.columns if df[column].dtype == np.float32})
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def _clean(value):
+    # json can't encode NaN; float32 values go through str() for a short repr
+    if isinstance(value, dict):
+        return {k: _clean(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_clean(v) for v in value]
+    if isinstance(value, np.floating):
+        value = float(str(value))
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def _query_float(query, name):
+    if name not in query:
+        return None
+    try:
+        value = float(query[name])
+    except ValueError:
+        raise ApiError(400, f"{name} must be a number")
+    if not math.isfinite(value):
+        raise ApiError(400, f"{name} must be a finite number")
+    return value
+
+
+def _query_int(query, name, default):
+    if name not in query:
+        return default
+    try:
+        return int(query[name])
+    except ValueError:
+        raise ApiError(400, f"{name} must be an integer")
+
+
+def _parse_date(value, name):
+    try:
+        return datetime.strptime(str(value), "%Y-%m-%d").date()
+    except ValueError:
+        raise ApiError(400, f"{name} must be a YYYY-MM-DD date")
+
+
+# Endpoint implementations (run on the storage thread pool)
+def get_tool(tool_id):
+    tool = data_helper.get_tool_details(int(tool_id))
+    if tool is None:
+        raise ApiError(404, f"Tool {tool_id} not found")
+    return 200, tool
+
+
+def get_user_tools(username):
+    return 200, _records(data_helper.get_user_tools(unquote(username)))
+
+
+def search(query):
+    limit = _query_int(query, "limit", 20)
+    if not 1 <= limit <= MAX_SEARCH_RESULTS:
+        raise ApiError(400, f"limit must be between 1 and {MAX_SEARCH_RESULTS}")
+    sort_by = query.get("sort_by", "Best Match")
+    if sort_by not in SORT_WEIGHTS:
+        raise ApiError(400, f"sort_by must be one of {sorted(SORT_WEIGHTS)}")
+    try:
+        return 200, data_helper.search_tools(
+            tool_type=query.get("tool_type"),
+            neighborhood=query.get("neighborhood"),
+            max_price=_query_float(query, "max_price"),
+            near=query.get("near"),
+            max_km=_query_float(query, "max_km"),
+            sort_by=sort_by,
+            limit=limit,
+            city=query.get("city")
+        )
+    except ValueError as e:  # unknown city or `near` neighborhood
+        raise ApiError(400, str(e))
+
+
+def create_booking(body):
+    missing = [k for k in ("tool_id", "renter_username", "start_date", "end_date") if k not in body]
+    if missing:
+        raise ApiError(400, f"Missing fields: {', '.join(missing)}")
+
+    try:
+        tool_id = int(body["tool_id"])
+    except (TypeError, ValueError):
+        raise ApiError(400, "tool_id must be an integer")
+    start_date = _parse_date(body["start_date"], "start_date")
+    end_date = _parse_date(body["end_date"], "end_date")
+    if end_date < start_date:
+        raise ApiError(400, "end_date must not be before start_date")
+    tool = data_helper.get_tool(tool_id)
+    if tool is None:
+        raise ApiError(404, f"Tool {body['tool_id']} not found")
+    renter = str(body["renter_username"])
+    if data_helper.get_user(renter) is None:
+        raise ApiError(404, f"User {renter} not found")
+
+    cost = data_helper.calculate_booking_cost(tool_id, start_date, end_date)
+    # Same risk-scaled deposit as the booking form
+    deposit = load_risk_scores().suggested_deposit(renter, tool)
+    booking_id = data_helper.create_booking({
+        "tool_id": tool_id,
+        "renter_username": renter,
+        "start_date": start_date.strftime("%Y-%m-%d"),
+        "end_date": end_date.strftime("%Y-%m-%d"),
+        "total_cost": cost["total_cost"],
+        "deposit": deposit,
+        "status": "Pending"
+    })
+    enqueue("booking_event", booking_id=booking_id, event="Requested")
+    return 201, {"id": booking_id, **cost, "deposit": deposit}
+
+
+def update_booking_status(booking_id, body):
+    status = body.get("status")
+    if status not in BOOKING_STATUSES:
+        raise ApiError(400, f"status must be one of {BOOKING_STATUSES}")
+    booking = data_helper.get_booking(int(booking_id))
+    if booking is None:
+        raise ApiError(404, f"Booking {booking_id} not found")
+    if not booking_transition_allowed(booking["status"], status):
+        # Other changes would skip the ledger postings of the steps in between
+        raise ApiError(409, f"Booking {booking_id} can't go from {booking['status']} to {status}")
+    job_id = enqueue("booking_status", booking_id=int(booking_id), status=status)
+    return 202, {"booking_id": int(booking_id), "status": status, "job_id": job_id}
+
+
+ROUTES = [
+    ("GET", re.compile(r"/tools/(\d+)"), lambda m, q, b: get_tool(m.group(1))),
+    ("GET", re.compile(r"/users/([^/]+)/tools"), lambda m, q, b: get_user_tools(m.group(1))),
+    ("GET", re.compile(r"/search"), lambda m, q, b: search(q)),
+    ("POST", re.compile(r"/bookings"), lambda m, q, b: create_booking(b)),
+    ("POST", re.compile(r"/bookings/(\d+)/status"), lambda m, q, b: update_booking_status(m.group(1), b)),
+]
+
+
+class ApiServer:
+    """asyncio HTTP server dispatching to the endpoint functions above"""
+
+    def __init__(self, storage_workers=STORAGE_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=storage_workers, thread_name_prefix="api-storage")
+
+    async def dispatch(self, method, target, body):
+        """Route one request and return (status, payload)"""
+        url = urlsplit(target)
+        if body is not None and not isinstance(body, dict):
+            raise ApiError(400, "Body must be a JSON object")
+
+        if url.path == "/batch":
+            if method != "POST":
+                raise ApiError(405, "Use POST for /batch")
+            return 200, await self.batch(body)
+
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        path_matched = False
+        for route_method, pattern, handler in ROUTES:
+            match = pattern.fullmatch(url.path)
+            if match is None:
+                continue
+            path_matched = True
+            if route_method == method:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._pool, handler, match, query, body or {})
+        if path_matched:
+            raise ApiError(405, f"{method} not allowed on {url.path}")
+        raise ApiError(404, f"No route for {url.path}")
+
+    async def batch(self, body):
+        requests = (body or {}).get("requests")
+        if not isinstance(requests, list) or not requests:
+            raise ApiError(400, "Body must be {\"requests\": [...]}")
+        if len(requests) > MAX_BATCH:
+            raise ApiError(400, f"At most {MAX_BATCH} requests per batch")
+
+        async def run(request):
+            try:
+                if not isinstance(request, dict):
+                    raise ApiError(400, "Each request must be a JSON object")
+                path = str(request.get("path", ""))
+                if urlsplit(path).path == "/batch":
+                    # Nested batches would get around MAX_BATCH
+                    raise ApiError(400, "Batches can't be nested")
+                status, payload = await self.dispatch(
+                    str(request.get("method", "GET")).upper(), path, request.get("body")
+                )
+            except ApiError as e:
+                status, payload = e.status, {"error": e.message}
+            except Exception as e:
+                status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+            return {"status": status, "body": payload}
+
+        return await asyncio.gather(*(run(r) for r in requests))
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                status, payload, close = await self._respond(method, target, headers, reader)
+                keep_alive = keep_alive and not close
+
+                data = json.dumps(_clean(payload), default=_json_default).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionResetError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, method, target, headers, reader):
+        try:
+            try:
+                length = int(headers.get("content-length", 0))
+            except ValueError:
+                raise ApiError(400, "Content-Length must be an integer", close=True)
+            if length < 0:
+                raise ApiError(400, "Content-Length must not be negative", close=True)
+            if length > MAX_BODY_BYTES:
+                raise ApiError(413, "Request body too large", close=True)
+            body = None
+            if length:
+                try:
+                    body = json.loads(await reader.readexactly(length))
+                except json.JSONDecodeError:
+                    raise ApiError(400, "Body must be JSON")
+            return (*await self.dispatch(method, target, body), False)
+        except ApiError as e:
+            return e.status, {"error": e.message}, e.close
+        except Exception as e:
+            return 500, {"error": f"{type(e).__name__}: {e}"}, False
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"ToolShare API listening on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the ToolShare JSON/HTTP API")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--storage-workers", type=int, default=STORAGE_WORKERS)
+    args = parser.parse_args()
+
+    asyncio.run(ApiServer(args.storage_workers).serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,62 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import pandas as pd
 import numpy as np
-import folium
-from streamlit_folium import folium_static
-import plotly.express as px
 from datetime import datetime, timedelta
 import os
-from PIL import Image
-import re
 import random
 import json
 import base64
-from PIL import Image
-
-def load_image_safe(path):
-    """Safely load an image, with multiple fallback images"""
+import io
+import html
+from data_helper import MAX_CACHED_SEARCHES, find_tools
+from data_store import (
+    load_tool_data, load_tool_catalog, load_catalog_facets, get_booking, get_tool, get_user,
+    add_tool_listing, update_tool_availability, create_booking,
+    create_tool_swap_request, update_swap_status, random_location, load_ledger
+)
+from instrumentation import span, timed, render_metrics_panel
+from recommendations import load_recommendations
+from pricing import load_price_suggestions
+from risk import load_risk_scores
+from reviews import load_review_store, tool_rating
+from ui_components import render_tool_reviews
+from jobs import enqueue, load_job_queue
+from notifications import load_inbox
+from ranking import MAX_SEARCH_KM, SORT_WEIGHTS
+from shards import DEFAULT_CITY, load_router
+from user_views import load_user_views
+from tool_markup import map_popups, tool_markup, tool_markup_for_ids
+
+# Images are sent as JPEG thumbnails no wider than this (or the requested width)
+IMAGE_MAX_WIDTH = 800
+MAX_CACHED_IMAGES = 512
+
+
+@st.cache_resource(max_entries=MAX_CACHED_IMAGES, show_spinner=False)
+def _image_bytes(path, width):
+    # Pre-sized JPEG bytes pass through st.image untouched, so reruns don't
+    # decode, resize and re-encode every (often multi-megapixel) photo
+    from PIL import Image
+
+    with Image.open(path) as image:
+        image = image.convert("RGB")
+        if image.width > width:
+            image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+@timed("load_image")
+def load_image_safe(path, width=IMAGE_MAX_WIDTH):
+    """Safely load an image as JPEG bytes, with multiple fallback images"""
     try:
         # List of all available image filenames
         available_images = [
             "chainsawnew.jpg",
             "generatornew.jpg",
-            "hdgetrimmernew.jpg",
+            "hdegetrimmernew.jpg",
             "jigsawnew.jpg",
             "laddernew.jpg",
             "lawnmower.jpg",
@@ -39,12 +75,12 @@ def load_image_safe(path):
             # Randomly select an alternative image
             path = os.path.join("images", random.choice(available_images))
         
-        return Image.open(path)
+        return _image_bytes(path, width)
     except Exception as e:
         # If loading fails, randomly select another image
         print(f"Error loading image {path}: {e}")
         alternative_image = random.choice(available_images)
-        return Image.open(os.path.join("images", alternative_image))
+        return _image_bytes(os.path.join("images", alternative_image), width)
     
 # Configure the Streamlit page
 st.set_page_config(
@@ -65,240 +101,9 @@ if 'page' not in st.session_state:
     st.session_state.page = 'home'
 
 
-# Tool type to image mapping
-def get_tool_image_url(tool_type):
-    """Return local image path based on tool type with specific matching"""
-    image_map = {
-        "Power Drill": "powerdrillsnew.jpg",
-        "Circular Saw": "chainsawnew.jpg",  # Matching the chainsaw-like image
-        "Lawn Mower": "laddernew.jpg",  # Matching the outdoor tool image
-        "Pressure Washer": "paintsprayernew.jpg",  # Matching the paint sprayer-like image
-        "Leaf Blower": "routertoolnew.jpg",  # Alternative tool image
-        "Hedge Trimmer": "rotaryhammernew.jpg",  # Alternative tool image
-        "Ladder": "laddernew.jpg",  # Matching the ladder-like image
-        "Chain Saw": "chainsawnew.jpg",  # Chainsaw image
-        "Sander": "sandernew.jpg",  # Matching the sander image
-        "Nail Gun": "generatornew.jpg",  # Alternative tool image
-        "Air Compressor": "aircompressor.jpg",
-        "Generator": "generatornew.jpg",
-        "Router": "routertoolnew.jpg",
-        "Planer": "planernew.jpg",
-        "Jigsaw": "jigsawnew.jpg",
-        "Rotary Hammer": "rotaryhammernew.jpg",
-        "Tile Cutter": "tilercutternew.jpg",
-        "Paint Sprayer": "paintsprayernew.jpg"
-    }
-
-    # List of all available images
-    available_images = [
-        "aircompressor.jpg",
-        "chainsawnew.jpg",
-        "circularsawnew.jpg",
-        "generatornew.jpg",
-        "hdgetrimmernew.jpg",
-        "jigsawnew.jpg",
-        "laddernew.jpg",
-        "lawnmower.jpg",
-        "leafblowernew.jpg",
-        "nailgunnew.jpg",
-        "paintsprayernew.jpg",
-        "planernew.jpg",
-        "powerdrillsnew.jpg",
-        "pressurewashernew.jpg",
-        "rotaryhammernew.jpg",
-        "routertoolnew.jpg",
-        "sandernew.jpg",
-        "tilercutternew.jpg"
-    ]
-
-    # Try to get the specific image for the tool type
-    filename = image_map.get(tool_type)
-    
-    # If no specific image found, randomly select from available images
-    if not filename or not os.path.exists(os.path.join("images", filename)):
-        filename = random.choice(available_images)
-    
-    # Construct full path
-    full_path = os.path.join("images", filename)
-    
-    return full_path
-
-    # Try to get the specific image for the tool type
-    filename = image_map.get(tool_type)
-    
-    # If no specific image found, randomly select from available images
-    if not filename or not os.path.exists(os.path.join("images", filename)):
-        filename = random.choice(available_images)
-    
-    # Construct full path
-    full_path = os.path.join("images", filename)
-    
-    return full_path
-
-# Function to load data (mock data for the hackathon)
-@st.cache_data
-def load_tool_data():
-    # Check if data file exists, otherwise create mock data
-    if os.path.exists('data/tools.csv'):
-        df = pd.read_csv('data/tools.csv')
-
-        # Add image_url column if it doesn't exist
-        if 'image_url' not in df.columns:
-            df['image_url'] = df.apply(lambda row: get_tool_image_url(row['tool_type']), axis=1)
-            df.to_csv('data/tools.csv', index=False)
-
-        return df
-    else:
-        # Create directory if it doesn't exist
-        os.makedirs('data', exist_ok=True)
-
-        # Create mock data
-        tool_types = [
-            "Power Drill", "Circular Saw", "Lawn Mower", "Pressure Washer",
-            "Hedge Trimmer", "Ladder", "Chain Saw", "Sander", "Nail Gun",
-            "Air Compressor", "Generator", "Router", "Planer", "Jigsaw",
-            "Rotary Hammer", "Tile Cutter", "Paint Sprayer", "Leaf Blower"
-        ]
-
-        brands = [
-            "DeWalt", "Makita", "Milwaukee", "Bosch", "Ryobi", "Black & Decker",
-            "Craftsman", "Ridgid", "Festool", "Hitachi", "Porter-Cable", "Kobalt"
-        ]
-
-        conditions = ["Like New", "Good", "Fair", "Well Used but Functional"]
-
-        # Generate 50 mock tools
-        mock_data = []
-
-        # Define a fixed set of neighborhoods with coordinates for the demo
-        neighborhoods = {
-            "Downtown": (40.7128, -74.0060),
-            "Midtown": (40.7549, -73.9840),
-            "Uptown": (40.8075, -73.9626),
-            "Brooklyn Heights": (40.6950, -73.9950),
-            "Williamsburg": (40.7081, -73.9571),
-            "Astoria": (40.7636, -73.9232),
-            "Park Slope": (40.6710, -73.9814),
-            "Long Island City": (40.7447, -73.9485)
-        }
-
-        # Mock user data
-        users = [
-            {"username": "john_diy", "name": "John Smith", "email": "john@example.com"},
-            {"username": "sarah_maker", "name": "Sarah Johnson", "email": "sarah@example.com"},
-            {"username": "mike_build", "name": "Mike Chen", "email": "mike@example.com"},
-            {"username": "lisa_craft", "name": "Lisa Rodriguez", "email": "lisa@example.com"},
-            {"username": "david_tools", "name": "David Wilson", "email": "david@example.com"},
-            {"username": "emma_fix", "name": "Emma Brown", "email": "emma@example.com"},
-            {"username": "demo_user", "name": "Demo User", "email": "demo@toolshare.com"}
-        ]
-
-        for i in range(50):
-            neighborhood = random.choice(list(neighborhoods.keys()))
-            lat, lon = neighborhoods[neighborhood]
-            # Add small random variation to lat/lon to spread tools out
-            lat += random.uniform(-0.01, 0.01)
-            lon += random.uniform(-0.01, 0.01)
-
-            owner = random.choice(users)
-
-            tool_type = random.choice(tool_types)
-            brand = random.choice(brands)
-
-            # Get image URL for the tool type
-            image_url = get_tool_image_url(tool_type)
-
-            # Create a title that combines brand and tool type
-            title = f"{brand} {tool_type}"
-
-            # Create a more detailed description
-            descriptions = [
-                f"Great {tool_type} for home projects. Well maintained and ready to use.",
-                f"Professional grade {tool_type}. Perfect for serious DIYers.",
-                f"Reliable {tool_type} that gets the job done. Easy to use.",
-                f"High-quality {brand} {tool_type}. Powerful and efficient.",
-                f"Versatile {tool_type} suitable for various applications."
-            ]
-
-            hourly_rate = round(random.uniform(5, 25), 2)
-            daily_rate = round(hourly_rate * 5, 2)  # Daily rate is approximately 5x hourly
-
-            # Some tools will have a security deposit
-            deposit = round(random.uniform(20, 100), 2) if random.random() > 0.3 else 0
-
-            # Generate random ratings with a bias toward positive reviews
-            rating = round(random.uniform(3, 5), 1)
-            review_count = random.randint(0, 25)
-
-            mock_data.append({
-                "id": i + 1,
-                "title": title,
-                "description": random.choice(descriptions),
-                "tool_type": tool_type,
-                "brand": brand,
-                "condition": random.choice(conditions),
-                "hourly_rate": hourly_rate,
-                "daily_rate": daily_rate,
-                "deposit": deposit,
-                "owner_username": owner["username"],
-                "owner_name": owner["name"],
-                "neighborhood": neighborhood,
-                "latitude": lat,
-                "longitude": lon,
-                "rating": rating,
-                "review_count": review_count,
-                "available": random.random() > 0.2,  # 80% of tools are available
-                "image_url": image_url  # Add image URL to the data
-            })
-
-        # Convert to DataFrame and save
-        df = pd.DataFrame(mock_data)
-        # Create the directory for storing images
-        os.makedirs('images', exist_ok=True)
-
-        # Save to CSV
-        df.to_csv('data/tools.csv', index=False)
-
-        # Also save users data
-        users_df = pd.DataFrame(users)
-        users_df.to_csv('data/users.csv', index=False)
-
-        return df
-
-
-@st.cache_data
-def load_user_data():
-    if os.path.exists('data/users.csv'):
-        return pd.read_csv('data/users.csv')
-    else:
-        # If tools data is loaded first, this file should exist
-        # But just in case, we'll return an empty DataFrame
-        return pd.DataFrame(columns=["username", "name", "email"])
-
-
-@st.cache_data
-def load_bookings_data():
-    if os.path.exists('data/bookings.csv'):
-        return pd.read_csv('data/bookings.csv')
-    else:
-        # Create an empty bookings dataframe
-        bookings_df = pd.DataFrame(columns=[
-            "id", "tool_id", "renter_username", "start_date", "end_date",
-            "total_cost", "status", "created_at"
-        ])
-        bookings_df.to_csv('data/bookings.csv', index=False)
-        return bookings_df
-
-
-# Load data
-tools_df = load_tool_data()
-users_df = load_user_data()
-bookings_df = load_bookings_data()
-
-
 # Helper function for login - MUST BE DEFINED BEFORE USE
 def login(username):
-    if username in users_df['username'].values:
+    if get_user(username) is not None:
         st.session_state.user_logged_in = True
         st.session_state.current_user = username
         return True
@@ -359,7 +164,7 @@ with st.sidebar:
 
     # User Authentication
     if st.session_state.user_logged_in:
-        user_data = users_df[users_df['username'] == st.session_state.current_user].iloc[0]
+        user_data = get_user(st.session_state.current_user)
         st.write(f"Logged in as: {user_data['name']}")
         if st.button("Log Out"):
             st.session_state.user_logged_in = False
@@ -407,6 +212,13 @@ with st.sidebar:
             st.session_state.page = 'tool_swap'
             st.rerun()
 
+        # Badge reads the maintained unread counter, not the bookings table
+        unread = load_inbox().unread_count(st.session_state.current_user)
+        if st.button(f"🔔 Notifications ({unread})" if unread else "🔔 Notifications",
+                     use_container_width=True):
+            st.session_state.page = 'notifications'
+            st.rerun()
+
     st.divider()
     st.header("About")
     st.write("""
@@ -416,19 +228,15 @@ with st.sidebar:
     """)
 
 
-def render_tool_card(tool, col):
+def render_tool_card(tool, col, card_html):
     with col:
-        image_path = tool.get("image_url", "images/default.jpg")
-
         st.image(load_image_safe(tool["image_url"]), 
         caption=f"{tool['brand']} {tool['tool_type']}", 
          use_container_width=True)
 
 
-        # Tool details
-        st.subheader(tool['title'])
-        st.write(f"**${tool['daily_rate']:.2f}/day** · {tool['neighborhood']}")
-        st.write(f"{tool['description'][:100]}...")
+        # Tool details (escaped HTML from tool_markup, rendered per result set)
+        st.markdown(card_html, unsafe_allow_html=True)
 
         if st.button(f"View Details", key=f"view_{tool['id']}"):
             st.session_state.selected_tool = tool['id']
@@ -479,18 +287,7 @@ def show_home_page():
     # Featured tools section
     st.markdown("<h2 class='section-title'>Featured Tools</h2>", unsafe_allow_html=True)
 
-    # Filter for only available tools
-    available_tools = tools_df[tools_df['available'] == True]
-
-    # Get 3 random tools to feature
-    if len(available_tools) >= 3:
-        featured_tools = available_tools.sample(3)
-
-        # Create three columns
-        cols = st.columns(3)
-
-        for i, (_, tool) in enumerate(featured_tools.iterrows()):
-            render_tool_card(tool, cols[i])
+    show_featured_tools()
 
     # How it works section
     st.markdown("<h2 class='section-title'>How It Works</h2>", unsafe_allow_html=True)
@@ -515,6 +312,48 @@ def show_home_page():
     # Community impact section
     st.markdown("<h2 class='section-title'>Community Impact</h2>", unsafe_allow_html=True)
 
+    show_community_impact()
+
+    # Testimonials
+    st.markdown("<h2 class='section-title'>What Our Users Say</h2>", unsafe_allow_html=True)
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        with st.container():
+            st.info(
+                """ "I saved over $400 by borrowing a pressure washer and lawn aerator instead of buying them for a one-time project!" - Sarah J.""")
+
+    with col2:
+        with st.container():
+            st.info(
+                """ "My garage was full of tools I only use once a year. Now they're helping neighbors and generating some extra income!" - Mike T.""")
+
+
+@st.fragment
+def show_featured_tools():
+    """Three random available tools (a fragment, so its buttons rerun only the cards)"""
+    # Positions of the available tools, computed once per catalog version
+    available_tools = load_catalog_facets()['available']
+
+    # Get 3 random tools to feature
+    if len(available_tools) >= 3:
+        featured_tools = available_tools[random.sample(range(len(available_tools)), 3)]
+
+        # Create three columns
+        cols = st.columns(3)
+
+        catalog = load_tool_catalog()
+        cards = tool_markup("card", catalog, featured_tools)
+        for i, tool in enumerate(catalog.iter_records(featured_tools)):
+            render_tool_card(tool, cols[i], cards[i])
+
+
+@st.cache_resource
+def _impact_figures():
+    # The community impact charts never change, so they are built once
+    import plotly.express as px
+
     # Create a sample dataframe for community impact visualization
     months = ["Jan", "Feb", "Mar", "Apr", "May"]
     impact_data = pd.DataFrame({
@@ -524,49 +363,59 @@ def show_home_page():
         "Money Saved ($)": [1450, 2200, 3150, 4300, 5800]
     })
 
+    savings = px.bar(
+        impact_data,
+        x="Month",
+        y="Money Saved ($)",
+        color_discrete_sequence=["#2E7D32"],
+        title="Community Savings Over Time"
+    )
+    savings.update_layout(height=400)
+
+    emissions = px.line(
+        impact_data,
+        x="Month",
+        y="CO2 Saved (kg)",
+        markers=True,
+        color_discrete_sequence=["#388E3C"],
+        title="CO2 Emissions Avoided Through Tool Sharing"
+    )
+    emissions.update_layout(height=400)
+    return savings, emissions
+
+
+@st.fragment
+def show_community_impact():
+    """Community impact charts, rendered from figures built once per process"""
+    savings, emissions = _impact_figures()
+
     tab1, tab2 = st.tabs(["Money Saved", "Environmental Impact"])
 
     with tab1:
-        fig = px.bar(
-            impact_data,
-            x="Month",
-            y="Money Saved ($)",
-            color_discrete_sequence=["#2E7D32"],
-            title="Community Savings Over Time"
-        )
-        fig.update_layout(height=400)
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(savings, use_container_width=True)
 
     with tab2:
-        fig = px.line(
-            impact_data,
-            x="Month",
-            y="CO2 Saved (kg)",
-            markers=True,
-            color_discrete_sequence=["#388E3C"],
-            title="CO2 Emissions Avoided Through Tool Sharing"
-        )
-        fig.update_layout(height=400)
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(emissions, use_container_width=True)
 
-    # Testimonials
-    st.markdown("<h2 class='section-title'>What Our Users Say</h2>", unsafe_allow_html=True)
 
-    col1, col2 = st.columns(2)
+def show_find_tools_page():
+    st.title("🔍 Find Tools")
 
-    with col1:
-        with st.container():
-            st.info(
-                """ "I saved over $400 by borrowing a pressure washer and lawn aerator instead of buying them for a one-time project!" - Sarah J.""")
+    # Searches only read the selected city's shard
+    cities = load_router().cities
+    city = st.selectbox("City", cities) if len(cities) > 1 else DEFAULT_CITY
+    facets = load_catalog_facets(city)
+    if not facets['tool_type']:
+        st.info(f"No tools are listed in {city} yet.")
+        return
 
-    with col2:
-        with st.container():
-            st.info(
-                """ "My garage was full of tools I only use once a year. Now they're helping neighbors and generating some extra income!" - Mike T.""")
+    show_tool_search(city)
 
 
-def show_find_tools_page():
-    st.title("🔍 Find Tools")
+@st.fragment
+def show_tool_search(city):
+    """Filters and results for one city (a fragment: filter changes rerun only the search)"""
+    facets = load_catalog_facets(city)
 
     # Filter options
     st.subheader("Filter Options")
@@ -574,88 +423,135 @@ def show_find_tools_page():
     col1, col2, col3 = st.columns(3)
 
     with col1:
-        tool_types = ["All Types"] + sorted(tools_df['tool_type'].unique().tolist())
+        tool_types = ["All Types"] + facets['tool_type']
         selected_type = st.selectbox("Tool Type", tool_types)
 
     with col2:
-        neighborhoods = ["All Neighborhoods"] + sorted(tools_df['neighborhood'].unique().tolist())
+        neighborhoods = ["All Neighborhoods"] + facets['neighborhood']
         selected_neighborhood = st.selectbox("Neighborhood", neighborhoods)
 
     with col3:
         price_range = st.slider("Max Daily Rate ($)",
-                                min_value=float(tools_df['daily_rate'].min()),
-                                max_value=float(tools_df['daily_rate'].max()),
-                                value=float(tools_df['daily_rate'].max()))
+                                min_value=facets['min_price'],
+                                max_value=facets['max_price'],
+                                value=facets['max_price'])
 
-    # Filter the dataframe
-    filtered_df = tools_df.copy()
+    col4, col5, col6 = st.columns(3)
 
-    if selected_type != "All Types":
-        filtered_df = filtered_df[filtered_df['tool_type'] == selected_type]
-
-    if selected_neighborhood != "All Neighborhoods":
-        filtered_df = filtered_df[filtered_df['neighborhood'] == selected_neighborhood]
-
-    filtered_df = filtered_df[filtered_df['daily_rate'] <= price_range]
-
-    # Only show available tools
-    filtered_df = filtered_df[filtered_df['available'] == True]
+    with col4:
+        my_neighborhood = st.selectbox("Your Neighborhood", neighborhoods[1:])
+
+    with col5:
+        max_distance = st.slider("Max Distance (km)", min_value=1, max_value=MAX_SEARCH_KM,
+                                 value=MAX_SEARCH_KM)
+
+    with col6:
+        sort_by = st.selectbox("Sort By", list(SORT_WEIGHTS))
+
+    # Filter and rank the matches by distance, price and rating, keeping the
+    # top results (cached per query, so unchanged filters cost no catalog scan)
+    with span("filter_tools"):
+        catalog, ranked_positions, distances, total = find_tools(
+            city,
+            tool_type=selected_type if selected_type != "All Types" else None,
+            neighborhood=selected_neighborhood if selected_neighborhood != "All Neighborhoods" else None,
+            max_price=price_range, near=my_neighborhood,
+            max_km=max_distance if max_distance < MAX_SEARCH_KM else None, sort_by=sort_by
+        )
 
     # Map view tab and List view tab
     tab1, tab2 = st.tabs(["Map View", "List View"])
 
     with tab1:
-        # Create a map centered on the average coordinates
-        if not filtered_df.empty:
-            center_lat = filtered_df['latitude'].mean()
-            center_lon = filtered_df['longitude'].mean()
-
-            m = folium.Map(location=[center_lat, center_lon], zoom_start=13)
-
-            # Add markers for each tool
-            for _, tool in filtered_df.iterrows():
-                popup_html = f"""
-                <div style="width: 200px;">
-                    <img src="{tool['image_url']}" style="width: 100%; height: auto; border-radius: 4px; margin-bottom: 8px;">
-                    <h4>{tool['title']}</h4>
-                    <p><strong>${tool['daily_rate']:.2f}/day</strong></p>
-                    <p>{tool['neighborhood']}</p>
-                    <p>Rating: {tool['rating']}/5 ({tool['review_count']} reviews)</p>
-                    <p><a href="#" onclick="parent.postMessage({{type: 'tool_selected', id: {tool['id']}}}, '*');">View Details</a></p>
-                </div>
-                """
-
-                folium.Marker(
-                    [tool['latitude'], tool['longitude']],
-                    popup=folium.Popup(popup_html, max_width=300),
-                    tooltip=tool['title'],
-                    icon=folium.Icon(color="green", icon="wrench", prefix="fa")
-                ).add_to(m)
-
-            # Display the map
-            folium_static(m, width=800, height=500)
-
-            # Handle the JavaScript message for tool selection
-            selected_tool_id = st.text_input("Enter tool ID to view details:", "", key="map_tool_id")
-            if selected_tool_id and selected_tool_id.isdigit():
-                st.session_state.selected_tool = int(selected_tool_id)
-                st.session_state.page = 'tool_details'
-                st.rerun()
-        else:
-            st.warning("No tools match your search criteria.")
+        show_results_map(city, catalog.version, ranked_positions, distances)
 
     with tab2:
-        if not filtered_df.empty:
-            # Display results count
-            st.write(f"{len(filtered_df)} tools found")
+        show_results_list(catalog, ranked_positions, total)
 
-            # Display as cards in grid layout
-            cols = st.columns(3)
 
-            for i, (_, tool) in enumerate(filtered_df.iterrows()):
-                render_tool_card(tool, cols[i % 3])
-        else:
-            st.warning("No tools match your search criteria.")
+@st.cache_data(max_entries=MAX_CACHED_SEARCHES, show_spinner=False)
+def _results_map_html(city, version, positions, distances):
+    # Rendered once per result set and catalog version; an unchanged map is
+    # sent as the same HTML, so the browser keeps the existing iframe
+    import folium
+
+    catalog = load_tool_catalog(city)
+    latitudes = catalog.take('latitude', positions)
+    longitudes = catalog.take('longitude', positions)
+
+    # Popups and tooltips for all the results, escaped and rendered in one pass
+    popups = map_popups(catalog, positions, distances)
+    tooltips = tool_markup("tooltip", catalog, positions)
+
+    # Create a map centered on the average coordinates
+    center_lat = float(latitudes.mean())
+    center_lon = float(longitudes.mean())
+
+    with span("build_map"):
+        m = folium.Map(location=[center_lat, center_lon], zoom_start=13)
+
+        # Add markers for each tool
+        for lat, lon, popup_html, tooltip in zip(latitudes.tolist(), longitudes.tolist(), popups, tooltips):
+            folium.Marker(
+                [lat, lon],
+                popup=folium.Popup(popup_html, max_width=300),
+                tooltip=tooltip,
+                icon=folium.Icon(color="green", icon="wrench", prefix="fa")
+            ).add_to(m)
+
+        return folium.Figure().add_child(m).render()
+
+
+@st.fragment
+def show_results_map(city, version, positions, distances):
+    """Map of the search results, with a tool id box that reruns only the map"""
+    if len(positions) == 0:
+        st.warning("No tools match your search criteria.")
+        return
+
+    # Display the map
+    components.html(_results_map_html(city, version, positions, distances), width=800, height=510)
+
+    # Handle the JavaScript message for tool selection
+    selected_tool_id = st.text_input("Enter tool ID to view details:", "", key="map_tool_id")
+    if selected_tool_id and selected_tool_id.isdigit():
+        st.session_state.selected_tool = int(selected_tool_id)
+        st.session_state.page = 'tool_details'
+        st.rerun()
+
+
+@st.fragment
+def show_results_list(catalog, positions, total):
+    """Cards for the search results (a fragment, so a card's button reruns only the list)"""
+    if len(positions) == 0:
+        st.warning("No tools match your search criteria.")
+        return
+
+    # Display results count
+    if total > len(positions):
+        st.write(f"Showing the top {len(positions)} of {total} tools found")
+    else:
+        st.write(f"{len(positions)} tools found")
+
+    # Display as cards in grid layout
+    cols = st.columns(3)
+
+    cards = tool_markup("card", catalog, positions)
+    for i, tool in enumerate(catalog.iter_records(positions)):
+        render_tool_card(tool, cols[i % 3], cards[i])
+
+
+@st.cache_data(max_entries=MAX_CACHED_SEARCHES, show_spinner=False)
+def _location_map_html(latitude, longitude, neighborhood):
+    import folium
+
+    with span("build_map"):
+        m = folium.Map(location=[latitude, longitude], zoom_start=15)
+        folium.Circle(radius=300, location=[latitude, longitude],
+                      color="green", fill=True, fill_opacity=0.2).add_to(m)
+        folium.Marker([latitude, longitude], tooltip=neighborhood,
+                      icon=folium.Icon(color="green", icon="wrench", prefix="fa")).add_to(m)
+        return folium.Figure().add_child(m).render()
 
 
 def show_tool_details():
@@ -664,14 +560,12 @@ def show_tool_details():
         return
 
     tool_id = st.session_state.selected_tool
-    tool_data = tools_df[tools_df['id'] == tool_id]
+    tool = get_tool(tool_id)
 
-    if tool_data.empty:
+    if tool is None:
         st.error("Tool not found.")
         return
 
-    tool = tool_data.iloc[0]
-
     if st.button("← Back to Search"):
         st.session_state.page = 'find_tools'
         st.rerun()
@@ -683,7 +577,7 @@ def show_tool_details():
     with col1:
         st.image(load_image_safe(tool["image_url"]),
                  caption=f"{tool['brand']} {tool['tool_type']}",
-                 use_column_width=True)
+                 use_container_width=True)
 
         st.subheader("Description")
         st.write(tool['description'])
@@ -698,34 +592,11 @@ def show_tool_details():
 
         with specs_col2:
             st.write(f"**Location:** {tool['neighborhood']}")
-            st.write(f"**Rating:** {tool['rating']}/5 ({tool['review_count']} reviews)")
+            average, count = tool_rating(load_review_store(), tool)
+            st.write(f"**Rating:** {average:.1f}/5 ({count} reviews)")
             st.write(f"**Owner:** {tool['owner_name']}")
 
-        st.subheader("Reviews")
-        review_texts = [
-            "Great tool, worked perfectly for my project!",
-            "Owner was very helpful with instructions.",
-            "Clean and well-maintained. Would rent again.",
-            "Saved me so much money by not having to buy this.",
-            "Excellent condition, just as described."
-        ]
-        review_names = ["John D.", "Sarah M.", "David W.", "Lisa R.", "Michael C."]
-        review_times = ["2 days ago", "1 week ago", "2 weeks ago", "1 month ago", "2 months ago"]
-        review_count = min(3, tool['review_count'])
-
-        for i in range(review_count):
-            with st.container():
-                review_rating = random.randint(4, 5)
-                review_text = random.choice(review_texts)
-                reviewer_name = random.choice(review_names)
-                review_time = random.choice(review_times)
-
-                st.markdown(f"**{'⭐' * review_rating}** - {reviewer_name} ({review_time})")
-                st.write(f"_{review_text}_")
-                st.divider()
-
-        if tool['review_count'] > 3:
-            st.button(f"View all {tool['review_count']} reviews")
+        render_tool_reviews(tool)
 
     with col2:
         st.subheader("Booking Information")
@@ -750,44 +621,64 @@ def show_tool_details():
                         st.error("End date must be after start date.")
 
                     duration_days = max(1, (end_date - start_date).days)
-                    total_cost = duration_days * tool['daily_rate']
+                    total_cost = round(duration_days * float(tool['daily_rate']), 2)
                     st.write(f"**Duration:** {duration_days} days")
                     st.write(f"**Total Cost:** ${total_cost:.2f}")
 
-                    if tool['deposit'] > 0:
-                        st.write(f"**Security Deposit:** ${tool['deposit']:.2f} (refundable)")
+                    # Deposit scaled by the renter's and tool's risk (cached daily scores)
+                    deposit = load_risk_scores().suggested_deposit(st.session_state.current_user, tool)
+                    if deposit > 0:
+                        st.write(f"**Security Deposit:** ${deposit:.2f} (refundable)")
 
                 if st.form_submit_button("Book Now"):
                     if end_date < start_date:
                         st.error("Please correct the date selection.")
                     else:
-                        booking_id = len(bookings_df) + 1
-                        new_booking = pd.DataFrame([{
-                            "id": booking_id,
+                        booking_id = create_booking({
                             "tool_id": tool_id,
                             "renter_username": st.session_state.current_user,
                             "start_date": start_date.strftime("%Y-%m-%d"),
                             "end_date": end_date.strftime("%Y-%m-%d"),
                             "total_cost": total_cost,
-                            "status": "Pending",
-                            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        }])
-                        updated_bookings_df = pd.concat([bookings_df, new_booking], ignore_index=True)
-                        updated_bookings_df.to_csv('data/bookings.csv', index=False)
-                        load_bookings_data.clear()
+                            "deposit": deposit,
+                            "status": "Pending"
+                        })
+                        enqueue("booking_event", booking_id=booking_id, event="Requested")
                         st.success("Booking successful! The owner has been notified.")
                         st.session_state.page = 'bookings'
                         st.rerun()
 
         st.subheader("Location")
-        m = folium.Map(location=[tool['latitude'], tool['longitude']], zoom_start=15)
-        folium.Circle(radius=300, location=[tool['latitude'], tool['longitude']],
-                      color="green", fill=True, fill_opacity=0.2).add_to(m)
-        folium.Marker([tool['latitude'], tool['longitude']], tooltip=tool['neighborhood'],
-                      icon=folium.Icon(color="green", icon="wrench", prefix="fa")).add_to(m)
-        folium_static(m, width=400, height=300)
+        components.html(_location_map_html(float(tool['latitude']), float(tool['longitude']),
+                                           tool['neighborhood']), width=400, height=310)
         st.info("Exact location will be provided after booking is confirmed.")
 
+    # Recommendations (precomputed top-K rows, so this is an O(K) lookup)
+    # cover the default city's catalog
+    if load_router().city_for_tool(tool_id) != DEFAULT_CITY:
+        return
+    recommendations = load_recommendations()
+    show_recommended_tools("Similar Tools", recommendations.similar_to(tool.position), "similar")
+    show_recommended_tools("People Also Rented", recommendations.also_rented(tool.position), "also_rented")
+
+
+def show_recommended_tools(title, positions, key_prefix):
+    """Render a row of compact cards for recommended catalog positions"""
+    if len(positions) == 0:
+        return
+
+    st.subheader(title)
+    catalog = load_tool_catalog()
+    cols = st.columns(len(positions))
+
+    for col, tool in zip(cols, catalog.iter_records(positions)):
+        with col:
+            st.markdown(f"**{tool['title']}**")
+            st.write(f"${tool['daily_rate']:.2f}/day · {tool['neighborhood']}")
+            if st.button("View Details", key=f"{key_prefix}_{tool['id']}"):
+                st.session_state.selected_tool = tool['id']
+                st.rerun()
+
 def show_add_listing():
     if not st.session_state.user_logged_in:
         st.warning("Please log in to add a tool listing.")
@@ -801,6 +692,26 @@ def show_add_listing():
 
     st.info("For the hackathon demo, uploaded images won't be processed, and placeholder images will be used instead.")
 
+    # Tool type and location drive the suggested price, so pick them first
+    st.subheader("Tool Type & Location")
+
+    type_col, hood_col = st.columns(2)
+
+    with type_col:
+        tool_types = load_catalog_facets()['tool_type']
+        tool_type = st.selectbox("Tool Type", tool_types)
+
+    with hood_col:
+        router = load_router()
+        city = st.selectbox("City", router.cities) if len(router.cities) > 1 else DEFAULT_CITY
+        listed = load_catalog_facets(city)['neighborhood']
+        neighborhoods = sorted(set(listed) | set(router.neighborhoods[city]))
+        neighborhood = st.selectbox("Neighborhood", neighborhoods)
+
+    suggested_rate = load_price_suggestions().for_listing(tool_type, neighborhood)
+    if suggested_rate:
+        st.info(f"💡 Suggested daily rate for a {tool_type} in {neighborhood}: ${suggested_rate:.2f}")
+
     # Listing details form
     with st.form("add_tool_form"):
         st.subheader("Listing Details")
@@ -810,22 +721,20 @@ def show_add_listing():
         with col1:
             title = st.text_input("Tool Title")
 
-            tool_types = sorted(tools_df['tool_type'].unique().tolist())
-            tool_type = st.selectbox("Tool Type", tool_types)
-
             brand = st.text_input("Brand")
 
             conditions = ["Like New", "Good", "Fair", "Well Used but Functional"]
             condition = st.selectbox("Condition", conditions)
 
         with col2:
-            hourly_rate = st.number_input("Hourly Rate ($)", min_value=1.0, max_value=100.0, step=0.5)
-            daily_rate = st.number_input("Daily Rate ($)", min_value=5.0, max_value=500.0, step=1.0)
+            # Default the rates to the suggestion (daily is about 5x hourly)
+            default_daily = min(max(float(suggested_rate or 5.0), 5.0), 500.0)
+            hourly_rate = st.number_input("Hourly Rate ($)", min_value=1.0, max_value=100.0, step=0.5,
+                                          value=min(max(round(default_daily / 5 * 2) / 2, 1.0), 100.0))
+            daily_rate = st.number_input("Daily Rate ($)", min_value=5.0, max_value=500.0, step=1.0,
+                                         value=default_daily)
             deposit = st.number_input("Security Deposit ($)", min_value=0.0, max_value=1000.0, step=10.0)
 
-            neighborhoods = sorted(tools_df['neighborhood'].unique().tolist())
-            neighborhood = st.selectbox("Neighborhood", neighborhoods)
-
         st.subheader("Description")
         description = st.text_area("Provide details about your tool, its features, and any usage instructions",
                                    height=100)
@@ -838,30 +747,11 @@ def show_add_listing():
                 st.error("Please fill in all required fields.")
             else:
                 # Create a new tool record
-                neighborhood_data = {
-                    "Downtown": (40.7128, -74.0060),
-                    "Midtown": (40.7549, -73.9840),
-                    "Uptown": (40.8075, -73.9626),
-                    "Brooklyn Heights": (40.6950, -73.9950),
-                    "Williamsburg": (40.7081, -73.9571),
-                    "Astoria": (40.7636, -73.9232),
-                    "Park Slope": (40.6710, -73.9814),
-                    "Long Island City": (40.7447, -73.9485)
-                }
-
-                base_lat, base_lon = neighborhood_data.get(neighborhood, (40.7128, -74.0060))
-                lat = base_lat + random.uniform(-0.01, 0.01)
-                lon = base_lon + random.uniform(-0.01, 0.01)
-
-                tool_id = tools_df['id'].max() + 1 if not tools_df.empty else 1
-
-                user_data = users_df[users_df['username'] == st.session_state.current_user].iloc[0]
-
-                # Get image URL based on tool type
-                image_url = get_tool_image_url(tool_type)
-
-                new_tool = pd.DataFrame([{
-                    "id": tool_id,
+                lat, lon = random_location(neighborhood)
+
+                user_data = get_user(st.session_state.current_user)
+
+                add_tool_listing({
                     "title": title,
                     "description": description,
                     "tool_type": tool_type,
@@ -877,16 +767,8 @@ def show_add_listing():
                     "longitude": lon,
                     "rating": 0,
                     "review_count": 0,
-                    "available": True,
-                    "image_url": image_url
-                }])
-
-                # Append to tools dataframe
-                updated_tools_df = pd.concat([tools_df, new_tool], ignore_index=True)
-                updated_tools_df.to_csv('data/tools.csv', index=False)
-
-                # Bust cache to refresh data
-                load_tool_data.clear()
+                    "available": True
+                })
 
                 # Success message
                 st.success("Tool listing created successfully!")
@@ -901,8 +783,9 @@ def show_profile():
         st.warning("Please log in to view your profile.")
         return
 
-    user_data = users_df[users_df['username'] == st.session_state.current_user].iloc[0]
-    user_tools = tools_df[tools_df['owner_username'] == st.session_state.current_user]
+    # The user's own rows come from the per-user views, not table scans
+    user_data = get_user(st.session_state.current_user)
+    user_tools = load_user_views().owned_tools(st.session_state.current_user)
 
     st.title(f"{user_data['name']}'s Profile")
 
@@ -925,7 +808,7 @@ def show_profile():
                 font-size: 4rem;
                 font-weight: bold;
             ">
-                {user_data['name'][0]}
+                {html.escape(user_data['name'][0])}
             </div>
             """,
             unsafe_allow_html=True
@@ -939,9 +822,19 @@ def show_profile():
         # Stats remains the same
         st.subheader("Stats")
         st.write(f"**Tools Listed:** {len(user_tools)}")
-        st.write("**Rental Income:** $345")
-        st.write("**Money Saved:** $280")
-        st.write("**Rating:** ⭐⭐⭐⭐⭐ (5.0)")
+        summary = load_ledger().user_summary(st.session_state.current_user)
+        st.write(f"**Rental Income:** ${summary['income']:,.2f}")
+        if summary['pending_payout']:
+            st.write(f"**Pending Payout:** ${summary['pending_payout']:,.2f}")
+        st.write(f"**Spent on Rentals:** ${summary['spent']:,.2f}")
+        if summary['deposits_held']:
+            st.write(f"**Deposits Held:** ${summary['deposits_held']:,.2f}")
+        owner_stats = load_review_store().owner_stats(st.session_state.current_user)
+        if owner_stats['count']:
+            st.write(f"**Rating:** {'⭐' * round(owner_stats['average'])} "
+                     f"({owner_stats['average']:.1f}, {owner_stats['count']} reviews)")
+        else:
+            st.write("**Rating:** No reviews yet")
 
     with col2:
         st.subheader("My Tools")
@@ -953,19 +846,24 @@ def show_profile():
                 st.rerun()
         else:
             # Modify the tool display logic
-            for _, tool in user_tools.iterrows():
+            suggestions = load_price_suggestions()
+            cards = tool_markup_for_ids("profile_card", user_tools['id'])
+            for tool, card_html in zip(map(get_tool, user_tools['id']), cards):
                 # Use a single container for each tool
                 st.markdown("---")  # Divider between tools
                 
                 tool_col1, tool_col2 = st.columns([1, 3])
                 
                 with tool_col1:
-                    st.image(load_image_safe(tool['image_url']), width=150)
+                    st.image(load_image_safe(tool['image_url'], width=150), width=150)
                 
                 with tool_col2:
-                    st.subheader(tool['title'])
-                    st.write(f"**${tool['daily_rate']}/day** · {tool['neighborhood']}")
-                    st.write(f"**Status:** {'Available' if tool['available'] else 'Not Available'}")
+                    st.markdown(card_html, unsafe_allow_html=True)
+
+                    suggested_rate = suggestions.for_tool(tool['id']) or \
+                        suggestions.for_listing(tool['tool_type'], tool['neighborhood'])
+                    if suggested_rate:
+                        st.caption(f"💡 Suggested rate: ${suggested_rate:.2f}/day")
 
                     # Buttons
                     button_col1, button_col2 = st.columns(2)
@@ -974,201 +872,162 @@ def show_profile():
                         if tool['available']:
                             if st.button("Mark Unavailable", key=f"unavail_{tool['id']}"):
                                 # Update availability
-                                updated_tools_df = tools_df.copy()
-                                updated_tools_df.loc[updated_tools_df['id'] == tool['id'], 'available'] = False
-                                updated_tools_df.to_csv('data/tools.csv', index=False)
-                                load_tool_data.clear()
+                                update_tool_availability(tool['id'], False)
                                 st.rerun()
                         else:
                             if st.button("Mark Available", key=f"avail_{tool['id']}"):
                                 # Update availability
-                                updated_tools_df = tools_df.copy()
-                                updated_tools_df.loc[updated_tools_df['id'] == tool['id'], 'available'] = True
-                                updated_tools_df.to_csv('data/tools.csv', index=False)
-                                load_tool_data.clear()
+                                update_tool_availability(tool['id'], True)
                                 st.rerun()
                                 
-def load_tool_swap_data():
-    """Load or initialize tool swap requests"""
-    if os.path.exists('data/tool_swaps.csv'):
-        return pd.read_csv('data/tool_swaps.csv')
-    else:
-        swap_df = pd.DataFrame(columns=[
-            "id", 
-            "proposer_username", 
-            "proposer_tool_id", 
-            "receiver_username", 
-            "receiver_tool_id", 
-            "status", 
-            "proposed_date", 
-            "accepted_date"
-        ])
-        swap_df.to_csv('data/tool_swaps.csv', index=False)
-        return swap_df
-
-def create_tool_swap_request(proposer_username, proposer_tool_id, receiver_username, receiver_tool_id):
-    """Create a new tool swap request"""
-    swap_df = load_tool_swap_data()
-    
-    # Generate unique swap ID
-    swap_id = len(swap_df) + 1
-    
-    # Create new swap request
-    new_swap = pd.DataFrame([{
-        "id": swap_id,
-        "proposer_username": proposer_username,
-        "proposer_tool_id": proposer_tool_id,
-        "receiver_username": receiver_username,
-        "receiver_tool_id": receiver_tool_id,
-        "status": "Pending",
-        "proposed_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "accepted_date": None
-    }])
-    
-    # Append to swap dataframe
-    updated_swap_df = pd.concat([swap_df, new_swap], ignore_index=True)
-    updated_swap_df.to_csv('data/tool_swaps.csv', index=False)
-    
-    return swap_id
-
 def show_tool_swap_page():
     """Render the Tool Swap page"""
     # Ensure user is logged in
     if not st.session_state.user_logged_in:
         st.warning("Please log in to access the Tool Swap Network.")
         return
-    
-    # Load necessary data
-    tools_df = load_tool_data()
-    swap_df = load_tool_swap_data()
-    current_user = st.session_state.current_user
-    
-    # Get current user's tools
-    user_tools = tools_df[tools_df['owner_username'] == current_user]
-    
+
     st.title("🔄 Tool Swap Network")
-    
-    # Tabs for different swap interactions
+
+    # Tabs for different swap interactions (each one a fragment that loads
+    # its own data, so acting in one tab doesn't rebuild the others)
     tab1, tab2, tab3 = st.tabs([
         "Propose Swap", 
         "My Swap Requests", 
         "Incoming Swap Requests"
     ])
-    
+
     with tab1:
-        st.subheader("Propose a Tool Swap")
-        
-        # Select the user's tool to swap
-        st.write("Select the tool you want to swap:")
-        if user_tools.empty:
-            st.info("You need to list a tool first before proposing a swap.")
-        else:
-            user_tool_options = user_tools.apply(lambda row: f"{row['title']} (ID: {row['id']})", axis=1)
-            selected_user_tool = st.selectbox("Your Tool", user_tool_options)
-            user_tool_id = int(selected_user_tool.split("(ID: ")[-1].strip(")"))
-            
-            # Find potential swap tools (excluding user's own tools)
-            swap_candidate_tools = tools_df[
-                (tools_df['owner_username'] != current_user) & 
-                (tools_df['available'] == True)
-            ]
-            
-            # Prepare tool selection
-            tool_options = swap_candidate_tools.apply(
-                lambda row: f"{row['title']} (Owner: {row['owner_username']}, ID: {row['id']})", 
-                axis=1
-            )
-            
-            swap_candidate_tools = tools_df[
-        (tools_df['owner_username'] != current_user) & 
-        (tools_df['available'] == True)
-    ]
-            tool_options = swap_candidate_tools.apply(
-        lambda row: f"{row['title']} (Owner: {row['owner_username']}, ID: {row['id']})", 
-        axis=1
-)   
-            # In the show_tool_swap_page() function, replace the tool selection parsing with:
-            selected_swap_tool = st.selectbox("Tool to Swap With", tool_options)
-            try:
-                swap_tool_id = int(re.search(r'\(ID: (\d+)\)', selected_swap_tool).group(1))
-                receiver_username = re.search(r'\(Owner: (.*?),', selected_swap_tool).group(1)
-            except AttributeError:
-                st.error("Please make a swap!")
-            return
-            # Swap proposal button
-            if st.button("Propose Swap"):
-                # Create swap request
-                swap_id = create_tool_swap_request(
-                    current_user, 
-                    user_tool_id, 
-                    receiver_username, 
-                    swap_tool_id
-                )
-                
-                st.success(f"Swap request sent! Request ID: {swap_id}")
-    
+        show_swap_proposal(st.session_state.current_user)
+
     with tab2:
-        st.subheader("My Swap Requests")
-        
-        # Outgoing swap requests
-        outgoing_swaps = swap_df[swap_df['proposer_username'] == current_user]
-        
-        if outgoing_swaps.empty:
-            st.info("You haven't made any swap requests yet.")
-        else:
-            for _, swap in outgoing_swaps.iterrows():
-                proposer_tool = tools_df[tools_df['id'] == swap['proposer_tool_id']].iloc[0]
-                receiver_tool = tools_df[tools_df['id'] == swap['receiver_tool_id']].iloc[0]
-                
-                with st.container():
-                    st.write(f"**Swap Request to {swap['receiver_username']}**")
-                    st.write(f"Your Tool: {proposer_tool['title']}")
-                    st.write(f"Requested Tool: {receiver_tool['title']}")
-                    st.write(f"Status: {swap['status']}")
-                    st.write(f"Proposed Date: {swap['proposed_date']}")
-                    st.divider()
-    
+        show_outgoing_swaps(st.session_state.current_user)
+
     with tab3:
-        st.subheader("Incoming Swap Requests")
-        
-        # Incoming swap requests
-        incoming_swaps = swap_df[swap_df['receiver_username'] == current_user]
-        
-        if incoming_swaps.empty:
-            st.info("You have no incoming swap requests.")
-        else:
-            for _, swap in incoming_swaps.iterrows():
-                proposer_tool = tools_df[tools_df['id'] == swap['proposer_tool_id']].iloc[0]
-                receiver_tool = tools_df[tools_df['id'] == swap['receiver_tool_id']].iloc[0]
-                
-                with st.container():
-                    st.write(f"**Swap Request from {swap['proposer_username']}**")
-                    st.write(f"Their Tool: {proposer_tool['title']}")
-                    st.write(f"Your Tool: {receiver_tool['title']}")
-                    st.write(f"Status: {swap['status']}")
-                    st.write(f"Proposed Date: {swap['proposed_date']}")
-                    
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        if st.button(f"Accept Swap {swap['id']}", key=f"accept_{swap['id']}"):
-                            # Update swap status
-                            swap_df = load_tool_swap_data()
-                            swap_df.loc[swap_df['id'] == swap['id'], 'status'] = 'Accepted'
-                            swap_df.loc[swap_df['id'] == swap['id'], 'accepted_date'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                            swap_df.to_csv('data/tool_swaps.csv', index=False)
-                            st.success("Swap accepted!")
-                            st.rerun()
-                    
-                    with col2:
-                        if st.button(f"Decline Swap {swap['id']}", key=f"decline_{swap['id']}"):
-                            # Update swap status
-                            swap_df = load_tool_swap_data()
-                            swap_df.loc[swap_df['id'] == swap['id'], 'status'] = 'Declined'
-                            swap_df.to_csv('data/tool_swaps.csv', index=False)
-                            st.success("Swap declined.")
-                            st.rerun()
-                    
-                    st.divider()
+        show_incoming_swaps(st.session_state.current_user)
+
+
+@st.fragment
+def show_swap_proposal(current_user):
+    """Form for proposing a swap of one of the user's tools"""
+    st.subheader("Propose a Tool Swap")
+
+    # Get current user's tools (in every city)
+    user_tools = load_user_views().owned_tools(current_user)
+
+    # Select the user's tool to swap
+    st.write("Select the tool you want to swap:")
+    if user_tools.empty:
+        st.info("You need to list a tool first before proposing a swap.")
+        return
+
+    user_tool_labels = dict(zip(
+        user_tools['id'].tolist(),
+        (user_tools['title'].astype(str) + " (ID: " + user_tools['id'].astype(str) + ")").tolist()
+    ))
+    user_tool_id = int(st.selectbox("Your Tool", list(user_tool_labels), format_func=user_tool_labels.get))
+
+    # Find potential swap tools in the same city (excluding user's own tools)
+    tools_df = load_tool_data(load_router().city_for_tool(user_tool_id))
+    swap_candidate_tools = tools_df[
+        (tools_df['owner_username'] != current_user) & 
+        (tools_df['available'])
+    ]
+
+    # Prepare tool selection (by id, with the title and owner as the label)
+    tool_labels = dict(zip(
+        swap_candidate_tools['id'].tolist(),
+        (swap_candidate_tools['title'].astype(str) + " (Owner: " +
+         swap_candidate_tools['owner_username'].astype(str) + ", ID: " +
+         swap_candidate_tools['id'].astype(str) + ")").tolist()
+    ))
+    swap_tool_id = st.selectbox("Tool to Swap With", list(tool_labels), format_func=tool_labels.get)
+    if swap_tool_id is None:
+        st.error("Please make a swap!")
+        return
+    receiver_username = swap_candidate_tools.loc[
+        swap_candidate_tools['id'] == swap_tool_id, 'owner_username'].iloc[0]
+
+    # Swap proposal button
+    if st.button("Propose Swap"):
+        # Create swap request
+        swap_id = create_tool_swap_request(
+            current_user, 
+            user_tool_id, 
+            receiver_username, 
+            swap_tool_id
+        )
+        enqueue("swap_event", swap_id=swap_id, event="Proposed")
+
+        st.success(f"Swap request sent! Request ID: {swap_id}")
+
+
+@st.fragment
+def show_outgoing_swaps(current_user):
+    """The swaps the user has proposed"""
+    st.subheader("My Swap Requests")
+
+    # Outgoing swap requests
+    outgoing_swaps = load_user_views().outgoing_swaps(current_user)
+
+    if outgoing_swaps.empty:
+        st.info("You haven't made any swap requests yet.")
+        return
+
+    for _, swap in outgoing_swaps.iterrows():
+        proposer_tool = get_tool(swap['proposer_tool_id'])
+        receiver_tool = get_tool(swap['receiver_tool_id'])
+
+        with st.container():
+            st.write(f"**Swap Request to {swap['receiver_username']}**")
+            st.write(f"Your Tool: {proposer_tool['title']}")
+            st.write(f"Requested Tool: {receiver_tool['title']}")
+            st.write(f"Status: {swap['status']}")
+            st.write(f"Proposed Date: {swap['proposed_date']}")
+            st.divider()
+
+
+def answer_swap(swap_id, status):
+    """Accept or decline a swap and notify the proposer"""
+    update_swap_status(swap_id, status)
+    enqueue("swap_event", swap_id=int(swap_id), event=status)
+
+
+@st.fragment
+def show_incoming_swaps(current_user):
+    """The swaps proposed to the user, with accept and decline buttons"""
+    st.subheader("Incoming Swap Requests")
+
+    # Incoming swap requests
+    incoming_swaps = load_user_views().incoming_swaps(current_user)
+
+    if incoming_swaps.empty:
+        st.info("You have no incoming swap requests.")
+        return
+
+    for _, swap in incoming_swaps.iterrows():
+        proposer_tool = get_tool(swap['proposer_tool_id'])
+        receiver_tool = get_tool(swap['receiver_tool_id'])
+
+        with st.container():
+            st.write(f"**Swap Request from {swap['proposer_username']}**")
+            st.write(f"Their Tool: {proposer_tool['title']}")
+            st.write(f"Your Tool: {receiver_tool['title']}")
+            st.write(f"Status: {swap['status']}")
+            st.write(f"Proposed Date: {swap['proposed_date']}")
+
+            # The callbacks run before the fragment reruns, so the list
+            # below already shows the new status
+            col1, col2 = st.columns(2)
+            with col1:
+                st.button(f"Accept Swap {swap['id']}", key=f"accept_{swap['id']}",
+                          on_click=answer_swap, args=(swap['id'], 'Accepted'))
+
+            with col2:
+                st.button(f"Decline Swap {swap['id']}", key=f"decline_{swap['id']}",
+                          on_click=answer_swap, args=(swap['id'], 'Declined'))
+
+            st.divider()
 
 def show_bookings():
     if not st.session_state.user_logged_in:
@@ -1177,20 +1036,11 @@ def show_bookings():
 
     st.title("My Bookings")
 
-    # Get fresh data
-    fresh_bookings_df = load_bookings_data()
-
-    # Get bookings for the current user
-    user_bookings = fresh_bookings_df[fresh_bookings_df['renter_username'] == st.session_state.current_user]
-
-    # Get tools owned by the current user
-    owned_tools = tools_df[tools_df['owner_username'] == st.session_state.current_user]
-
-    # Get bookings for tools owned by the current user
-    rental_requests = pd.DataFrame()
-    if not owned_tools.empty:
-        owned_tool_ids = owned_tools['id'].tolist()
-        rental_requests = fresh_bookings_df[fresh_bookings_df['tool_id'].isin(owned_tool_ids)]
+    # Get the user's bookings and the bookings for tools they own (in every
+    # city) from the per-user views
+    views = load_user_views()
+    user_bookings = views.rentals(st.session_state.current_user)
+    rental_requests = views.rental_requests(st.session_state.current_user)
 
     # Create tabs for rentals and tool rental requests
     tab1, tab2 = st.tabs(["Tools I'm Renting", "Rental Requests for My Tools"])
@@ -1202,141 +1052,207 @@ def show_bookings():
                 st.session_state.page = 'find_tools'
                 st.rerun()
         else:
-            # Display bookings
+            # Display bookings, one fragment per row
             for _, booking in user_bookings.iterrows():
                 # Get tool details
-                tool_data = tools_df[tools_df['id'] == booking['tool_id']]
-                if tool_data.empty:
+                tool = get_tool(booking['tool_id'])
+                if tool is None:
                     continue  # Skip if tool no longer exists
 
-                tool = tool_data.iloc[0]
-
-                with st.container():
-                    # Booking info with image
-                    col1, col2, col3 = st.columns([1, 2, 1])
-
-                    with col1:
-                        st.image(load_image_safe(tool['image_url']), width=150)
-
-
-                    with col2:
-                        st.subheader(tool['title'])
-                        st.write(f"**Booking ID:** {booking['id']}")
-                        st.write(f"**Dates:** {booking['start_date']} to {booking['end_date']}")
-                        st.write(f"**Total Cost:** ${booking['total_cost']}")
-                        st.write(f"**Owner:** {tool['owner_name']}")
-
-                        # Status badge
-                        status = booking['status']
-                        st.write(f"**Status:** {status}")
-
-                    with col3:
-                        if booking['status'] == 'Pending':
-                            if st.button("Cancel", key=f"cancel_{booking['id']}"):
-                                # Update booking status
-                                updated_bookings_df = fresh_bookings_df.copy()
-                                updated_bookings_df.loc[
-                                    updated_bookings_df['id'] == booking['id'], 'status'] = 'Cancelled'
-                                updated_bookings_df.to_csv('data/bookings.csv', index=False)
-                                load_bookings_data.clear()
-                                st.rerun()
-
-                        if booking['status'] == 'Approved':
-                            if st.button("Return", key=f"return_{booking['id']}"):
-                                # Update booking status
-                                updated_bookings_df = fresh_bookings_df.copy()
-                                updated_bookings_df.loc[
-                                    updated_bookings_df['id'] == booking['id'], 'status'] = 'Returned'
-                                updated_bookings_df.to_csv('data/bookings.csv', index=False)
-                                load_bookings_data.clear()
-                                st.rerun()
-
-                    st.divider()
+                show_renter_booking(int(booking['id']), tool)
 
     with tab2:
         if rental_requests.empty:
             st.info("You don't have any rental requests for your tools.")
         else:
-            # Display rental requests
+            # Display rental requests, one fragment per row
             for _, request in rental_requests.iterrows():
                 # Get tool details
-                tool_data = tools_df[tools_df['id'] == request['tool_id']]
-                if tool_data.empty:
+                tool = get_tool(request['tool_id'])
+                if tool is None:
                     continue  # Skip if tool no longer exists
 
-                tool = tool_data.iloc[0]
-
                 # Get renter details
-                renter_data = users_df[users_df['username'] == request['renter_username']]
-                if renter_data.empty:
+                renter_data = get_user(request['renter_username'])
+                if renter_data is None:
                     renter_name = "Unknown User"
                 else:
-                    renter_name = renter_data.iloc[0]['name']
-
-                with st.container():
-                    # Request info with image
-                    col1, col2, col3 = st.columns([1, 2, 1])
-
-                    with col1:
-                        st.image(load_image_safe(tool['image_url']), width=150)
-
-
-                    with col2:
-                        st.subheader(tool['title'])
-                        st.write(f"**Booking ID:** {request['id']}")
-                        st.write(f"**Dates:** {request['start_date']} to {request['end_date']}")
-                        st.write(f"**Total Cost:** ${request['total_cost']}")
-                        st.write(f"**Renter:** {renter_name}")
-
-                        # Status badge
-                        status = request['status']
-                        st.write(f"**Status:** {status}")
-
-                    with col3:
-                        if request['status'] == 'Pending':
-                            if st.button("Approve", key=f"approve_{request['id']}"):
-                                # Update booking status
-                                updated_bookings_df = fresh_bookings_df.copy()
-                                updated_bookings_df.loc[
-                                    updated_bookings_df['id'] == request['id'], 'status'] = 'Approved'
-                                updated_bookings_df.to_csv('data/bookings.csv', index=False)
-                                load_bookings_data.clear()
-                                st.rerun()
+                    renter_name = renter_data['name']
 
-                            if st.button("Decline", key=f"decline_{request['id']}"):
-                                # Update booking status
-                                updated_bookings_df = fresh_bookings_df.copy()
-                                updated_bookings_df.loc[
-                                    updated_bookings_df['id'] == request['id'], 'status'] = 'Declined'
-                                updated_bookings_df.to_csv('data/bookings.csv', index=False)
-                                load_bookings_data.clear()
-                                st.rerun()
+                show_rental_request(int(request['id']), tool, renter_name)
 
-                        if request['status'] == 'Returned':
-                            if st.button("Confirm Return", key=f"confirm_{request['id']}"):
-                                # Update booking status
-                                updated_bookings_df = fresh_bookings_df.copy()
-                                updated_bookings_df.loc[
-                                    updated_bookings_df['id'] == request['id'], 'status'] = 'Completed'
-                                updated_bookings_df.to_csv('data/bookings.csv', index=False)
-                                load_bookings_data.clear()
-                                st.rerun()
 
-                    st.divider()
+def queued_booking_status(booking_id):
+    """Return the status a queued background job will give a booking, or None"""
+    for job in load_job_queue().pending("booking_status"):
+        if job['booking_id'] == booking_id:
+            return job['status']
+    return None
+
+
+def queue_booking_status(booking_id, status):
+    """Queue a booking status change (applied by a background worker)"""
+    enqueue("booking_status", booking_id=booking_id, status=status)
+
+
+def submit_review(booking_id, owner_username):
+    """Save the review form of a completed booking"""
+    key = f"review_form_{booking_id}"
+    load_review_store().add_review(get_booking(booking_id), owner_username, st.session_state[f"{key}_rating"],
+                                   st.session_state[f"{key}_comment"])
+
+
+@st.fragment
+def show_renter_booking(booking_id, tool):
+    """One of the user's bookings (a fragment: its buttons rerun only this row).
+
+    Button actions run as callbacks before the row reruns, and the row reads
+    its booking by id, so it shows the queued status change, the applied
+    status or the saved review straight away.
+    """
+    booking = get_booking(booking_id)
+    if booking is None:
+        return
+
+    with st.container():
+        # Booking info with image
+        col1, col2, col3 = st.columns([1, 2, 1])
+
+        with col1:
+            st.image(load_image_safe(tool['image_url'], width=150), width=150)
+
+
+        with col2:
+            st.subheader(tool['title'])
+            st.write(f"**Booking ID:** {booking['id']}")
+            st.write(f"**Dates:** {booking['start_date']} to {booking['end_date']}")
+            st.write(f"**Total Cost:** ${booking['total_cost']}")
+            st.write(f"**Owner:** {tool['owner_name']}")
+
+            # Status badge
+            status = booking['status']
+            st.write(f"**Status:** {status}")
+
+        with col3:
+            queued = queued_booking_status(booking_id)
+            if queued:
+                st.caption(f"⏳ Updating to {queued}...")
+            elif booking['status'] == 'Pending':
+                st.button("Cancel", key=f"cancel_{booking['id']}",
+                          on_click=queue_booking_status, args=(booking_id, 'Cancelled'))
+
+            elif booking['status'] == 'Approved':
+                st.button("Return", key=f"return_{booking['id']}",
+                          on_click=queue_booking_status, args=(booking_id, 'Returned'))
+
+        # Completed rentals can be reviewed once
+        if booking['status'] == 'Completed' and not load_review_store().has_review(booking['id']):
+            with st.expander("Leave a Review"):
+                key = f"review_form_{booking['id']}"
+                with st.form(key):
+                    st.slider("Rating", 1, 5, 5, key=f"{key}_rating")
+                    st.text_area("Comment", key=f"{key}_comment")
+                    st.form_submit_button("Submit Review", on_click=submit_review,
+                                          args=(booking_id, tool['owner_username']))
+
+        st.divider()
+
+
+@st.fragment
+def show_rental_request(request_id, tool, renter_name):
+    """A booking of one of the user's tools (a fragment: its buttons rerun only this row)"""
+    request = get_booking(request_id)
+    if request is None:
+        return
+
+    with st.container():
+        # Request info with image
+        col1, col2, col3 = st.columns([1, 2, 1])
+
+        with col1:
+            st.image(load_image_safe(tool['image_url'], width=150), width=150)
+
+
+        with col2:
+            st.subheader(tool['title'])
+            st.write(f"**Booking ID:** {request['id']}")
+            st.write(f"**Dates:** {request['start_date']} to {request['end_date']}")
+            st.write(f"**Total Cost:** ${request['total_cost']}")
+            st.write(f"**Renter:** {renter_name}")
+
+            # Status badge
+            status = request['status']
+            st.write(f"**Status:** {status}")
+
+        with col3:
+            queued = queued_booking_status(request_id)
+            if queued:
+                st.caption(f"⏳ Updating to {queued}...")
+            elif request['status'] == 'Pending':
+                st.button("Approve", key=f"approve_{request['id']}",
+                          on_click=queue_booking_status, args=(request_id, 'Approved'))
+
+                st.button("Decline", key=f"decline_{request['id']}",
+                          on_click=queue_booking_status, args=(request_id, 'Declined'))
+
+            elif request['status'] == 'Returned':
+                st.button("Confirm Return", key=f"confirm_{request['id']}",
+                          on_click=queue_booking_status, args=(request_id, 'Completed'))
+
+        st.divider()
+
+
+def show_notifications():
+    if not st.session_state.user_logged_in:
+        st.warning("Please log in to view your notifications.")
+        return
+
+    st.title("🔔 Notifications")
+    inbox = load_inbox()
+    username = st.session_state.current_user
+
+    if inbox.unread_count(username) and st.button("Mark all as read"):
+        inbox.mark_all_read(username)
+        st.rerun()
+
+    notifications = inbox.recent(username)
+    if not notifications:
+        st.info("You have no notifications yet.")
+        return
+
+    for notification in notifications:
+        sent = datetime.fromtimestamp(notification['created_at']).strftime("%Y-%m-%d %H:%M")
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            marker = "🟢 " if not notification['read'] else ""
+            st.write(f"{marker}{notification['message']}")
+            st.caption(sent)
+        with col2:
+            if notification['link_page'] and st.button("Open", key=f"notification_{notification['id']}"):
+                st.session_state.page = notification['link_page']
+                st.rerun()
+
 
+# Pay out completed rentals in batches (a no-op until the interval has passed)
+load_ledger().settle_if_due()
 
 # Render the appropriate page based on the current state
-if st.session_state.page == 'home':
-    show_home_page()
-elif st.session_state.page == 'find_tools':
-    show_find_tools_page()
-elif st.session_state.page == 'tool_details':
-    show_tool_details()
-elif st.session_state.page == 'add_listing':
-    show_add_listing()
-elif st.session_state.page == 'profile':
-    show_profile()
-elif st.session_state.page == 'bookings':
-    show_bookings()
-elif st.session_state.page == 'tool_swap':
-    show_tool_swap_page()
+with span(f"page:{st.session_state.page}"):
+    if st.session_state.page == 'home':
+        show_home_page()
+    elif st.session_state.page == 'find_tools':
+        show_find_tools_page()
+    elif st.session_state.page == 'tool_details':
+        show_tool_details()
+    elif st.session_state.page == 'add_listing':
+        show_add_listing()
+    elif st.session_state.page == 'profile':
+        show_profile()
+    elif st.session_state.page == 'bookings':
+        show_bookings()
+    elif st.session_state.page == 'tool_swap':
+        show_tool_swap_page()
+    elif st.session_state.page == 'notifications':
+        show_notifications()
+
+render_metrics_panel()
@@ -0,0 +1,442 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from data_generator import generate_dataset
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PAGES = ["home", "find_tools", "tool_details", "bookings", "profile", "tool_swap", "tool_map"]
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000]
+
+# Third-party modules that pages should only import when they need them
+HEAVY_MODULES = ["folium", "streamlit_folium", "plotly.express", "PIL.Image"]
+
+# Pages whose per-rerun allocations must not grow with the catalog, and how
+# much growth from the smallest to the largest size the check tolerates
+# (profile and tool_swap list the demo user's own listings, which grow with
+# the catalog in the generated datasets)
+ALLOCATION_CHECK_PAGES = ["home", "find_tools", "tool_details", "bookings"]
+ALLOCATION_GROWTH_LIMIT = 1.5
+
+
+# Function to prepare a working directory with a generated dataset
+def prepare_dataset(size, data_root, seed=0, catalog_only=False):
+    """Generate (once) a dataset with `size` listings and return its work dir.
+
+    The work dir mirrors the repo layout the app expects: data/ holds the
+    generated CSVs and images/ links back to the repo's images. With
+    catalog_only, users, bookings and swaps keep their size at the smallest
+    default size, so only the catalog grows.
+    """
+    work_dir = os.path.join(data_root, f"rows_{size}" + ("_catalog" if catalog_only else ""))
+    data_dir = os.path.join(work_dir, "data")
+    others = min(size, DEFAULT_SIZES[0]) if catalog_only else size
+    if not os.path.exists(os.path.join(data_dir, "tool_swaps.csv")):
+        generate_dataset(
+            listings=size,
+            users=max(10, others // 10),
+            bookings=others,
+            swaps=max(1, others // 10),
+            seed=seed,
+            output_dir=data_dir
+        )
+
+    images_link = os.path.join(work_dir, "images")
+    if not os.path.exists(images_link):
+        os.symlink(os.path.join(REPO_DIR, "images"), images_link)
+
+    return work_dir
+
+
+def _measure(func, repeat):
+    """Run func cold once, then `repeat` warm times, then once under tracemalloc"""
+    started = time.perf_counter()
+    func()
+    cold = time.perf_counter() - started
+
+    warm = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        warm.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    func()
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    diff = after.compare_to(before, "filename")
+    return {
+        "cold_wall_time_s": cold,
+        "wall_time_s": statistics.median(warm) if warm else cold,
+        "peak_memory_bytes": peak,
+        "allocation_count": sum(stat.count_diff for stat in diff if stat.count_diff > 0),
+        "allocated_bytes": sum(stat.size_diff for stat in diff if stat.size_diff > 0)
+    }
+
+
+def _page_runner(page, timeout):
+    """Return a callable that renders one app page headlessly via AppTest"""
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(os.path.join(REPO_DIR, "app.py"), default_timeout=timeout)
+    app.session_state.page = page
+    app.session_state.user_logged_in = True
+    app.session_state.current_user = "demo_user"
+    app.session_state.selected_tool = 1
+
+    def run():
+        app.run()
+        if app.exception:
+            raise RuntimeError(app.exception[0].value)
+
+    return run
+
+
+def _map_runner():
+    """Return a callable that builds the tool map for the full catalog"""
+    import pandas as pd
+    from utils import create_tool_map
+
+    tools_df = pd.read_csv("data/tools.csv")
+    return lambda: create_tool_map(tools_df)
+
+
+def run_case(page, work_dir, repeat, timeout):
+    """Benchmark a single page against the dataset in work_dir (in-process)"""
+    sys.path.insert(0, REPO_DIR)
+    os.chdir(work_dir)
+    runner = _map_runner() if page == "tool_map" else _page_runner(page, timeout)
+    result = _measure(runner, repeat)
+    result["heavy_modules"] = [name for name in HEAVY_MODULES if name in sys.modules]
+    return result
+
+
+def measure_import_time(module):
+    """Return the cumulative import time of `module` in a fresh interpreter (seconds)"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True
+    )
+    # The last line of -X importtime output is the requested top-level module
+    cumulative_us = int(completed.stderr.strip().splitlines()[-1].split("|")[1])
+    return cumulative_us / 1e6
+
+
+def profile_imports(report):
+    """Summarize which heavy modules each page imported and what they cost.
+
+    Uses the heavy_modules recorded per case in a benchmark report. The costs
+    are standalone import times, so shared dependencies are counted per module.
+    """
+    costs = {name: measure_import_time(name) for name in HEAVY_MODULES}
+    eager_total = sum(costs.values())
+
+    pages = {}
+    for row in report["results"]:
+        if row.get("status") != "ok" or row["page"] in pages:
+            continue
+        loaded = row["heavy_modules"]
+        lazy_total = sum(costs[name] for name in loaded)
+        pages[row["page"]] = {
+            "heavy_modules": loaded,
+            "import_time_s": lazy_total,
+            "saved_vs_eager_s": eager_total - lazy_total
+        }
+
+    return {"module_import_time_s": costs, "eager_import_time_s": eager_total, "pages": pages}
+
+
+def run_benchmarks(pages=None, sizes=None, repeat=3, timeout=600, data_root=None, seed=0,
+                   catalog_only=False):
+    """Benchmark every page at every size, one subprocess per case.
+
+    Each case runs in a fresh interpreter so caches start cold, peak memory is
+    not polluted by earlier cases, and a page that hangs at scale is killed
+    and recorded as a timeout instead of stalling the suite.
+    """
+    pages = pages or PAGES
+    sizes = sizes or DEFAULT_SIZES
+    data_root = data_root or os.path.join(REPO_DIR, "bench_data")
+
+    results = []
+    for size in sizes:
+        work_dir = prepare_dataset(size, data_root, seed, catalog_only)
+        for page in pages:
+            result = {"page": page, "rows": size}
+            try:
+                completed = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--case", page,
+                     "--work-dir", work_dir, "--repeat", str(repeat), "--timeout", str(timeout)],
+                    capture_output=True, text=True, timeout=timeout * (repeat + 2)
+                )
+            except subprocess.TimeoutExpired:
+                result["status"] = "timeout"
+            else:
+                if completed.returncode == 0:
+                    result.update(json.loads(completed.stdout.strip().splitlines()[-1]))
+                    result["status"] = "ok"
+                else:
+                    result["status"] = "error"
+                    result["error"] = completed.stderr.strip().splitlines()[-1:]
+            results.append(result)
+            print(f"{page:>12} @ {size:>9,} rows: {result['status']}"
+                  + (f" {result['wall_time_s'] * 1000:.1f} ms" if result["status"] == "ok" else ""),
+                  file=sys.stderr)
+
+    return {
+        "commit": _git_commit(),
+        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "python": sys.version.split()[0],
+        "repeat": repeat,
+        "results": results
+    }
+
+
+def allocation_growth(report, limit=ALLOCATION_GROWTH_LIMIT):
+    """Return, per page, how a warm rerun's peak traced memory grows with size.
+
+    peak_memory_bytes covers every allocation made during one warm rerun, so
+    a page whose reruns copy or scan the catalog grows roughly with the
+    number of listings, while one that only reads cached results stays flat.
+    """
+    sizes = sorted({row["rows"] for row in report["results"]})
+    by_page = {}
+    for row in report["results"]:
+        by_page.setdefault(row["page"], {})[row["rows"]] = row
+
+    growth = []
+    for page, rows in by_page.items():
+        small, large = rows.get(sizes[0], {}), rows.get(sizes[-1], {})
+        if small.get("status") != "ok" or large.get("status") != "ok":
+            growth.append({"page": page, "rows": [sizes[0], sizes[-1]], "ok": False,
+                           "error": small.get("error") or large.get("error") or "timeout"})
+            continue
+        ratio = large["peak_memory_bytes"] / max(small["peak_memory_bytes"], 1)
+        growth.append({
+            "page": page,
+            "rows": [small["rows"], large["rows"]],
+            "peak_memory_bytes": [small["peak_memory_bytes"], large["peak_memory_bytes"]],
+            "growth": ratio,
+            "ok": ratio <= limit
+        })
+    return growth
+
+
+def synthetic_catalog(rows, neighborhoods=64, seed=0):
+    """Build an in-memory catalog with just the columns searches read"""
+    import numpy as np
+    import pandas as pd
+    from catalog import ToolCatalog
+    from data_generator import TOOL_TYPES, resolve_neighborhoods
+
+    hoods = resolve_neighborhoods(neighborhoods, seed)
+    rng = np.random.default_rng(seed)
+    hood_idx = rng.integers(0, len(hoods), rows)
+    coords = np.array(list(hoods.values()))[hood_idx]
+    df = pd.DataFrame({
+        "id": np.arange(1, rows + 1, dtype=np.int32),
+        "tool_type": pd.Categorical.from_codes(rng.integers(0, len(TOOL_TYPES), rows), TOOL_TYPES),
+        "neighborhood": pd.Categorical.from_codes(hood_idx, list(hoods)),
+        "daily_rate": rng.uniform(25, 125, rows).astype(np.float32),
+        "rating": np.round(rng.uniform(3, 5, rows), 1),
+        "available": rng.random(rows) > 0.2,
+        "latitude": (coords[:, 0] + rng.uniform(-0.01, 0.01, rows)).astype(np.float32),
+        "longitude": (coords[:, 1] + rng.uniform(-0.01, 0.01, rows)).astype(np.float32),
+    })
+    return ToolCatalog.from_frame(df)
+
+
+def benchmark_search_scaling(rows, workers=None, repeat=5, seed=0):
+    """Time Find Tools searches serially and on process pools of each size.
+
+    The serial baseline is the single-process branch of the Find Tools search
+    (code filters plus rank_tools) and the parallel runs make the same call
+    the app does (search_and_count); every parallel result is checked
+    against the serial one.
+    """
+    import numpy as np
+    from data_helper import _serial_search
+    from parallel_search import ParallelSearch
+    from ranking import DEFAULT_RESULTS, SORT_WEIGHTS, NeighborhoodIndex
+
+    catalog = synthetic_catalog(rows, seed=seed)
+    index = NeighborhoodIndex(catalog)
+    origin = index.names[0]
+    workers = workers or sorted({1, 2, 4, os.cpu_count() or 1})
+    queries = [{"sort": sort, "tool_type": tool_type, "max_price": 100.0, "weights": weights}
+               for tool_type in (None, "Ladder") for sort, weights in SORT_WEIGHTS.items()]
+
+    def serial(query):
+        return _serial_search(catalog, index, query["tool_type"], None, query["max_price"], origin,
+                              None, query["weights"], DEFAULT_RESULTS, True)
+
+    def median_time(func):
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            times.append(time.perf_counter() - started)
+        return statistics.median(times), result
+
+    results = {"rows": rows, "cpu_count": os.cpu_count(), "queries": []}
+    expected = []
+    for query in queries:
+        seconds, result = median_time(lambda: serial(query))
+        expected.append(result)
+        results["queries"].append({**query, "serial_ms": seconds * 1000, "parallel": []})
+
+    for count in workers:
+        executor = ParallelSearch(catalog, index, count)
+        try:
+            for query, row, (serial_positions, serial_km, serial_matches) in zip(
+                    queries, results["queries"], expected):
+                def run():
+                    return executor.search_and_count(query["tool_type"], None, query["max_price"],
+                                                     origin, weights=query["weights"],
+                                                     n=DEFAULT_RESULTS)
+                run()  # start the workers
+                seconds, (positions, _, km, matches) = median_time(run)
+                row["parallel"].append({
+                    "workers": count,
+                    "ms": seconds * 1000,
+                    "speedup": row["serial_ms"] / (seconds * 1000),
+                    "matches_serial": bool(np.array_equal(positions, serial_positions)
+                                           and np.allclose(km, serial_km)
+                                           and matches == serial_matches)
+                })
+        finally:
+            executor.close()
+    return results
+
+
+def _git_commit():
+    """Return the current git commit hash, or None outside a checkout"""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_reports(baseline, current, threshold=0.10):
+    """Compare two reports and return rows whose time or memory regressed.
+
+    A metric regresses when it grew by more than `threshold` (fractional).
+    """
+    metrics = ["wall_time_s", "peak_memory_bytes", "allocation_count"]
+    baseline_rows = {(r["page"], r["rows"]): r for r in baseline["results"]}
+    regressions = []
+
+    for row in current["results"]:
+        old = baseline_rows.get((row["page"], row["rows"]))
+        if old is None or old.get("status") != "ok" or row.get("status") != "ok":
+            continue
+        for metric in metrics:
+            if old[metric] and row[metric] > old[metric] * (1 + threshold):
+                regressions.append({
+                    "page": row["page"],
+                    "rows": row["rows"],
+                    "metric": metric,
+                    "baseline": old[metric],
+                    "current": row[metric],
+                    "ratio": row[metric] / old[metric]
+                })
+
+    return regressions
+
+
+def main(argv=None):
+    """Command line entry point for running and comparing benchmarks"""
+    parser = argparse.ArgumentParser(description="Benchmark ToolShare pages headlessly")
+    parser.add_argument("--pages", nargs="+", choices=PAGES)
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--timeout", type=int, default=600,
+                        help="seconds allowed per page render")
+    parser.add_argument("--data-root", default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_report.json")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="diff two reports instead of running")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    parser.add_argument("--import-profile", action="store_true",
+                        help="add per-page heavy import costs to the report")
+    parser.add_argument("--search-scaling", type=int, metavar="ROWS",
+                        help="benchmark parallel search on a synthetic catalog instead of pages")
+    parser.add_argument("--workers", nargs="+", type=int, help="pool sizes for --search-scaling")
+    parser.add_argument("--allocation-check", action="store_true",
+                        help="grow only the catalog and fail if a page's per-rerun allocations grow with it")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    parser.add_argument("--work-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.case:
+        print(json.dumps(run_case(args.case, args.work_dir, args.repeat, args.timeout)))
+        return 0
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        regressions = compare_reports(baseline, current, args.threshold)
+        for r in regressions:
+            print(f"{r['page']} @ {r['rows']:,} rows: {r['metric']} "
+                  f"{r['baseline']:.4g} -> {r['current']:.4g} ({r['ratio']:.2f}x)")
+        return 1 if regressions else 0
+
+    if args.search_scaling:
+        report = benchmark_search_scaling(args.search_scaling, args.workers, args.repeat, args.seed)
+        for row in report["queries"]:
+            print(f"{row['sort']}, type={row['tool_type']}: serial {row['serial_ms']:.1f} ms")
+            for run in row["parallel"]:
+                print(f"  {run['workers']:>3} workers: {run['ms']:.1f} ms "
+                      f"({run['speedup']:.2f}x, matches serial: {run['matches_serial']})")
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+        return 0
+
+    if args.allocation_check:
+        report = run_benchmarks(args.pages or ALLOCATION_CHECK_PAGES, args.sizes, args.repeat,
+                                args.timeout, args.data_root, args.seed, catalog_only=True)
+        report["allocation_growth"] = allocation_growth(report, ALLOCATION_GROWTH_LIMIT)
+        for row in report["allocation_growth"]:
+            if "error" in row:
+                print(f"{row['page']:>12}: failed ({row['error']})")
+                continue
+            small, large = row["peak_memory_bytes"]
+            print(f"{row['page']:>12}: {small / 2**20:.1f} MiB @ {row['rows'][0]:,} rows -> "
+                  f"{large / 2**20:.1f} MiB @ {row['rows'][1]:,} rows "
+                  f"({row['growth']:.2f}x) {'ok' if row['ok'] else 'GROWS WITH CATALOG'}")
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+        return 0 if all(row["ok"] for row in report["allocation_growth"]) else 1
+
+    report = run_benchmarks(args.pages or PAGES, args.sizes, args.repeat, args.timeout,
+                            args.data_root, args.seed)
+    if args.import_profile:
+        report["imports"] = profile_imports(report)
+        for page, info in report["imports"]["pages"].items():
+            print(f"{page:>12}: {info['import_time_s']:.2f}s of heavy imports "
+                  f"({', '.join(info['heavy_modules']) or 'none'}), "
+                  f"saves {info['saved_vs_eager_s']:.2f}s vs eager")
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_generator import CONDITIONS
+from data_store import append_tools, get_tool_image_url, load_tool_catalog, load_user_data
+from instrumentation import span
+from schema import to_bool
+from shards import load_router
+
+# Streaming bulk import of tool listings from a partner CSV.
+#
+# The input is read CHUNK_SIZE rows at a time, so memory stays bounded by the
+# chunk no matter how large the file is. Each chunk is validated and
+# normalized with column operations: owners are resolved against users.csv
+# through a dict, neighborhoods are geocoded from a name -> (lat, lon) table,
+# and image URLs are looked up once per tool type. Valid rows are appended to
+# their city's tools.csv shard with one write per chunk and city; invalid rows
+# are counted (and optionally written to a rejects CSV with the reason).
+
+CHUNK_SIZE = 50_000
+
+REQUIRED_COLUMNS = ["title", "tool_type", "daily_rate", "owner_username", "neighborhood"]
+DEFAULT_BRAND = "Other"
+DEFAULT_CONDITION = "Good"
+HOURLY_FROM_DAILY = 5  # Daily rate is approximately 5x hourly
+LOCATION_JITTER = 0.01
+
+_CONDITION_LOOKUP = {c.lower(): c for c in CONDITIONS}
+
+
+def geocode_table(catalog):
+    """Return neighborhood -> (lat, lon) for all registered and listed neighborhoods"""
+    table = {}
+    for neighborhoods in load_router().neighborhoods.values():
+        table.update(neighborhoods)
+    if len(catalog):
+        codes, names = catalog.codes("neighborhood")
+        found = codes >= 0
+        counts = np.bincount(codes[found], minlength=len(names))
+        lat = np.bincount(codes[found], weights=catalog.column("latitude")[found], minlength=len(names))
+        lon = np.bincount(codes[found], weights=catalog.column("longitude")[found], minlength=len(names))
+        for name, n, lat_sum, lon_sum in zip(names, counts, lat, lon):
+            if n and name not in table:
+                table[name] = (lat_sum / n, lon_sum / n)
+    return table
+
+
+def _text(chunk, column, default=""):
+    if column not in chunk.columns:
+        return pd.Series(default, index=chunk.index, dtype=object)
+    return chunk[column].astype(str).str.strip()
+
+
+def _number(chunk, column):
+    if column not in chunk.columns:
+        return pd.Series(np.nan, index=chunk.index)
+    return pd.to_numeric(chunk[column].str.strip().replace("", np.nan), errors="coerce")
+
+
+def normalize_chunk(chunk, owners, locations, rng):
+    """Validate one chunk of raw rows.
+
+    Returns (tools, rejects): tools in the tools.csv layout (without ids) and
+    the rejected raw rows with a `reason` column.
+    """
+    chunk = chunk.rename(columns=lambda c: c.strip().lower())
+    reason = pd.Series("", index=chunk.index, dtype=object)
+
+    def reject(mask, message):
+        reason[mask & (reason == "")] = message
+
+    missing = [c for c in REQUIRED_COLUMNS if c not in chunk.columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+
+    title = _text(chunk, "title")
+    tool_type = _text(chunk, "tool_type")
+    owner_username = _text(chunk, "owner_username")
+    neighborhood = _text(chunk, "neighborhood")
+    daily_rate = _number(chunk, "daily_rate")
+    hourly_rate = _number(chunk, "hourly_rate")
+    deposit = _number(chunk, "deposit").fillna(0.0)
+
+    owner_name = owner_username.map(owners)
+    base = neighborhood.map(locations)
+
+    reject(title == "", "missing title")
+    reject(tool_type == "", "missing tool_type")
+    reject(owner_name.isna(), "unknown owner")
+    reject(~(np.isfinite(daily_rate) & (daily_rate > 0)), "invalid daily_rate")
+    reject(np.isinf(hourly_rate) | (hourly_rate < 0), "invalid hourly_rate")  # blank is derived
+    reject(~(np.isfinite(deposit) & (deposit >= 0)), "invalid deposit")
+
+    # Rows may bring their own coordinates; otherwise they are geocoded
+    latitude = _number(chunk, "latitude")
+    longitude = _number(chunk, "longitude")
+    has_location = np.isfinite(latitude) & np.isfinite(longitude)
+    reject(~has_location & base.isna(), "unknown neighborhood")
+    reject(neighborhood == "", "missing neighborhood")
+
+    valid = (reason == "").to_numpy()
+    rejects = chunk[~valid].assign(reason=reason[~valid])
+
+    geocoded = np.array(base[valid & ~has_location.to_numpy()].tolist(), dtype=np.float64)
+    geocoded = geocoded.reshape(-1, 2) + rng.uniform(-LOCATION_JITTER, LOCATION_JITTER, (len(geocoded), 2))
+    # Copies: with copy-on-write, to_numpy() returns read-only views
+    latitude, longitude = latitude[valid].to_numpy(copy=True), longitude[valid].to_numpy(copy=True)
+    needs_location = ~has_location[valid].to_numpy()
+    latitude[needs_location] = geocoded[:, 0]
+    longitude[needs_location] = geocoded[:, 1]
+
+    tool_type = tool_type[valid]
+    images = {t: get_tool_image_url(t) for t in tool_type.unique()}
+    daily_rate = daily_rate[valid]
+    hourly_rate = hourly_rate[valid].fillna(daily_rate / HOURLY_FROM_DAILY)
+    condition = _text(chunk, "condition")[valid].str.lower().map(_CONDITION_LOOKUP)
+    brand = _text(chunk, "brand")[valid]
+    description = _text(chunk, "description")[valid]
+    available = _text(chunk, "available", "true")[valid]
+
+    tools = pd.DataFrame({
+        "title": title[valid],
+        "description": description.where(description != "", title[valid]),
+        "tool_type": tool_type,
+        "brand": brand.where(brand != "", DEFAULT_BRAND),
+        "condition": condition.fillna(DEFAULT_CONDITION),
+        "hourly_rate": hourly_rate.round(2),
+        "daily_rate": daily_rate.round(2),
+        "deposit": deposit[valid].round(2),
+        "owner_username": owner_username[valid],
+        "owner_name": owner_name[valid],
+        "neighborhood": neighborhood[valid],
+        "latitude": np.round(latitude, 6),
+        "longitude": np.round(longitude, 6),
+        "rating": 0.0,
+        "review_count": 0,
+        "image_path": "",
+        "available": (available == "") | to_bool(available),
+        "image_url": tool_type.map(images)
+    })
+    return tools, rejects
+
+
+def import_tools(path, chunk_size=CHUNK_SIZE, rejects_path=None, seed=None):
+    """Stream a partner CSV of listings into tools.csv.
+
+    Returns a report with rows read, imported and rejected, the ids assigned
+    per city, the elapsed seconds and the throughput in rows/s.
+    """
+    started = time.perf_counter()
+    users_df = load_user_data()
+    owners = dict(zip(users_df['username'], users_df['name']))
+    locations = geocode_table(load_tool_catalog())
+    rng = np.random.default_rng(seed)
+    report = {"path": path, "rows": 0, "imported": 0, "rejected": 0}
+
+    if rejects_path and os.path.exists(rejects_path):
+        os.remove(rejects_path)
+
+    def chunks():
+        reader = pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunk_size)
+        for raw in reader:
+            with span("bulk_import_chunk", rows=len(raw)):
+                tools, rejects = normalize_chunk(raw, owners, locations, rng)
+            report["rows"] += len(raw)
+            report["imported"] += len(tools)
+            report["rejected"] += len(rejects)
+            if rejects_path and not rejects.empty:
+                rejects.to_csv(rejects_path, mode="a", index=False,
+                               header=not os.path.exists(rejects_path))
+            yield tools
+
+    ids = append_tools(chunks())
+    report["ids"] = {city: (r.start, r.stop - 1) for city, r in ids.items() if len(r)}
+    report["seconds"] = time.perf_counter() - started
+    report["rows_per_second"] = report["rows"] / report["seconds"] if report["seconds"] else 0.0
+    return report
+
+
+def main(argv=None):
+    """Command line entry point for importing a partner inventory"""
+    parser = argparse.ArgumentParser(description="Bulk import tool listings into data/tools.csv")
+    parser.add_argument("path", help="CSV with at least: " + ", ".join(REQUIRED_COLUMNS))
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--rejects", help="write rejected rows and reasons to this CSV")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    report = import_tools(args.path, args.chunk_size, args.rejects, args.seed)
+    print(f"{report['rows']:,} rows read, {report['imported']:,} imported, "
+          f"{report['rejected']:,} rejected in {report['seconds']:.2f}s "
+          f"({report['rows_per_second']:,.0f} rows/s)")
+    for city, (first, last) in report["ids"].items():
+        print(f"New tool ids in {city}: {first}-{last}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+import numpy as np
+import pandas as pd
+
+# Struct-of-arrays view of the tools table for the per-tool hot paths
+# (tool cards, the details page, booking cost). Each column is one contiguous
+# NumPy array; categorical columns keep their integer codes plus a small
+# categories array. Row access goes through ToolRecord views, which hold only
+# (catalog, position) and read values straight out of the arrays, so looking
+# up or iterating tools never materializes a pandas Series.
+#
+# Free-text columns are object arrays when a catalog is built from a
+# DataFrame; catalogs opened from the shared store (catalog_store.py) hold
+# them as StringColumns, which decode single values from a UTF-8 buffer.
+
+
+class StringColumn:
+    """Read-only Arrow-style text column: UTF-8 bytes plus row offsets.
+
+    Missing values (NaN in the DataFrame) are flagged in `null` and read
+    back as NaN.
+    """
+
+    def __init__(self, offsets, data, null):
+        self.offsets = offsets
+        self.data = data
+        self.null = null
+
+    @classmethod
+    def from_values(cls, values):
+        """Encode a sequence of str (or missing) values"""
+        null = np.array([not isinstance(v, str) for v in values], dtype=bool)
+        encoded = [b"" if missing else v.encode("utf-8") for v, missing in zip(values, null)]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, encoded), np.int64, len(encoded)), out=offsets[1:])
+        return cls(offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8), null)
+
+    def __len__(self):
+        return len(self.null)
+
+    def _value(self, position):
+        if self.null[position]:
+            return np.nan
+        return self.data[self.offsets[position]:self.offsets[position + 1]].tobytes().decode("utf-8")
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return self._value(key)
+        return self.to_numpy(np.arange(len(self))[key])
+
+    def to_numpy(self, positions=None):
+        """Decode the column (or just `positions`) into an object array"""
+        positions = range(len(self)) if positions is None else np.asarray(positions).tolist()
+        values = np.empty(len(positions), dtype=object)
+        values[:] = [self._value(p) for p in positions]
+        return values
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.data.nbytes + self.null.nbytes
+
+
+class ToolRecord:
+    """Lightweight read-only view of one row of a ToolCatalog"""
+
+    __slots__ = ("_catalog", "_position")
+
+    def __init__(self, catalog, position):
+        self._catalog = catalog
+        self._position = position
+
+    def __getitem__(self, column):
+        return self._catalog.value(column, self._position)
+
+    def __contains__(self, column):
+        return column in self._catalog.columns
+
+    def __repr__(self):
+        return f"ToolRecord(id={self['id']!r}, title={self['title']!r})"
+
+    @property
+    def position(self):
+        """Row position of this record inside its catalog"""
+        return self._position
+
+    def get(self, column, default=None):
+        """Return a column value, or default if the column does not exist"""
+        if column not in self._catalog.columns:
+            return default
+        return self._catalog.value(column, self._position)
+
+    def keys(self):
+        """Return the column names, in table order"""
+        return self._catalog.columns
+
+    def to_dict(self):
+        """Return the row as a plain dict of Python scalars"""
+        row = {}
+        for column in self._catalog.columns:
+            value = self._catalog.value(column, self._position)
+            if isinstance(value, np.float32):
+                # str() gives the shortest float32 repr, so 17.46 stays 17.46
+                value = float(str(value))
+            row[column] = value.item() if isinstance(value, np.generic) else value
+        return row
+
+    def detach(self):
+        """Return an independent view pinned to the current position.
+
+        Records yielded by ToolCatalog.iter_records are reused between
+        iterations; call detach() to keep one past the loop.
+        """
+        return ToolRecord(self._catalog, self._position)
+
+
+class ToolCatalog:
+    """Immutable column store for the tools table"""
+
+    def __init__(self, arrays, categories, columns, version=0):
+        self._arrays = arrays
+        self._categories = categories
+        self.columns = tuple(columns)
+        self.version = version
+
+        ids = arrays["id"]
+        if len(ids) and np.all(ids[1:] >= ids[:-1]):
+            self._id_order = None
+            self._sorted_ids = ids
+        else:
+            self._id_order = np.argsort(ids, kind="stable")
+            self._sorted_ids = ids[self._id_order]
+
+    @classmethod
+    def from_frame(cls, df, version=0):
+        """Build a catalog from a tools DataFrame (positions follow df order)"""
+        arrays = {}
+        categories = {}
+        for column in df.columns:
+            series = df[column]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                arrays[column] = np.ascontiguousarray(series.cat.codes.to_numpy())
+                categories[column] = np.asarray(series.cat.categories, dtype=object)
+            else:
+                arrays[column] = np.ascontiguousarray(series.to_numpy())
+            arrays[column].setflags(write=False)
+        return cls(arrays, categories, df.columns, version)
+
+    def __len__(self):
+        return len(self._arrays["id"])
+
+    def __iter__(self):
+        return self.iter_records()
+
+    def value(self, column, position):
+        """Return a single cell without building a row"""
+        value = self._arrays[column][position]
+        categories = self._categories.get(column)
+        if categories is not None:
+            return categories[value] if value >= 0 else None
+        return value
+
+    def column(self, column):
+        """Return a whole column as a NumPy array (decoded if categorical)"""
+        values = self._arrays[column]
+        categories = self._categories.get(column)
+        if categories is not None:
+            return np.where(values >= 0, categories[np.maximum(values, 0)], None)
+        if isinstance(values, StringColumn):
+            return values.to_numpy()
+        return values
+
+    def take(self, column, positions):
+        """Return a column's values at `positions` (decoded if categorical)"""
+        values = self._arrays[column]
+        if isinstance(values, StringColumn):
+            return values.to_numpy(positions)
+        values = values[positions]
+        categories = self._categories.get(column)
+        if categories is not None:
+            return np.where(values >= 0, categories[np.maximum(values, 0)], None)
+        return values
+
+    def is_categorical(self, column):
+        """Return True if a column is stored as integer codes plus categories"""
+        return column in self._categories
+
+    def codes(self, column):
+        """Return the integer codes and categories of a categorical column"""
+        return self._arrays[column], self._categories[column]
+
+    def position(self, tool_id):
+        """Return the row position of tool_id, or -1 if it is not in the catalog"""
+        i = np.searchsorted(self._sorted_ids, tool_id)
+        if i >= len(self._sorted_ids) or self._sorted_ids[i] != tool_id:
+            return -1
+        return int(i) if self._id_order is None else int(self._id_order[i])
+
+    def positions(self, tool_ids):
+        """Vectorized position(): map an array of ids to row positions (-1 if missing)"""
+        tool_ids = np.asarray(tool_ids)
+        i = np.minimum(np.searchsorted(self._sorted_ids, tool_ids), max(len(self) - 1, 0))
+        found = (self._sorted_ids[i] == tool_ids) if len(self) else np.zeros(len(tool_ids), bool)
+        positions = i if self._id_order is None else self._id_order[i]
+        return np.where(found, positions, -1)
+
+    def get(self, tool_id):
+        """Return a ToolRecord for tool_id, or None if it does not exist"""
+        position = self.position(tool_id)
+        return ToolRecord(self, position) if position >= 0 else None
+
+    def record(self, position):
+        """Return a ToolRecord for a row position"""
+        return ToolRecord(self, position)
+
+    def iter_records(self, positions=None):
+        """Iterate rows (optionally only `positions`) through one reused record"""
+        record = ToolRecord(self, 0)
+        for position in range(len(self)) if positions is None else positions:
+            record._position = int(position)
+            yield record
+
+    def to_frame(self, positions=None):
+        """Export the catalog (or a subset of positions) as a pandas DataFrame"""
+        data = {}
+        for column in self.columns:
+            values = self._arrays[column]
+            if isinstance(values, StringColumn):
+                values = values.to_numpy(positions)
+            elif positions is not None:
+                values = values[positions]
+            categories = self._categories.get(column)
+            if categories is not None:
+                data[column] = pd.Categorical.from_codes(values, categories=categories)
+            else:
+                data[column] = values
+        return pd.DataFrame(data, columns=list(self.columns))
+
+    def nbytes(self):
+        """Return the memory held by the column arrays (excluding string payloads)"""
+        return sum(a.nbytes for a in self._arrays.values()) + \
+            sum(c.nbytes for c in self._categories.values())
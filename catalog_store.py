@@ -0,0 +1,125 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+from catalog import StringColumn, ToolCatalog
+from instrumentation import span
+
+# Memory-mapped catalog store shared by every process on the host.
+#
+# Each version of a shard's tools table is written once, as one .npy file per
+# column, to <shard dir>/.catalog/<version>/. Every process (Streamlit
+# servers, the API, job workers) opens those files with mmap_mode="r", so the
+# columns are read-only views of the same page-cache pages: the catalog is
+# held in memory once per host instead of once per process, and opening it
+# skips parsing tools.csv. Categorical columns are stored as their codes (the
+# categories are in meta.json); free-text columns as UTF-8 bytes plus offsets.
+#
+# Versions are swapped in, never modified: a new version is built in a
+# temporary directory and renamed into place, so readers only ever see
+# complete stores. Older versions are deleted after the swap; processes that
+# still map them keep valid views until they move to the new version.
+
+STORE_DIRNAME = ".catalog"
+KEEP_VERSIONS = 2
+META_FILE = "meta.json"
+
+
+def store_dir(tools_path, version):
+    """Return the store directory of one version of a shard's tools table"""
+    return os.path.join(os.path.dirname(tools_path), STORE_DIRNAME, str(version))
+
+
+def _save(directory, name, array):
+    np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(array), allow_pickle=False)
+
+
+def _load(directory, name):
+    # A plain ndarray view of the map, so results never come back as np.memmap
+    array = np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r", allow_pickle=False)
+    return array.view(np.ndarray)
+
+
+def write_store(catalog, directory):
+    """Write a catalog to a store directory (atomically; no-op if it exists)"""
+    if os.path.exists(os.path.join(directory, META_FILE)):
+        return
+    tmp = f"{directory}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    meta = {"version": catalog.version, "columns": list(catalog.columns),
+            "categories": {}, "strings": []}
+    with span("write_catalog_store", rows=len(catalog)):
+        for column in catalog.columns:
+            if catalog.is_categorical(column):
+                codes, categories = catalog.codes(column)
+                _save(tmp, column, codes)
+                meta["categories"][column] = [str(c) for c in categories]
+                continue
+            values = catalog.column(column)
+            if values.dtype == object:
+                strings = StringColumn.from_values(values)
+                _save(tmp, f"{column}.offsets", strings.offsets)
+                _save(tmp, f"{column}.utf8", strings.data)
+                _save(tmp, f"{column}.null", strings.null)
+                meta["strings"].append(column)
+            else:
+                _save(tmp, column, values)
+        # meta.json last: a store without it is incomplete
+        with open(os.path.join(tmp, META_FILE), "w") as f:
+            json.dump(meta, f)
+
+    try:
+        os.rename(tmp, directory)
+    except OSError:
+        # Another process swapped the same version in first
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def open_store(directory):
+    """Open a store as a ToolCatalog of read-only memory-mapped columns"""
+    with open(os.path.join(directory, META_FILE)) as f:
+        meta = json.load(f)
+    arrays = {}
+    for column in meta["columns"]:
+        if column in meta["strings"]:
+            arrays[column] = StringColumn(_load(directory, f"{column}.offsets"),
+                                          _load(directory, f"{column}.utf8"),
+                                          _load(directory, f"{column}.null"))
+        else:
+            arrays[column] = _load(directory, column)
+    categories = {column: np.asarray(values, dtype=object)
+                  for column, values in meta["categories"].items()}
+    return ToolCatalog(arrays, categories, meta["columns"], meta["version"])
+
+
+def prune_versions(tools_path, keep=KEEP_VERSIONS):
+    """Delete all but the newest `keep` store versions of a shard"""
+    root = os.path.join(os.path.dirname(tools_path), STORE_DIRNAME)
+    if not os.path.isdir(root):
+        return
+    versions = sorted((int(name) for name in os.listdir(root) if name.isdigit()), reverse=True)
+    for version in versions[keep:]:
+        shutil.rmtree(os.path.join(root, str(version)), ignore_errors=True)
+
+
+def load_shared_catalog(tools_path, version, build):
+    """Return the shared catalog for a version of a shard, building it if needed.
+
+    build() returns an in-memory ToolCatalog and is only called by the first
+    process that needs this version. It returns None if the shard no longer
+    holds that version; nothing is stored then, and None is returned.
+    """
+    directory = store_dir(tools_path, version)
+    if not os.path.exists(os.path.join(directory, META_FILE)):
+        catalog = build()
+        if catalog is None:
+            return None
+        os.makedirs(os.path.dirname(directory), exist_ok=True)
+        write_store(catalog, directory)
+        prune_versions(tools_path)
+    with span("open_catalog_store"):
+        return open_store(directory)
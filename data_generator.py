@@ -0,0 +1,425 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # optional: chunks are then written with DataFrame.to_csv
+    pa = None
+
+
+# Catalog constants shared by the demo data and the load-test generator
+TOOL_TYPES = [
+    "Power Drill", "Circular Saw", "Lawn Mower", "Pressure Washer",
+    "Hedge Trimmer", "Ladder", "Chain Saw", "Sander", "Nail Gun",
+    "Air Compressor", "Generator", "Router", "Planer", "Jigsaw",
+    "Rotary Hammer", "Tile Cutter", "Paint Sprayer", "Leaf Blower"
+]
+
+BRANDS = [
+    "DeWalt", "Makita", "Milwaukee", "Bosch", "Ryobi", "Black & Decker",
+    "Craftsman", "Ridgid", "Festool", "Hitachi", "Porter-Cable", "Kobalt"
+]
+
+CONDITIONS = ["Like New", "Good", "Fair", "Well Used but Functional"]
+
+NEIGHBORHOODS = {
+    "Downtown": (40.7128, -74.0060),
+    "Midtown": (40.7549, -73.9840),
+    "Uptown": (40.8075, -73.9626),
+    "Brooklyn Heights": (40.6950, -73.9950),
+    "Williamsburg": (40.7081, -73.9571),
+    "Astoria": (40.7636, -73.9232),
+    "Park Slope": (40.6710, -73.9814),
+    "Long Island City": (40.7447, -73.9485)
+}
+
+DESCRIPTION_TEMPLATES = [
+    "Great {tool_type} for home projects. Well maintained and ready to use.",
+    "Professional grade {tool_type}. Perfect for serious DIYers.",
+    "Reliable {tool_type} that gets the job done. Easy to use.",
+    "High-quality {brand} {tool_type}. Powerful and efficient.",
+    "Versatile {tool_type} suitable for various applications."
+]
+
+TOOL_IMAGE_FILES = {
+    "Power Drill": "powerdrillsnew.jpg",
+    "Circular Saw": "chainsawnew.jpg",
+    "Lawn Mower": "laddernew.jpg",
+    "Pressure Washer": "paintsprayernew.jpg",
+    "Leaf Blower": "routertoolnew.jpg",
+    "Hedge Trimmer": "rotaryhammernew.jpg",
+    "Ladder": "laddernew.jpg",
+    "Chain Saw": "chainsawnew.jpg",
+    "Sander": "sandernew.jpg",
+    "Nail Gun": "generatornew.jpg",
+    "Air Compressor": "aircompressor.jpg",
+    "Generator": "generatornew.jpg",
+    "Router": "routertoolnew.jpg",
+    "Planer": "planernew.jpg",
+    "Jigsaw": "jigsawnew.jpg",
+    "Rotary Hammer": "rotaryhammernew.jpg",
+    "Tile Cutter": "tilercutternew.jpg",
+    "Paint Sprayer": "paintsprayernew.jpg"
+}
+
+DEMO_USERS = [
+    {"username": "john_diy", "name": "John Smith", "email": "john@example.com"},
+    {"username": "sarah_maker", "name": "Sarah Johnson", "email": "sarah@example.com"},
+    {"username": "mike_build", "name": "Mike Chen", "email": "mike@example.com"},
+    {"username": "lisa_craft", "name": "Lisa Rodriguez", "email": "lisa@example.com"},
+    {"username": "david_tools", "name": "David Wilson", "email": "david@example.com"},
+    {"username": "emma_fix", "name": "Emma Brown", "email": "emma@example.com"},
+    {"username": "demo_user", "name": "Demo User", "email": "demo@toolshare.com"}
+]
+
+FIRST_NAMES = [
+    "Alex", "Jordan", "Taylor", "Morgan", "Casey", "Riley", "Jamie", "Avery",
+    "Quinn", "Parker", "Reese", "Rowan", "Skyler", "Drew", "Hayden", "Emerson"
+]
+
+LAST_NAMES = [
+    "Garcia", "Lee", "Patel", "Nguyen", "Kim", "Martinez", "Davis", "Lopez",
+    "Clark", "Lewis", "Walker", "Young", "Allen", "King", "Wright", "Scott"
+]
+
+TOOL_COLUMNS = [
+    "id", "title", "description", "tool_type", "brand", "condition",
+    "hourly_rate", "daily_rate", "deposit", "owner_username", "owner_name",
+    "neighborhood", "latitude", "longitude", "rating", "review_count",
+    "image_path", "available", "image_url"
+]
+
+BOOKING_COLUMNS = [
+    "id", "tool_id", "renter_username", "start_date", "end_date",
+    "total_cost", "status", "created_at"
+]
+
+SWAP_COLUMNS = [
+    "id", "proposer_username", "proposer_tool_id", "receiver_username",
+    "receiver_tool_id", "status", "proposed_date", "accepted_date"
+]
+
+BOOKING_STATUSES = ["Pending", "Approved", "Declined", "Cancelled", "Returned", "Completed"]
+BOOKING_STATUS_WEIGHTS = [0.15, 0.15, 0.05, 0.05, 0.1, 0.5]
+
+SWAP_STATUSES = ["Pending", "Accepted", "Declined"]
+SWAP_STATUS_WEIGHTS = [0.4, 0.4, 0.2]
+
+DEFAULT_CHUNK_SIZE = 1_000_000
+
+# Bookings and swaps are spread over the year before this date
+HISTORY_END = np.datetime64("2024-06-01")
+HISTORY_DAYS = 365
+
+
+def _require_users(users_df, n, table):
+    """Raise ValueError if n rows of table would need users but there are none"""
+    if n > 0 and len(users_df) == 0:
+        raise ValueError(f"cannot generate {table} without any users")
+
+
+def _rng(seed, *stream):
+    """Return a generator for an independent, reproducible sub-stream of seed"""
+    return np.random.default_rng([seed, *stream] if seed is not None else None)
+
+
+def _chunks(total, chunk_size):
+    """Yield (chunk_index, start, stop) ranges covering total rows"""
+    for index, start in enumerate(range(0, total, chunk_size)):
+        yield index, start, min(start + chunk_size, total)
+
+
+def _join(*parts):
+    """Concatenate string arrays/scalars element-wise into an object array"""
+    result = pd.Series(parts[0]) if not np.isscalar(parts[0]) else parts[0]
+    for part in parts[1:]:
+        result = result + (pd.Series(part) if not np.isscalar(part) else part)
+    return np.asarray(result, dtype=object)
+
+
+def resolve_neighborhoods(neighborhoods=None, seed=0):
+    """Return a name -> (lat, lon) mapping for the requested neighborhoods.
+
+    Accepts None (the eight demo neighborhoods), a mapping, or an integer count.
+    Counts above eight add synthetic neighborhoods scattered around the city.
+    """
+    if neighborhoods is None:
+        return dict(NEIGHBORHOODS)
+    if isinstance(neighborhoods, dict):
+        return dict(neighborhoods)
+
+    count = int(neighborhoods)
+    names = list(NEIGHBORHOODS)[:count]
+    resolved = {name: NEIGHBORHOODS[name] for name in names}
+    extra = count - len(resolved)
+    if extra > 0:
+        rng = _rng(seed, 0)
+        lats = 40.70 + rng.uniform(-0.15, 0.15, extra)
+        lons = -73.95 + rng.uniform(-0.15, 0.15, extra)
+        for i in range(extra):
+            resolved[f"Neighborhood {len(NEIGHBORHOODS) + i + 1}"] = (float(lats[i]), float(lons[i]))
+    return resolved
+
+
+def generate_users(n_users, seed=0):
+    """Generate a users table; the demo accounts always come first"""
+    demo = DEMO_USERS[:n_users]
+    extra = max(0, n_users - len(demo))
+    if extra == 0:
+        return pd.DataFrame(demo, columns=["username", "name", "email"])
+
+    idx = np.arange(len(DEMO_USERS), len(DEMO_USERS) + extra)
+    rng = _rng(seed, 1)
+    first = np.asarray(FIRST_NAMES, dtype=object)[rng.integers(0, len(FIRST_NAMES), extra)]
+    last = np.asarray(LAST_NAMES, dtype=object)[rng.integers(0, len(LAST_NAMES), extra)]
+    usernames = _join("user_", idx.astype(str))
+
+    generated = pd.DataFrame({
+        "username": usernames,
+        "name": _join(first, " ", last),
+        "email": _join(usernames, "@example.com")
+    })
+    return pd.concat([pd.DataFrame(demo), generated], ignore_index=True)
+
+
+def generate_tools(n_listings, users_df, neighborhoods=None, seed=0, start_id=1):
+    """Generate n_listings tool rows in one vectorized pass"""
+    neighborhoods = resolve_neighborhoods(neighborhoods, seed)
+    rng = _rng(seed, 2, start_id)
+    n = int(n_listings)
+    _require_users(users_df, n, "tools")
+
+    type_idx = rng.integers(0, len(TOOL_TYPES), n)
+    brand_idx = rng.integers(0, len(BRANDS), n)
+    template_idx = rng.integers(0, len(DESCRIPTION_TEMPLATES), n)
+    hood_idx = rng.integers(0, len(neighborhoods), n)
+    owner_idx = rng.integers(0, len(users_df), n)
+
+    # Every (brand, type) title and (template, brand, type) description is
+    # built once and then gathered by index instead of formatted per row.
+    titles = np.array([f"{b} {t}" for b in BRANDS for t in TOOL_TYPES], dtype=object)
+    descriptions = np.array([
+        template.format(brand=b, tool_type=t)
+        for template in DESCRIPTION_TEMPLATES for b in BRANDS for t in TOOL_TYPES
+    ], dtype=object)
+    image_urls = np.array([
+        os.path.join("images", TOOL_IMAGE_FILES.get(t, "default.jpg")) for t in TOOL_TYPES
+    ], dtype=object)
+
+    hood_names = np.array(list(neighborhoods), dtype=object)
+    hood_coords = np.array(list(neighborhoods.values()), dtype=np.float64)
+
+    hourly_rate = np.round(rng.uniform(5, 25, n), 2)
+    daily_rate = np.round(hourly_rate * 5, 2)  # Daily rate is approximately 5x hourly
+    deposit = np.where(rng.random(n) > 0.3, np.round(rng.uniform(20, 100, n), 2), 0.0)
+
+    ids = np.arange(start_id, start_id + n)
+    pair_idx = brand_idx * len(TOOL_TYPES) + type_idx
+
+    return pd.DataFrame({
+        "id": ids,
+        "title": titles[pair_idx],
+        "description": descriptions[template_idx * len(titles) + pair_idx],
+        "tool_type": np.asarray(TOOL_TYPES, dtype=object)[type_idx],
+        "brand": np.asarray(BRANDS, dtype=object)[brand_idx],
+        "condition": np.asarray(CONDITIONS, dtype=object)[rng.integers(0, len(CONDITIONS), n)],
+        "hourly_rate": hourly_rate,
+        "daily_rate": daily_rate,
+        "deposit": deposit,
+        "owner_username": users_df["username"].to_numpy(dtype=object)[owner_idx],
+        "owner_name": users_df["name"].to_numpy(dtype=object)[owner_idx],
+        "neighborhood": hood_names[hood_idx],
+        "latitude": hood_coords[hood_idx, 0] + rng.uniform(-0.01, 0.01, n),
+        "longitude": hood_coords[hood_idx, 1] + rng.uniform(-0.01, 0.01, n),
+        "rating": np.round(rng.uniform(3, 5, n), 1),
+        "review_count": rng.integers(0, 26, n),
+        "image_path": _join("images/tool_", ids.astype(str), ".jpg"),
+        "available": rng.random(n) > 0.2,  # 80% of tools are available
+        "image_url": image_urls[type_idx]
+    }, columns=TOOL_COLUMNS)
+
+
+def _format_dates(days, with_time=False, seconds=None):
+    """Format day offsets before HISTORY_END as date (or datetime) strings"""
+    dates = HISTORY_END - HISTORY_DAYS + days.astype("timedelta64[D]")
+    if not with_time:
+        return np.datetime_as_string(dates, unit="D")
+    stamps = dates.astype("datetime64[s]") + seconds.astype("timedelta64[s]")
+    return np.char.replace(np.datetime_as_string(stamps, unit="s"), "T", " ")
+
+
+def generate_bookings(n_bookings, daily_rates, users_df, seed=0, start_id=1):
+    """Generate n_bookings rows against tools whose daily rates are given.
+
+    daily_rates[i] is the rate of tool id i + 1, so total_cost stays consistent
+    with the tools table without holding that table in memory.
+    """
+    rng = _rng(seed, 3, start_id)
+    n = int(n_bookings)
+    _require_users(users_df, n, "bookings")
+
+    tool_idx = rng.integers(0, len(daily_rates), n)
+    renter_idx = rng.integers(0, len(users_df), n)
+    start_day = rng.integers(0, HISTORY_DAYS, n)
+    duration = rng.integers(1, 8, n)
+    lead_days = rng.integers(0, 15, n)
+
+    return pd.DataFrame({
+        "id": np.arange(start_id, start_id + n),
+        "tool_id": tool_idx + 1,
+        "renter_username": users_df["username"].to_numpy(dtype=object)[renter_idx],
+        "start_date": _format_dates(start_day),
+        "end_date": _format_dates(start_day + duration),
+        "total_cost": np.round(duration * np.asarray(daily_rates)[tool_idx], 2),
+        "status": rng.choice(BOOKING_STATUSES, n, p=BOOKING_STATUS_WEIGHTS),
+        "created_at": _format_dates(start_day - lead_days, True, rng.integers(0, 86400, n))
+    }, columns=BOOKING_COLUMNS)
+
+
+def generate_swaps(n_swaps, owner_idx, users_df, seed=0, start_id=1):
+    """Generate n_swaps rows between tools owned by different users.
+
+    owner_idx[i] is the users_df row owning tool id i + 1.
+    """
+    rng = _rng(seed, 4, start_id)
+    n = int(n_swaps)
+    owner_idx = np.asarray(owner_idx)
+    usernames = users_df["username"].to_numpy(dtype=object)
+
+    proposer_tool = rng.integers(0, len(owner_idx), n)
+    receiver_tool = rng.integers(0, len(owner_idx), n)
+    # Re-draw receivers that landed on the proposer's own tools once; any
+    # leftovers are shifted to the neighbouring tool.
+    same_owner = owner_idx[proposer_tool] == owner_idx[receiver_tool]
+    receiver_tool[same_owner] = rng.integers(0, len(owner_idx), int(same_owner.sum()))
+    same_owner = owner_idx[proposer_tool] == owner_idx[receiver_tool]
+    receiver_tool[same_owner] = (receiver_tool[same_owner] + 1) % len(owner_idx)
+
+    status = rng.choice(SWAP_STATUSES, n, p=SWAP_STATUS_WEIGHTS)
+    proposed_day = rng.integers(0, HISTORY_DAYS, n)
+    proposed = _format_dates(proposed_day, True, rng.integers(0, 86400, n))
+    accepted = _format_dates(proposed_day + rng.integers(0, 4, n), True, rng.integers(0, 86400, n))
+
+    return pd.DataFrame({
+        "id": np.arange(start_id, start_id + n),
+        "proposer_username": usernames[owner_idx[proposer_tool]],
+        "proposer_tool_id": proposer_tool + 1,
+        "receiver_username": usernames[owner_idx[receiver_tool]],
+        "receiver_tool_id": receiver_tool + 1,
+        "status": status,
+        "proposed_date": proposed,
+        "accepted_date": np.where(status == "Accepted", accepted.astype(object), None)
+    }, columns=SWAP_COLUMNS)
+
+
+def _write_chunk(df, path, first):
+    """Write the first chunk with a header and append the rest.
+
+    With pyarrow installed the chunk goes through its CSV writer, which is
+    several times faster than DataFrame.to_csv. It quotes text values and
+    writes whole floats without ".0"; read_csv parses both the same way.
+    Bools are written as True/False either way.
+    """
+    if pa is None:
+        df.to_csv(path, index=False, mode="w" if first else "a", header=first)
+        return
+    df = df.assign(**{column: np.where(df[column], "True", "False")
+                      for column in df.columns if df[column].dtype == bool})
+    with open(path, "wb" if first else "ab") as f:
+        pa_csv.write_csv(pa.Table.from_pandas(df, preserve_index=False), f,
+                         pa_csv.WriteOptions(include_header=first))
+
+
+def generate_dataset(listings=50, users=len(DEMO_USERS), bookings=0, swaps=0,
+                     neighborhoods=None, seed=0, output_dir="data",
+                     chunk_size=DEFAULT_CHUNK_SIZE):
+    """Generate a full marketplace dataset and stream it to CSV in chunks.
+
+    The same arguments (including chunk_size) always produce identical files
+    for a given CSV writer (pyarrow or pandas, see _write_chunk).
+    Throughput is bound by CSV formatting: on one core, roughly 300k tool
+    rows/s with pyarrow and 70k rows/s without it, so 10M listings take
+    about half a minute (two to three minutes without pyarrow).
+    Only the users table and two compact per-tool arrays (daily rate and owner
+    index) stay in memory; every other table is written chunk by chunk.
+    Returns a dict of table name -> {"path", "rows", "seconds"}.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    neighborhoods = resolve_neighborhoods(neighborhoods, seed)
+    report = {}
+
+    started = time.perf_counter()
+    users_df = generate_users(users, seed)
+    users_path = os.path.join(output_dir, "users.csv")
+    users_df.to_csv(users_path, index=False)
+    report["users"] = {"path": users_path, "rows": len(users_df),
+                       "seconds": time.perf_counter() - started}
+
+    daily_rates = np.empty(listings, dtype=np.float64)
+    owner_idx = np.empty(listings, dtype=np.int64)
+    owner_lookup = pd.Index(users_df["username"])
+
+    started = time.perf_counter()
+    tools_path = os.path.join(output_dir, "tools.csv")
+    for index, start, stop in _chunks(listings, chunk_size):
+        chunk = generate_tools(stop - start, users_df, neighborhoods, seed, start_id=start + 1)
+        daily_rates[start:stop] = chunk["daily_rate"].to_numpy()
+        owner_idx[start:stop] = owner_lookup.get_indexer(chunk["owner_username"])
+        _write_chunk(chunk, tools_path, index == 0)
+    if listings == 0:
+        pd.DataFrame(columns=TOOL_COLUMNS).to_csv(tools_path, index=False)
+    report["tools"] = {"path": tools_path, "rows": listings,
+                       "seconds": time.perf_counter() - started}
+
+    for name, count, columns, make in (
+        ("bookings", bookings, BOOKING_COLUMNS,
+         lambda n, start: generate_bookings(n, daily_rates, users_df, seed, start)),
+        ("tool_swaps", swaps, SWAP_COLUMNS,
+         lambda n, start: generate_swaps(n, owner_idx, users_df, seed, start)),
+    ):
+        started = time.perf_counter()
+        path = os.path.join(output_dir, f"{name}.csv")
+        if count == 0 or listings == 0:
+            pd.DataFrame(columns=columns).to_csv(path, index=False)
+            count = 0
+        for index, start, stop in _chunks(count, chunk_size):
+            _write_chunk(make(stop - start, start + 1), path, index == 0)
+        report[name] = {"path": path, "rows": count,
+                        "seconds": time.perf_counter() - started}
+
+    return report
+
+
+def main(argv=None):
+    """Command line entry point for generating load-test datasets"""
+    parser = argparse.ArgumentParser(description="Generate synthetic ToolShare data")
+    parser.add_argument("--listings", type=int, default=50)
+    parser.add_argument("--users", type=int, default=len(DEMO_USERS))
+    parser.add_argument("--bookings", type=int, default=0)
+    parser.add_argument("--swaps", type=int, default=0)
+    parser.add_argument("--neighborhoods", type=int, default=len(NEIGHBORHOODS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-dir", default="data")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+    if args.users < 1 and (args.listings > 0 or args.bookings > 0):
+        parser.error("--listings and --bookings need at least one user (--users)")
+
+    report = generate_dataset(
+        listings=args.listings, users=args.users, bookings=args.bookings,
+        swaps=args.swaps, neighborhoods=args.neighborhoods, seed=args.seed,
+        output_dir=args.output_dir, chunk_size=args.chunk_size
+    )
+    for name, info in report.items():
+        rate = info["rows"] / info["seconds"] if info["seconds"] else 0
+        print(f"{name}: {info['rows']:,} rows -> {info['path']} "
+              f"in {info['seconds']:.2f}s ({rate:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
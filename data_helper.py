@@ -1,218 +1,50 @@
+import numpy as np
 import pandas as pd
-import os
-import random
-from datetime import datetime, timedelta
+import streamlit as st
+from datetime import datetime
 
+from data_generator import BOOKING_COLUMNS, DEMO_USERS, generate_users, generate_tools
 
-# Function to initialize data directories
-def initialize_data_directories():
-    """Create necessary directories for data storage"""
-    os.makedirs('data', exist_ok=True)
-    os.makedirs('images', exist_ok=True)
+# Data loading and manipulation go through the shared data_store layer (and are
+# re-exported here), so the app and these helpers share one cached copy of each
+# table per rerun.
+from data_store import (
+    initialize_data_directories, load_user_data, load_tool_data, load_tool_catalog, load_bookings_data,
+    get_booking, get_tool, get_user, save_users, save_tools, save_bookings,
+    add_tool_listing, update_tool_availability, create_booking, update_booking_status
+)
+from parallel_search import PARALLEL_MIN_ROWS, load_parallel_search
+from ranking import DEFAULT_RESULTS, SORT_WEIGHTS, load_neighborhood_index, rank_tools, top_order
+from shards import load_router
+from user_views import load_user_views
 
 
 # Functions to generate mock data for the demo
 def generate_mock_users():
     """Generate mock user data for the demo"""
-    users = [
-        {"username": "john_diy", "name": "John Smith", "email": "john@example.com"},
-        {"username": "sarah_maker", "name": "Sarah Johnson", "email": "sarah@example.com"},
-        {"username": "mike_build", "name": "Mike Chen", "email": "mike@example.com"},
-        {"username": "lisa_craft", "name": "Lisa Rodriguez", "email": "lisa@example.com"},
-        {"username": "david_tools", "name": "David Wilson", "email": "david@example.com"},
-        {"username": "emma_fix", "name": "Emma Brown", "email": "emma@example.com"},
-        {"username": "demo_user", "name": "Demo User", "email": "demo@toolshare.com"}
-    ]
-
-    df = pd.DataFrame(users)
-    df.to_csv('data/users.csv', index=False)
+    df = generate_users(len(DEMO_USERS))
+    save_users(df)
     return df
 
 
-def generate_mock_tools(users_df):
+def generate_mock_tools(users_df, count=50, seed=0):
     """Generate mock tool listings for the demo"""
-    tool_types = [
-        "Power Drill", "Circular Saw", "Lawn Mower", "Pressure Washer",
-        "Hedge Trimmer", "Ladder", "Chain Saw", "Sander", "Nail Gun",
-        "Air Compressor", "Generator", "Router", "Planer", "Jigsaw",
-        "Rotary Hammer", "Tile Cutter", "Paint Sprayer", "Leaf Blower"
-    ]
-
-    brands = [
-        "DeWalt", "Makita", "Milwaukee", "Bosch", "Ryobi", "Black & Decker",
-        "Craftsman", "Ridgid", "Festool", "Hitachi", "Porter-Cable", "Kobalt"
-    ]
-
-    conditions = ["Like New", "Good", "Fair", "Well Used but Functional"]
-
-    # Define a fixed set of neighborhoods with coordinates for the demo
-    neighborhoods = {
-        "Downtown": (40.7128, -74.0060),
-        "Midtown": (40.7549, -73.9840),
-        "Uptown": (40.8075, -73.9626),
-        "Brooklyn Heights": (40.6950, -73.9950),
-        "Williamsburg": (40.7081, -73.9571),
-        "Astoria": (40.7636, -73.9232),
-        "Park Slope": (40.6710, -73.9814),
-        "Long Island City": (40.7447, -73.9485)
-    }
-
-    # Generate 50 mock tools
-    mock_data = []
-
-    for i in range(50):
-        neighborhood = random.choice(list(neighborhoods.keys()))
-        lat, lon = neighborhoods[neighborhood]
-        # Add small random variation to lat/lon to spread tools out
-        lat += random.uniform(-0.01, 0.01)
-        lon += random.uniform(-0.01, 0.01)
-
-        owner = users_df.iloc[random.randint(0, len(users_df) - 1)]
-
-        tool_type = random.choice(tool_types)
-        brand = random.choice(brands)
-
-        # Create a title that combines brand and tool type
-        title = f"{brand} {tool_type}"
-
-        # Create a more detailed description
-        descriptions = [
-            f"Great {tool_type} for home projects. Well maintained and ready to use.",
-            f"Professional grade {tool_type}. Perfect for serious DIYers.",
-            f"Reliable {tool_type} that gets the job done. Easy to use.",
-            f"High-quality {brand} {tool_type}. Powerful and efficient.",
-            f"Versatile {tool_type} suitable for various applications."
-        ]
-
-        hourly_rate = round(random.uniform(5, 25), 2)
-        daily_rate = round(hourly_rate * 5, 2)  # Daily rate is approximately 5x hourly
-
-        # Some tools will have a security deposit
-        deposit = round(random.uniform(20, 100), 2) if random.random() > 0.3 else 0
-
-        # Generate random ratings with a bias toward positive reviews
-        rating = round(random.uniform(3, 5), 1)
-        review_count = random.randint(0, 25)
-
-        mock_data.append({
-            "id": i + 1,
-            "title": title,
-            "description": random.choice(descriptions),
-            "tool_type": tool_type,
-            "brand": brand,
-            "condition": random.choice(conditions),
-            "hourly_rate": hourly_rate,
-            "daily_rate": daily_rate,
-            "deposit": deposit,
-            "owner_username": owner["username"],
-            "owner_name": owner["name"],
-            "neighborhood": neighborhood,
-            "latitude": lat,
-            "longitude": lon,
-            "rating": rating,
-            "review_count": review_count,
-            "image_path": f"images/tool_{i + 1}.jpg",  # Placeholder image paths
-            "available": random.random() > 0.2  # 80% of tools are available
-        })
-
-    df = pd.DataFrame(mock_data)
-    df.to_csv('data/tools.csv', index=False)
+    df = generate_tools(count, users_df, seed=seed)
+    save_tools(df)
     return df
 
 
 def initialize_bookings():
     """Initialize an empty bookings dataframe"""
-    bookings_df = pd.DataFrame(columns=[
-        "id", "tool_id", "renter_username", "start_date", "end_date",
-        "total_cost", "status", "created_at"
-    ])
-    bookings_df.to_csv('data/bookings.csv', index=False)
+    bookings_df = pd.DataFrame(columns=BOOKING_COLUMNS)
+    save_bookings(bookings_df)
     return bookings_df
 
 
-# Data loading functions
-def load_user_data():
-    """Load user data from CSV file or generate if it doesn't exist"""
-    if os.path.exists('data/users.csv'):
-        return pd.read_csv('data/users.csv')
-    else:
-        return generate_mock_users()
-
-
-def load_tool_data():
-    """Load tool data from CSV file or generate if it doesn't exist"""
-    if os.path.exists('data/tools.csv'):
-        return pd.read_csv('data/tools.csv')
-    else:
-        users_df = load_user_data()
-        return generate_mock_tools(users_df)
-
-
-def load_bookings_data():
-    """Load bookings data from CSV file or initialize if it doesn't exist"""
-    if os.path.exists('data/bookings.csv'):
-        return pd.read_csv('data/bookings.csv')
-    else:
-        return initialize_bookings()
-
-
-# Data manipulation functions
-def add_tool_listing(tool_data):
-    """Add a new tool listing to the database"""
-    tools_df = load_tool_data()
-
-    # Assign new ID
-    tool_id = tools_df['id'].max() + 1 if not tools_df.empty else 1
-    tool_data["id"] = tool_id
-
-    # Create new row
-    new_tool = pd.DataFrame([tool_data])
-
-    # Append to tools dataframe
-    updated_df = pd.concat([tools_df, new_tool], ignore_index=True)
-    updated_df.to_csv('data/tools.csv', index=False)
-
-    return tool_id
-
-
-def update_tool_availability(tool_id, available):
-    """Update the availability of a tool"""
-    tools_df = load_tool_data()
-    tools_df.loc[tools_df['id'] == tool_id, 'available'] = available
-    tools_df.to_csv('data/tools.csv', index=False)
-
-
-def create_booking(booking_data):
-    """Create a new booking in the database"""
-    bookings_df = load_bookings_data()
-
-    # Assign new ID
-    booking_id = bookings_df['id'].max() + 1 if not bookings_df.empty else 1
-    booking_data["id"] = booking_id
-    booking_data["created_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-    # Create new row
-    new_booking = pd.DataFrame([booking_data])
-
-    # Append to bookings dataframe
-    updated_df = pd.concat([bookings_df, new_booking], ignore_index=True)
-    updated_df.to_csv('data/bookings.csv', index=False)
-
-    return booking_id
-
-
-def update_booking_status(booking_id, status):
-    """Update the status of a booking"""
-    bookings_df = load_bookings_data()
-    bookings_df.loc[bookings_df['id'] == booking_id, 'status'] = status
-    bookings_df.to_csv('data/bookings.csv', index=False)
-
-
 # Helper functions for the application
 def calculate_booking_cost(tool_id, start_date, end_date):
     """Calculate the total cost of a booking"""
-    tools_df = load_tool_data()
-    tool = tools_df[tools_df['id'] == tool_id].iloc[0]
+    tool = get_tool(tool_id)
 
     # Convert string dates to datetime if necessary
     if isinstance(start_date, str):
@@ -225,7 +57,7 @@ def calculate_booking_cost(tool_id, start_date, end_date):
     if duration_days == 0:
         duration_days = 1  # Minimum 1 day
 
-    total_cost = duration_days * tool['daily_rate']
+    total_cost = round(duration_days * float(tool['daily_rate']), 2)
 
     return {
         "duration_days": duration_days,
@@ -237,27 +69,22 @@ def calculate_booking_cost(tool_id, start_date, end_date):
 
 def get_tool_details(tool_id):
     """Get detailed information about a specific tool"""
-    tools_df = load_tool_data()
-    tool = tools_df[tools_df['id'] == tool_id]
+    tool = get_tool(tool_id)
 
-    if tool.empty:
+    if tool is None:
         return None
 
-    return tool.iloc[0].to_dict()
+    return tool.to_dict()
 
 
 def get_user_tools(username):
-    """Get all tools owned by a specific user"""
-    tools_df = load_tool_data()
-    user_tools = tools_df[tools_df['owner_username'] == username]
-    return user_tools
+    """Get all tools owned by a specific user, in every city"""
+    return load_user_views().owned_tools(username)
 
 
 def get_user_bookings(username):
     """Get all bookings made by a specific user"""
-    bookings_df = load_bookings_data()
-    user_bookings = bookings_df[bookings_df['renter_username'] == username]
-    return user_bookings
+    return load_user_views().rentals(username)
 
 
 def get_tool_bookings(tool_id):
@@ -269,20 +96,95 @@ def get_tool_bookings(tool_id):
 
 def get_rental_requests_for_user(username):
     """Get all rental requests for tools owned by a specific user"""
-    tools_df = load_tool_data()
-    bookings_df = load_bookings_data()
-
-    # Get all tools owned by the user
-    user_tools = tools_df[tools_df['owner_username'] == username]
-
-    if user_tools.empty:
-        return pd.DataFrame()
-
-    # Get all bookings for those tools
-    tool_ids = user_tools['id'].tolist()
-    rental_requests = bookings_df[bookings_df['tool_id'].isin(tool_ids)]
-
-    return rental_requests
+    return load_user_views().rental_requests(username)
+
+
+# Ranked searches are memoized per query and catalog version, so reruns with
+# unchanged filters don't touch the catalog columns at all
+MAX_CACHED_SEARCHES = 256
+
+
+def _category_mask(catalog, column, value):
+    # Compare integer codes instead of decoding the column to strings
+    codes, categories = catalog.codes(column)
+    matches = np.flatnonzero(categories == value)
+    return codes == matches[0] if len(matches) else np.zeros(len(catalog), dtype=bool)
+
+
+@st.cache_data(max_entries=MAX_CACHED_SEARCHES, show_spinner=False)
+def _find_positions(city, version, tool_type, neighborhood, max_price, near, max_km, sort_by, limit,
+                    available_only):
+    catalog = load_tool_catalog(city)
+    if len(catalog) >= PARALLEL_MIN_ROWS:
+        with load_parallel_search(city) as executor:
+            positions, _, distances, matches = executor.search_and_count(
+                tool_type, neighborhood, max_price, near, max_km, SORT_WEIGHTS[sort_by], limit,
+                available_only
+            )
+        return positions, distances if near else None, matches
+    return _serial_search(catalog, load_neighborhood_index(city), tool_type, neighborhood, max_price,
+                          near, max_km, SORT_WEIGHTS[sort_by], limit, available_only)
+
+
+def _serial_search(catalog, index, tool_type, neighborhood, max_price, near, max_km, weights, limit,
+                   available_only):
+    """The single-process _find_positions: filter on codes, then rank_tools"""
+    mask = np.ones(len(catalog), dtype=bool)
+    if available_only:
+        mask &= catalog.column('available')
+    if tool_type:
+        mask &= _category_mask(catalog, 'tool_type', tool_type)
+    if neighborhood:
+        mask &= _category_mask(catalog, 'neighborhood', neighborhood)
+    if max_price is not None:
+        mask &= catalog.column('daily_rate') <= max_price
+    matches = int(mask.sum())
+
+    if near:
+        positions, _, distances = rank_tools(catalog, index, near, mask, n=limit, max_km=max_km,
+                                             weights=weights)
+        return positions, distances, matches
+
+    # Best rated first, ties by position (as ParallelSearch merges them)
+    positions = np.flatnonzero(mask)
+    return positions[top_order(catalog.column('rating')[positions], positions, limit)], None, matches
+
+
+def find_tools(city=None, tool_type=None, neighborhood=None, max_price=None, near=None, max_km=None,
+               sort_by="Best Match", limit=DEFAULT_RESULTS, available_only=True):
+    """Return (catalog, positions, distances_km, matches) for a search in one city.
+
+    positions are the best matches, ranked like search_tools (distances_km is
+    None without `near`); matches counts every tool that passed the filters
+    before the distance limit. Results are cached per query and catalog
+    version.
+    """
+    catalog = load_tool_catalog(city)
+    return (catalog,) + _find_positions(city, catalog.version, tool_type, neighborhood, max_price,
+                                        near, max_km, sort_by, limit, available_only)
+
+
+def search_tools(tool_type=None, neighborhood=None, max_price=None, near=None, max_km=None,
+                 sort_by="Best Match", limit=20, available_only=True, city=None):
+    """Search one city's listings and return the best matches as dicts.
+
+    With `near` (a neighborhood name) results are ranked by distance, price and
+    rating and carry a distance_km field; otherwise they are ordered by rating.
+    Without a city, the city of `near` or `neighborhood` is searched.
+    """
+    if city is None and (near or neighborhood):
+        city = load_router().city_for_neighborhood(near or neighborhood)
+    catalog, positions, distances, _ = find_tools(city, tool_type, neighborhood, max_price, near,
+                                                  max_km, sort_by, limit, available_only)
+    return _search_results(catalog, positions, distances)
+
+
+def _search_results(catalog, positions, distances):
+    results = [tool.to_dict() for tool in catalog.iter_records(positions)]
+    if distances is not None:
+        for result, distance in zip(results, distances.tolist()):
+            result['distance_km'] = round(distance, 2)
+    return results
 
 
 def initialize_data():
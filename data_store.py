@@ -0,0 +1,665 @@
+import functools
+import os
+import tempfile
+import random
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+try:
+    import fcntl
+except ImportError:  # Windows: writes are only serialized within one process
+    fcntl = None
+
+from data_generator import (
+    BOOKING_COLUMNS, DEMO_USERS, NEIGHBORHOODS, SWAP_COLUMNS, TOOL_COLUMNS, TOOL_IMAGE_FILES,
+    generate_tools, generate_users
+)
+from catalog import ToolCatalog
+from catalog_store import load_shared_catalog
+from instrumentation import span
+from ledger import (
+    Ledger, backfill_rows, booking_transactions, booking_transition_allowed, to_cents, write_ledger_csv
+)
+from schema import enforce_tools_schema, read_tools_csv
+from shards import load_router
+
+# Single data-access layer for the app, data_helper and ui_components.
+# Reads go through the cached loaders below; every write goes through a
+# save_* function that persists the table and invalidates its cache.
+#
+# The loaders return one shared frame per table (st.cache_resource, not
+# st.cache_data, which unpickles a fresh copy on every call). pandas
+# copy-on-write keeps those frames immutable: filtered or derived frames
+# share their buffers and only copy a column when it is modified, and the
+# write functions below modify a shallow copy, never the cached frame.
+#
+# The tools table is sharded by city (see shards.py): tool readers take an
+# optional city (None is the default city, data/tools.csv), get_tool routes a
+# tool id to its shard, and writes go to the shard of the listing's
+# neighborhood. Users, bookings and swaps are shared by all cities.
+
+pd.set_option("mode.copy_on_write", True)
+
+DATA_DIR = "data"
+IMAGES_DIR = "images"
+
+TOOLS_PATH = os.path.join(DATA_DIR, "tools.csv")
+USERS_PATH = os.path.join(DATA_DIR, "users.csv")
+BOOKINGS_PATH = os.path.join(DATA_DIR, "bookings.csv")
+SWAPS_PATH = os.path.join(DATA_DIR, "tool_swaps.csv")
+LEDGER_PATH = os.path.join(DATA_DIR, "ledger.csv")
+
+USER_COLUMNS = ["username", "name", "email"]
+
+# Fallback coordinates for neighborhoods that are not registered with a city
+DEFAULT_LOCATION = NEIGHBORHOODS["Downtown"]
+
+
+def initialize_data_directories():
+    """Create necessary directories for data storage"""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    os.makedirs(IMAGES_DIR, exist_ok=True)
+
+
+# Tool type to image mapping
+def get_tool_image_url(tool_type):
+    """Return local image path based on tool type with specific matching"""
+    filename = TOOL_IMAGE_FILES.get(tool_type)
+
+    # If no specific image found, randomly select from the images on disk
+    if not filename or not os.path.exists(os.path.join(IMAGES_DIR, filename)):
+        available_images = sorted(
+            f for f in os.listdir(IMAGES_DIR) if f.endswith(".jpg")
+        ) if os.path.isdir(IMAGES_DIR) else []
+        filename = random.choice(available_images) if available_images else "default.jpg"
+
+    return os.path.join(IMAGES_DIR, filename)
+
+
+def random_location(neighborhood):
+    """Return jittered (lat, lon) coordinates inside a neighborhood"""
+    router = load_router()
+    city = router.city_for_neighborhood(neighborhood)
+    base_lat, base_lon = router.neighborhoods[city].get(neighborhood, DEFAULT_LOCATION)
+    return (base_lat + random.uniform(-0.01, 0.01),
+            base_lon + random.uniform(-0.01, 0.01))
+
+
+def _next_id(df):
+    """Return the next integer id for a table"""
+    return int(df['id'].max()) + 1 if not df.empty else 1
+
+
+class _WriteLock:
+    """Re-entrant lock held across threads and processes (flock on a lock file)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._file = open(self.path, "a")
+                fcntl.flock(self._file, fcntl.LOCK_EX)
+            except BaseException:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0 and self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._lock.release()
+
+
+# Writes are read-modify-write on whole CSVs, shared by the Streamlit servers,
+# the API and their job workers. Every mutator holds this lock, which also
+# excludes the other processes, and the cached tables are keyed on the file
+# version, so a mutator always starts from what is on disk.
+_write_lock = _WriteLock(os.path.join(DATA_DIR, ".write.lock"))
+
+
+def _write_csv(df, path):
+    """Replace a CSV atomically, so readers never see a half-written table"""
+    directory = os.path.dirname(path) or "."
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".csv")
+    try:
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+            df.to_csv(f, index=False)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _serialized(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with _write_lock:
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def _now():
+    """Return the current timestamp in the format stored in the CSVs"""
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+# Catalogs and neighborhood indexes are cached per (shard, version); stale
+# versions fall out of the LRU instead of being cleared, so a write to one
+# city never evicts another city's catalog
+MAX_CACHED_SHARDS = 32
+MAX_CACHED_VERSIONS = 2
+
+
+# Cached readers (one CSV read per process until the table is written). The
+# tools reader is keyed on the file version, so a shard written by another
+# process (the API, bulk imports, other servers) is re-read.
+@st.cache_resource(max_entries=MAX_CACHED_SHARDS)
+def _read_tools(path, version):
+    if path != TOOLS_PATH:
+        # Other cities' shards start empty
+        if not os.path.exists(path):
+            return enforce_tools_schema(pd.DataFrame(columns=TOOL_COLUMNS))
+        return read_tools_csv(path)
+
+    if not os.path.exists(TOOLS_PATH):
+        initialize_data_directories()
+
+        # Create mock data (50 seeded tools owned by the demo users)
+        users_df = generate_users(len(DEMO_USERS))
+        df = enforce_tools_schema(generate_tools(50, users_df))
+        with span("write_csv"):
+            df.to_csv(TOOLS_PATH, index=False)
+            if not os.path.exists(USERS_PATH):
+                users_df.to_csv(USERS_PATH, index=False)
+        return df
+
+    df = read_tools_csv(TOOLS_PATH)
+
+    # Add image_url column if it doesn't exist
+    if 'image_url' not in df.columns:
+        df = _with_image_urls(df)
+        with span("write_csv"):
+            _write_csv(df, TOOLS_PATH)
+
+    return df
+
+
+def _with_image_urls(df):
+    if 'image_url' in df.columns:
+        return df
+    return df.assign(image_url=df['tool_type'].map(get_tool_image_url).astype("category"))
+
+
+def _read_tools_version(path, version):
+    """Read a tools.csv from disk, or None if it is no longer at `version`.
+
+    The version is checked on the open file before and after parsing, so the
+    frame is exactly that version, not a newer file or one being rewritten.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if os.fstat(f.fileno()).st_mtime_ns != version:
+            return None
+        df = read_tools_csv(f)
+        if os.fstat(f.fileno()).st_mtime_ns != version:
+            return None
+    return _with_image_urls(df)
+
+
+# The users, bookings and swaps readers are keyed on the file version too; the
+# previous version is kept so sessions mid-rerun can finish with it
+@st.cache_resource(max_entries=MAX_CACHED_VERSIONS)
+def _read_users(version):
+    if os.path.exists(USERS_PATH):
+        return pd.read_csv(USERS_PATH)
+
+    initialize_data_directories()
+    users_df = generate_users(len(DEMO_USERS))
+    with span("write_csv"):
+        users_df.to_csv(USERS_PATH, index=False)
+    return users_df
+
+
+@st.cache_resource(max_entries=MAX_CACHED_VERSIONS)
+def _read_bookings(version):
+    if os.path.exists(BOOKINGS_PATH):
+        return pd.read_csv(BOOKINGS_PATH)
+
+    initialize_data_directories()
+    bookings_df = pd.DataFrame(columns=BOOKING_COLUMNS)
+    with span("write_csv"):
+        bookings_df.to_csv(BOOKINGS_PATH, index=False)
+    return bookings_df
+
+
+@st.cache_resource(max_entries=MAX_CACHED_VERSIONS)
+def _read_swaps(version):
+    if os.path.exists(SWAPS_PATH):
+        return pd.read_csv(SWAPS_PATH)
+
+    initialize_data_directories()
+    swap_df = pd.DataFrame(columns=SWAP_COLUMNS)
+    with span("write_csv"):
+        swap_df.to_csv(SWAPS_PATH, index=False)
+    return swap_df
+
+
+# Data loading functions
+def load_tool_data(city=None):
+    """Load a city's tool listings, generating demo data if none exist"""
+    with span("load_tool_data"):
+        return _read_tools(load_router().tools_path(city), tools_version(city))
+
+
+def _file_version(path):
+    return os.stat(path).st_mtime_ns if os.path.exists(path) else 0
+
+
+def tools_version(city=None):
+    """Return a version stamp for a city's tools.csv that changes on every write"""
+    return _file_version(load_router().tools_path(city))
+
+
+def users_version():
+    """Return a version stamp for users.csv that changes on every write"""
+    return _file_version(USERS_PATH)
+
+
+def bookings_version():
+    """Return a version stamp for bookings.csv that changes on every write"""
+    return _file_version(BOOKINGS_PATH)
+
+
+def swaps_version():
+    """Return a version stamp for tool_swaps.csv that changes on every write"""
+    return _file_version(SWAPS_PATH)
+
+
+@st.cache_resource(max_entries=MAX_CACHED_SHARDS)
+def _build_catalog(path, version):
+    if not version:
+        # Shard without a tools.csv yet: nothing worth sharing
+        return ToolCatalog.from_frame(_read_tools(path, version), version)
+
+    # The store is built from the file itself, never from a cached frame that
+    # may predate another process's write
+    def build():
+        df = _read_tools_version(path, version)
+        return ToolCatalog.from_frame(df, version) if df is not None else None
+
+    catalog = load_shared_catalog(path, version, build)
+    if catalog is None:
+        # Rewritten since it was stamped: serve the newer version instead
+        return _build_catalog(path, _file_version(path))
+    return catalog
+
+
+def load_tool_catalog(city=None):
+    """Load a city's tools table as a shared, read-only ToolCatalog.
+
+    The columns are memory-mapped from the catalog store (catalog_store.py),
+    so every process on the host shares one copy of each version.
+    """
+    with span("load_tool_catalog"):
+        if not os.path.exists(TOOLS_PATH):
+            _read_tools(TOOLS_PATH, 0)  # bootstrap demo data so the version stamp exists
+        return _build_catalog(load_router().tools_path(city), tools_version(city))
+
+
+@st.cache_resource(max_entries=MAX_CACHED_SHARDS)
+def _build_facets(path, version):
+    catalog = _build_catalog(path, version)
+    facets = {"available": np.flatnonzero(catalog.column('available'))}
+    facets["available"].setflags(write=False)
+    for column in ('tool_type', 'neighborhood'):
+        codes, categories = catalog.codes(column)
+        present = np.bincount(codes[codes >= 0], minlength=len(categories)) > 0
+        facets[column] = sorted(categories[present].tolist())
+    prices = catalog.column('daily_rate')
+    facets['min_price'] = float(prices.min()) if len(prices) else 0.0
+    facets['max_price'] = float(prices.max()) if len(prices) else 0.0
+    return facets
+
+
+def load_catalog_facets(city=None):
+    """Return a city's filter options and available tool positions.
+
+    Holds the tool types and neighborhoods that have listings, the daily rate
+    range and the positions of available tools, computed once per catalog
+    version and shared by every session.
+    """
+    catalog = load_tool_catalog(city)
+    return _build_facets(load_router().tools_path(city), catalog.version)
+
+
+def get_tool(tool_id):
+    """Return the ToolRecord for a tool id from its city's shard, or None"""
+    city = load_router().city_for_tool(tool_id)
+    return load_tool_catalog(city).get(tool_id) if city is not None else None
+
+
+@st.cache_resource
+def _open_ledger():
+    with _write_lock:
+        if not os.path.exists(LEDGER_PATH):
+            # First run: replay the existing bookings so balances start consistent
+            initialize_data_directories()
+            bookings_df = _read_bookings(bookings_version())
+            catalog = load_tool_catalog()
+            positions = catalog.positions(bookings_df['tool_id'].to_numpy(dtype=np.int64))
+            found = positions >= 0
+            owners = np.where(found, catalog.column('owner_username')[np.maximum(positions, 0)], None)
+            deposits = np.where(found, to_cents(catalog.column('deposit'))[np.maximum(positions, 0)], 0)
+            if 'deposit' in bookings_df.columns:
+                recorded = bookings_df['deposit'].notna().to_numpy()
+                deposits = np.where(recorded, to_cents(bookings_df['deposit'].fillna(0)), deposits)
+            with span("write_csv"):
+                write_ledger_csv(LEDGER_PATH, backfill_rows(bookings_df[found], owners[found], deposits[found]))
+    # Postings and settlement hold the cross-process write lock
+    return Ledger(LEDGER_PATH, _write_lock)
+
+
+def load_ledger():
+    """Load the shared payments ledger, picking up rows appended by other processes"""
+    with span("load_ledger"):
+        ledger = _open_ledger()
+        ledger.refresh()
+        return ledger
+
+
+def load_user_data():
+    """Load users, generating the demo accounts if none exist"""
+    with span("load_user_data"):
+        return _read_users(users_version())
+
+
+def load_bookings_data():
+    """Load bookings, initializing an empty table if none exist"""
+    with span("load_bookings_data"):
+        return _read_bookings(bookings_version())
+
+
+# Cached hash indexes of the key columns, for reading single rows (or one
+# user's rows) without scanning the table
+@st.cache_resource(max_entries=MAX_CACHED_VERSIONS)
+def _usernames(version):
+    return pd.Index(_read_users(version)['username'])
+
+
+@st.cache_resource(max_entries=MAX_CACHED_VERSIONS)
+def _booking_ids(version):
+    return pd.Index(_read_bookings(version)['id'])
+
+
+@st.cache_resource(max_entries=MAX_CACHED_VERSIONS)
+def _swap_ids(version):
+    return pd.Index(_read_swaps(version)['id'])
+
+
+def _rows_by_key(df, index, column, keys):
+    positions = index.get_indexer(keys) if index.is_unique else None
+    if positions is not None and positions.max(initial=-1) < len(df):
+        rows = df.iloc[positions[positions >= 0]]
+        # The index may predate a rewrite of the table; only trust it if it still matches
+        if (rows[column].to_numpy() == np.asarray(keys)[positions >= 0]).all():
+            return rows
+    return df[df[column].isin(keys)]
+
+
+def get_user(username):
+    """Return a user's row, or None"""
+    rows = _rows_by_key(load_user_data(), _usernames(users_version()), 'username', [username])
+    return rows.iloc[0] if not rows.empty else None
+
+
+def get_booking(booking_id):
+    """Return a booking row by id, or None"""
+    rows = get_bookings([booking_id])
+    return rows.iloc[0] if not rows.empty else None
+
+
+def get_bookings(booking_ids):
+    """Return the bookings with the given ids (hash lookups, not a table scan)"""
+    return _rows_by_key(load_bookings_data(), _booking_ids(bookings_version()), 'id', booking_ids)
+
+
+def get_swaps(swap_ids):
+    """Return the tool swaps with the given ids (hash lookups, not a table scan)"""
+    return _rows_by_key(load_tool_swap_data(), _swap_ids(swaps_version()), 'id', swap_ids)
+
+
+def load_tool_swap_data():
+    """Load tool swap requests, initializing an empty table if none exist"""
+    with span("load_tool_swap_data"):
+        return _read_swaps(swaps_version())
+
+
+# Data writing functions
+@_serialized
+def save_tools(tools_df, city=None):
+    """Persist a city's tools table (in schema dtypes) and invalidate its cache"""
+    path = load_router().tools_path(city)
+    tools_df = enforce_tools_schema(tools_df)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with span("write_csv"):
+        _write_csv(tools_df, path)
+    _read_tools.clear()
+
+
+@_serialized
+def save_users(users_df):
+    """Persist the users table and invalidate its cache"""
+    with span("write_csv"):
+        _write_csv(users_df, USERS_PATH)
+    _read_users.clear()
+    _usernames.clear()
+
+
+@_serialized
+def save_bookings(bookings_df):
+    """Persist the bookings table and invalidate its cache"""
+    with span("write_csv"):
+        _write_csv(bookings_df, BOOKINGS_PATH)
+    _read_bookings.clear()
+    _booking_ids.clear()
+
+
+@_serialized
+def save_tool_swaps(swap_df):
+    """Persist the tool swaps table and invalidate its cache"""
+    with span("write_csv"):
+        _write_csv(swap_df, SWAPS_PATH)
+    _read_swaps.clear()
+    _swap_ids.clear()
+
+
+def clear_caches():
+    """Drop every cached table so the next read comes from disk"""
+    for reader in (_read_tools, _read_users, _usernames, _read_bookings, _booking_ids, _read_swaps,
+                   _swap_ids, _build_catalog, _build_facets, _open_ledger):
+        reader.clear()
+
+
+def _next_tool_id(city):
+    """Return the next tool id in a city's id block (ValueError if the block is full)"""
+    catalog = load_tool_catalog(city)
+    next_id = int(catalog.column('id').max()) + 1 if len(catalog) else load_router().first_id(city)
+    _check_id_block(city, next_id, 1)
+    return next_id
+
+
+def _check_id_block(city, next_id, count):
+    """Raise ValueError if `count` ids from next_id would run past the city's block"""
+    last_id = load_router().last_id(city)
+    if next_id + count - 1 > last_id:
+        raise ValueError(f"{city} has no room for {count:,} more tool ids (its block ends at {last_id:,})")
+
+
+# Data manipulation functions
+@_serialized
+def add_tool_listing(tool_data):
+    """Add a new tool listing to its neighborhood's city and return its id"""
+    city = load_router().city_for_neighborhood(tool_data.get("neighborhood"))
+    tools_df = load_tool_data(city)
+
+    tool_id = _next_tool_id(city)
+    tool_data = {**tool_data, "id": tool_id}
+    tool_data.setdefault("image_url", get_tool_image_url(tool_data.get("tool_type")))
+
+    save_tools(pd.concat([tools_df, pd.DataFrame([tool_data])], ignore_index=True), city)
+    return tool_id
+
+
+@_serialized
+def append_tools(chunks):
+    """Append chunks of new tool rows to their cities' shards.
+
+    Rows are routed by neighborhood; each city's part of a chunk is written
+    with a single append in the file's column order and gets consecutive ids
+    in that city's block. The tools caches are invalidated once, after the
+    last chunk. Returns {city: range of ids assigned}.
+
+    Raises ValueError, before writing the part, if a city's rows would run
+    past the end of its id block; chunks written until then are kept.
+    """
+    router = load_router()
+    next_ids = {}
+    columns = {}
+    try:
+        for chunk in chunks:
+            if chunk.empty:
+                continue
+            cities = chunk['neighborhood'].map(router.city_for_neighborhood)
+            for city, part in chunk.groupby(cities.to_numpy(), sort=False):
+                path = router.tools_path(city)
+                if city not in next_ids:
+                    next_ids[city] = [_next_tool_id(city)] * 2
+                    if not os.path.exists(path):
+                        save_tools(pd.DataFrame(columns=TOOL_COLUMNS), city)
+                    # The header may be quoted (data_generator writes through pyarrow)
+                    columns[city] = pd.read_csv(path, nrows=0).columns.tolist()
+
+                next_id = next_ids[city][1]
+                _check_id_block(city, next_id, len(part))
+                part = part.assign(id=np.arange(next_id, next_id + len(part)))
+                with span("write_csv", rows=len(part)):
+                    part.reindex(columns=columns[city]).to_csv(path, mode="a", header=False, index=False)
+                next_ids[city][1] += len(part)
+    finally:
+        if next_ids:
+            _read_tools.clear()
+    return {city: range(first, stop) for city, (first, stop) in next_ids.items()}
+
+
+@_serialized
+def update_tool_availability(tool_id, available):
+    """Update the availability of a tool in its city's shard"""
+    city = load_router().city_for_tool(tool_id)
+    tools_df = load_tool_data(city).copy(deep=False)
+    tools_df.loc[tools_df['id'] == tool_id, 'available'] = available
+    save_tools(tools_df, city)
+
+
+@_serialized
+def create_booking(booking_data):
+    """Create a new booking and return its id"""
+    bookings_df = load_bookings_data()
+
+    booking_id = _next_id(bookings_df)
+    booking_data = {**booking_data, "id": booking_id, "created_at": _now()}
+
+    save_bookings(pd.concat([bookings_df, pd.DataFrame([booking_data])], ignore_index=True))
+    return booking_id
+
+
+@_serialized
+def update_booking_status(booking_id, status):
+    """Update the status of a booking and post the matching ledger entries.
+
+    Returns True if the change was applied now, False if the booking does not
+    exist or already has the status. Raises ValueError for a change the
+    booking state machine doesn't allow.
+    """
+    ledger = load_ledger()
+    bookings_df = load_bookings_data().copy(deep=False)
+    mask = bookings_df['id'] == booking_id
+    if not mask.any():
+        return False
+
+    booking = bookings_df[mask].iloc[0]
+    if booking['status'] == status:
+        # Already applied (a retried job): the postings were made before the save
+        return False
+    if not booking_transition_allowed(booking['status'], status):
+        raise ValueError(f"Booking {booking_id} can't go from {booking['status']} to {status}")
+    tool = get_tool(booking['tool_id'])
+
+    # Bookings made through the form record the risk-adjusted deposit;
+    # older ones fall back to the tool's listed deposit
+    deposit = booking.get('deposit')
+    if pd.isna(deposit):
+        deposit = tool['deposit'] if tool is not None else 0
+
+    transactions = booking_transactions(
+        booking['renter_username'],
+        tool['owner_username'] if tool is not None else None,
+        int(to_cents(booking['total_cost'])),
+        int(to_cents(deposit)),
+        booking['status'], status
+    )
+
+    # Post first, then save. A retry after a failed save sees the old status
+    # again, and post_booking skips the postings already made.
+    ledger.post_booking(int(booking_id), transactions)
+    bookings_df.loc[mask, 'status'] = status
+    save_bookings(bookings_df)
+    return True
+
+
+@_serialized
+def create_tool_swap_request(proposer_username, proposer_tool_id, receiver_username, receiver_tool_id):
+    """Create a new tool swap request and return its id"""
+    swap_df = load_tool_swap_data()
+
+    swap_id = _next_id(swap_df)
+    new_swap = pd.DataFrame([{
+        "id": swap_id,
+        "proposer_username": proposer_username,
+        "proposer_tool_id": proposer_tool_id,
+        "receiver_username": receiver_username,
+        "receiver_tool_id": receiver_tool_id,
+        "status": "Pending",
+        "proposed_date": _now(),
+        "accepted_date": None
+    }])
+
+    save_tool_swaps(pd.concat([swap_df, new_swap], ignore_index=True))
+    return swap_id
+
+
+@_serialized
+def update_swap_status(swap_id, status):
+    """Update the status of a tool swap (stamping accepted_date on acceptance)"""
+    swap_df = load_tool_swap_data().copy(deep=False)
+    swap_df.loc[swap_df['id'] == swap_id, 'status'] = status
+    if status == 'Accepted':
+        swap_df.loc[swap_df['id'] == swap_id, 'accepted_date'] = _now()
+    save_tool_swaps(swap_df)
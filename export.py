@@ -0,0 +1,260 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_store import BOOKINGS_PATH, load_tool_catalog, load_user_data
+from instrumentation import span
+from ledger import to_cents
+from shards import load_router
+
+# Streaming exports of bookings and revenue reports.
+#
+# bookings.csv is read CHUNK_SIZE rows at a time and never loaded whole. Each
+# chunk is filtered by start date and status, then joined to its tool and
+# owner through each city shard's catalog id index (a searchsorted per chunk
+# and shard, gathering only the chunk's rows from the memory-mapped catalog)
+# and a username -> email dict, and written straight to the output file.
+# Memory is bounded by the chunk size (plus one accumulator row per group for
+# revenue reports), not by the size of the catalog or the bookings table.
+#
+# Formats: .csv, .jsonl and .parquet (Parquet needs the optional pyarrow).
+
+CHUNK_SIZE = 250_000
+FORMATS = ("csv", "jsonl", "parquet")
+
+# Bookings that were charged to the renter, and those whose earnings went to
+# the owner (see ledger.booking_transactions)
+CHARGED_STATUSES = ("Approved", "Returned", "Completed")
+EARNED_STATUSES = ("Completed",)
+
+BOOKING_EXPORT_COLUMNS = {
+    "id": "int64",
+    "tool_id": "int64",
+    "renter_username": "string",
+    "start_date": "string",
+    "end_date": "string",
+    "total_cost": "float64",
+    "deposit": "float64",
+    "status": "string",
+    "created_at": "string",
+    "tool_title": "string",
+    "tool_type": "string",
+    "neighborhood": "string",
+    "owner_username": "string",
+    "owner_name": "string",
+    "owner_email": "string",
+}
+
+# Catalog column -> export column for the tool join
+TOOL_JOIN_COLUMNS = {
+    "title": "tool_title",
+    "tool_type": "tool_type",
+    "neighborhood": "neighborhood",
+    "owner_username": "owner_username",
+    "owner_name": "owner_name",
+}
+
+REPORT_GROUPS = {
+    "month": lambda df: df["start_date"].str[:7],
+    "owner": lambda df: df["owner_username"],
+    "neighborhood": lambda df: df["neighborhood"],
+    "tool_type": lambda df: df["tool_type"],
+}
+
+
+def output_format(path, fmt=None):
+    """Return the export format for a path (from its extension unless given)"""
+    fmt = (fmt or os.path.splitext(path)[1].lstrip(".")).lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported export format {fmt!r}; use one of {', '.join(FORMATS)}")
+    return fmt
+
+
+class ChunkWriter:
+    """Write DataFrame chunks with fixed columns to a CSV, JSONL or Parquet file"""
+
+    def __init__(self, path, fmt, dtypes):
+        self.path = path
+        self.fmt = fmt
+        self.dtypes = dtypes
+        self.rows = 0
+        self._parquet = None
+        self._file = None
+
+        if fmt == "parquet":
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+            schema = pa.Schema.from_pandas(self._typed(pd.DataFrame(columns=list(dtypes))),
+                                           preserve_index=False)
+            self._pa = pa
+            self._parquet = pq.ParquetWriter(path, schema)
+        else:
+            self._file = open(path, "w", newline="", encoding="utf-8")
+            if fmt == "csv":
+                self._file.write(",".join(dtypes) + "\n")
+
+    def _typed(self, df):
+        return df.reindex(columns=list(self.dtypes)).astype(self.dtypes)
+
+    def write(self, df):
+        if df.empty:
+            return
+        df = self._typed(df)
+        with span("write_export", rows=len(df), format=self.fmt):
+            if self.fmt == "parquet":
+                self._parquet.write_table(self._pa.Table.from_pandas(df, preserve_index=False))
+            elif self.fmt == "csv":
+                df.to_csv(self._file, header=False, index=False)
+            else:
+                # to_json writes NaN as null, dates stay ISO strings
+                text = df.to_json(orient="records", lines=True)
+                self._file.write(text if text.endswith("\n") else text + "\n")
+        self.rows += len(df)
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_bookings(start=None, end=None, statuses=None, chunk_size=CHUNK_SIZE, path=BOOKINGS_PATH):
+    """Yield filtered bookings chunks joined to tool and owner fields.
+
+    start/end are inclusive YYYY-MM-DD bounds on the booking start date.
+    """
+    users_df = load_user_data()
+    emails = dict(zip(users_df["username"], users_df["email"]))
+    router = load_router()
+    shards = {}
+    for city in router.cities:
+        catalog = load_tool_catalog(city)
+        if len(catalog):
+            shards[router.shard(city)] = catalog
+    statuses = list(statuses) if statuses else None
+
+    reader = pd.read_csv(path, chunksize=chunk_size,
+                         dtype={"renter_username": str, "start_date": str, "end_date": str,
+                                "status": str, "created_at": str})
+    for chunk in reader:
+        with span("export_chunk", rows=len(chunk)):
+            # ISO dates compare correctly as strings
+            keep = np.ones(len(chunk), dtype=bool)
+            if start is not None:
+                keep &= (chunk["start_date"] >= str(start)).to_numpy()
+            if end is not None:
+                keep &= (chunk["start_date"] <= str(end)).to_numpy()
+            if statuses is not None:
+                keep &= chunk["status"].isin(statuses).to_numpy()
+            chunk = chunk[keep]
+            if chunk.empty:
+                continue
+
+            tool_ids = chunk["tool_id"].to_numpy(dtype=np.int64)
+            shard_of = router.shards_for_tools(tool_ids)
+            joined = {name: np.full(len(chunk), None, dtype=object) for name in TOOL_JOIN_COLUMNS.values()}
+            for shard in np.unique(shard_of):
+                if shard not in shards:
+                    continue
+                catalog = shards[shard]
+                rows = np.flatnonzero(shard_of == shard)
+                positions = catalog.positions(tool_ids[rows])
+                found = positions >= 0
+                for column, name in TOOL_JOIN_COLUMNS.items():
+                    joined[name][rows[found]] = catalog.take(column, positions[found])
+            chunk = chunk.assign(**joined)
+            chunk["owner_email"] = chunk["owner_username"].map(emails)
+        yield chunk
+
+
+def export_bookings(output_path, start=None, end=None, statuses=None, fmt=None,
+                    chunk_size=CHUNK_SIZE, path=BOOKINGS_PATH):
+    """Stream matching bookings with tool and owner fields to a file"""
+    fmt = output_format(output_path, fmt)
+    started = time.perf_counter()
+    with ChunkWriter(output_path, fmt, BOOKING_EXPORT_COLUMNS) as writer:
+        for chunk in iter_bookings(start, end, statuses, chunk_size, path):
+            writer.write(chunk)
+    seconds = time.perf_counter() - started
+    return {"path": output_path, "format": fmt, "rows": writer.rows, "seconds": seconds}
+
+
+def revenue_report(by="month", start=None, end=None, statuses=None, chunk_size=CHUNK_SIZE,
+                   path=BOOKINGS_PATH):
+    """Aggregate bookings, charged value and owner earnings per group.
+
+    Each chunk is grouped on its own and added into running totals, so only
+    one row per group is held across chunks.
+    """
+    if by not in REPORT_GROUPS:
+        raise ValueError(f"by must be one of {', '.join(REPORT_GROUPS)}")
+
+    totals = None
+    for chunk in iter_bookings(start, end, statuses, chunk_size, path):
+        cost = to_cents(chunk["total_cost"].fillna(0))
+        status = chunk["status"]
+        part = pd.DataFrame({
+            "bookings": 1,
+            "charged": np.where(status.isin(CHARGED_STATUSES), cost, 0),
+            "earned": np.where(status.isin(EARNED_STATUSES), cost, 0),
+        }).groupby(REPORT_GROUPS[by](chunk).fillna("Unknown").to_numpy()).sum()
+        totals = part if totals is None else totals.add(part, fill_value=0)
+
+    if totals is None:
+        totals = pd.DataFrame(columns=["bookings", "charged", "earned"])
+    totals = totals.astype("int64").sort_index().rename_axis(by).reset_index()
+    # Summed in cents so totals over millions of bookings don't drift
+    totals[["charged", "earned"]] = totals[["charged", "earned"]] / 100
+    return totals
+
+
+def export_revenue_report(output_path, by="month", start=None, end=None, statuses=None,
+                          fmt=None, chunk_size=CHUNK_SIZE, path=BOOKINGS_PATH):
+    """Write a revenue_report to a file"""
+    fmt = output_format(output_path, fmt)
+    started = time.perf_counter()
+    report = revenue_report(by, start, end, statuses, chunk_size, path)
+    with ChunkWriter(output_path, fmt, {by: "string", "bookings": "int64", "charged": "float64",
+                                        "earned": "float64"}) as writer:
+        writer.write(report)
+    seconds = time.perf_counter() - started
+    return {"path": output_path, "format": fmt, "rows": writer.rows, "seconds": seconds}
+
+
+def main(argv=None):
+    """Command line entry point for bookings exports and revenue reports"""
+    parser = argparse.ArgumentParser(description="Export ToolShare bookings and revenue reports")
+    parser.add_argument("report", choices=["bookings", "revenue"])
+    parser.add_argument("output", help="output file (.csv, .jsonl or .parquet)")
+    parser.add_argument("--format", choices=FORMATS)
+    parser.add_argument("--start", help="first booking start date (YYYY-MM-DD)")
+    parser.add_argument("--end", help="last booking start date (YYYY-MM-DD)")
+    parser.add_argument("--status", action="append", help="repeat to include several statuses")
+    parser.add_argument("--by", choices=list(REPORT_GROUPS), default="month")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    if args.report == "bookings":
+        result = export_bookings(args.output, args.start, args.end, args.status, args.format,
+                                 args.chunk_size)
+    else:
+        result = export_revenue_report(args.output, args.by, args.start, args.end, args.status,
+                                       args.format, args.chunk_size)
+    print(f"{args.report}: {result['rows']:,} rows -> {result['path']} ({result['format']}) "
+          f"in {result['seconds']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
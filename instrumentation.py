@@ -0,0 +1,116 @@
+import json
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+import numpy as np
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# Maximum number of spans kept per session; older spans are dropped first
+MAX_SPANS = 5000
+
+METRICS_DIR = "metrics"
+
+# Buffer used when code runs outside a Streamlit session (scripts, benchmarks)
+_process_buffer = deque(maxlen=MAX_SPANS)
+
+
+def get_metrics_buffer():
+    """Return the span buffer for the current session (or the process)"""
+    # The API, job workers and CLI tools run without a script context
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return _process_buffer
+    if '_metrics_buffer' not in st.session_state:
+        st.session_state._metrics_buffer = deque(maxlen=MAX_SPANS)
+    return st.session_state._metrics_buffer
+
+
+@contextmanager
+def span(name, **tags):
+    """Time the enclosed block and record it under `name`"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        get_metrics_buffer().append({
+            "name": name,
+            "ts": time.time(),
+            "duration_ms": (time.perf_counter() - started) * 1000,
+            **tags
+        })
+
+
+def timed(name=None):
+    """Decorator form of span(); defaults to the function's name"""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def summarize_spans(spans=None):
+    """Return {name: {count, p50_ms, p95_ms, total_ms}} for the given spans"""
+    spans = get_metrics_buffer() if spans is None else spans
+    durations = {}
+    for s in spans:
+        durations.setdefault(s["name"], []).append(s["duration_ms"])
+
+    summary = {}
+    for name, values in durations.items():
+        values = np.asarray(values)
+        summary[name] = {
+            "count": len(values),
+            "p50_ms": float(np.percentile(values, 50)),
+            "p95_ms": float(np.percentile(values, 95)),
+            "total_ms": float(values.sum())
+        }
+    return summary
+
+
+def export_spans(path=None, spans=None):
+    """Append spans to a JSONL file for offline analysis and return its path"""
+    spans = get_metrics_buffer() if spans is None else spans
+    if path is None:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = os.path.join(METRICS_DIR, f"spans_{time.strftime('%Y%m%d_%H%M%S')}.jsonl")
+
+    with open(path, "a") as f:
+        for s in spans:
+            f.write(json.dumps(s) + "\n")
+    return path
+
+
+def render_metrics_panel():
+    """Render p50/p95 per span in the sidebar (shown with ?admin=1)"""
+    if st.query_params.get("admin") != "1":
+        return
+
+    with st.sidebar.expander("⏱️ Performance", expanded=False):
+        summary = summarize_spans()
+        if not summary:
+            st.write("No spans recorded yet.")
+            return
+
+        rows = sorted(summary.items(), key=lambda item: item[1]["total_ms"], reverse=True)
+        st.dataframe(
+            [{"span": name, **{k: round(v, 2) for k, v in stats.items()}} for name, stats in rows],
+            hide_index=True,
+            use_container_width=True
+        )
+
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Export", key="metrics_export"):
+                st.success(f"Saved to {export_spans()}")
+        with col2:
+            if st.button("Reset", key="metrics_reset"):
+                get_metrics_buffer().clear()
+                st.rerun()
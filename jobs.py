@@ -0,0 +1,286 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+
+import streamlit as st
+
+from data_store import (
+    DATA_DIR, get_tool, initialize_data_directories, load_bookings_data, load_tool_swap_data,
+    update_booking_status
+)
+from instrumentation import span
+from notifications import load_inbox
+from recommendations import load_recommendations
+
+# Durable background job queue for work that does not need to finish before
+# the page reruns.
+#
+# Jobs are rows in a SQLite table (data/jobs.db), so queued work survives a
+# restart. A UI action only inserts a row; a small pool of worker threads per
+# process claims jobs one at a time inside an IMMEDIATE transaction (so two
+# workers, or two processes, never run the same job), calls the handler
+# registered for the job's kind, and retries failures with exponential
+# backoff up to MAX_ATTEMPTS. A handler raises JobFailed for errors a retry
+# can't fix, which fails the job at once.
+
+JOBS_PATH = os.path.join(DATA_DIR, "jobs.db")
+
+WORKER_COUNT = 2
+POLL_SECONDS = 0.5
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 2.0
+STALE_SECONDS = 600
+
+HANDLERS = {}
+
+
+class JobFailed(Exception):
+    """Raised by a handler when retrying the job can't succeed"""
+
+
+def job(kind):
+    """Register the decorated function as the handler for a job kind"""
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def _connect(path=JOBS_PATH):
+    initialize_data_directories()
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            run_after REAL NOT NULL,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            error TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, run_after)")
+    return conn
+
+
+class JobQueue:
+    """SQLite-backed queue plus the worker threads that drain it"""
+
+    def __init__(self, path=JOBS_PATH, workers=WORKER_COUNT):
+        self.path = path
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._threads = []
+
+        # Jobs left 'running' by a crashed process go back on the queue
+        now = time.time()
+        self._conn().execute(
+            "UPDATE jobs SET status = 'queued', updated_at = ? "
+            "WHERE status = 'running' AND updated_at < ?",
+            (now, now - STALE_SECONDS)
+        )
+        for i in range(workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _conn(self):
+        # sqlite3 connections are per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = _connect(self.path)
+        return conn
+
+    def enqueue(self, kind, delay=0.0, unique=False, **payload):
+        """Queue a job and return its id (the only work done on the caller's thread).
+
+        With unique=True an identical job that is still queued is reused.
+        """
+        if kind not in HANDLERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        now = time.time()
+        payload = json.dumps(payload, sort_keys=True)
+        if unique:
+            row = self._conn().execute(
+                "SELECT id FROM jobs WHERE kind = ? AND payload = ? AND status = 'queued'",
+                (kind, payload)
+            ).fetchone()
+            if row is not None:
+                return row[0]
+        cursor = self._conn().execute(
+            "INSERT INTO jobs (kind, payload, run_after, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (kind, payload, now + delay, now, now)
+        )
+        return cursor.lastrowid
+
+    def pending(self, kind):
+        """Return the payloads of queued or running jobs of one kind"""
+        rows = self._conn().execute(
+            "SELECT payload FROM jobs WHERE kind = ? AND status IN ('queued', 'running')",
+            (kind,)
+        ).fetchall()
+        return [json.loads(payload) for payload, in rows]
+
+    def counts(self):
+        """Return the number of jobs per status"""
+        return dict(self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+
+    def _claim(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, kind, payload, attempts FROM jobs "
+                "WHERE status = 'queued' AND run_after <= ? ORDER BY id LIMIT 1",
+                (time.time(),)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? "
+                    "WHERE id = ?",
+                    (time.time(), row[0])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def _finish(self, job_id, status, error=None, run_after=None):
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, error = ?, run_after = COALESCE(?, run_after), "
+            "updated_at = ? WHERE id = ?",
+            (status, error, run_after, time.time(), job_id)
+        )
+
+    def run_one(self):
+        """Claim and run one ready job; return False if none was ready"""
+        row = self._claim()
+        if row is None:
+            return False
+
+        job_id, kind, payload, attempts = row
+        try:
+            with span(f"job:{kind}"):
+                HANDLERS[kind](**json.loads(payload))
+        except JobFailed:
+            self._finish(job_id, "failed", traceback.format_exc(limit=5))
+        except Exception:
+            error = traceback.format_exc(limit=5)
+            if attempts + 1 >= MAX_ATTEMPTS:
+                self._finish(job_id, "failed", error)
+            else:
+                retry_at = time.time() + RETRY_BASE_SECONDS * 2 ** attempts
+                self._finish(job_id, "queued", error, retry_at)
+        else:
+            self._finish(job_id, "done")
+        return True
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                if not self.run_one():
+                    self._stop.wait(POLL_SECONDS)
+            except sqlite3.OperationalError:
+                # Database busy (another process holds the write lock); retry
+                self._stop.wait(POLL_SECONDS)
+
+    def stop(self):
+        """Stop the workers after their current job"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+
+@st.cache_resource
+def load_job_queue():
+    """Return the process-wide job queue, starting its workers on first use"""
+    return JobQueue()
+
+
+def enqueue(kind, delay=0.0, unique=False, **payload):
+    """Queue a background job on the shared queue"""
+    return load_job_queue().enqueue(kind, delay, unique, **payload)
+
+
+# Job handlers
+@job("booking_status")
+def run_booking_status(booking_id, status):
+    """Apply a booking status change and its ledger postings"""
+    try:
+        applied = update_booking_status(booking_id, status)
+    except ValueError as e:  # the transition isn't allowed; retrying won't change that
+        raise JobFailed(str(e)) from e
+    if applied:
+        # A retry of an attempt that already applied the change doesn't notify again
+        enqueue("booking_event", booking_id=booking_id, event=status)
+    enqueue("refresh_indexes", unique=True)
+
+
+@job("refresh_indexes")
+def run_refresh_indexes():
+    """Bring the recommendation index up to date with the latest bookings"""
+    load_recommendations()
+
+
+# Who hears about each booking and swap event
+BOOKING_EVENT_RECIPIENTS = {
+    "Requested": "owner", "Cancelled": "owner", "Returned": "owner",
+    "Approved": "renter", "Declined": "renter", "Completed": "renter"
+}
+SWAP_EVENT_RECIPIENTS = {"Proposed": "receiver", "Accepted": "proposer", "Declined": "proposer"}
+
+
+@job("booking_event")
+def run_booking_event(booking_id, event):
+    """Fan a booking event out to the owner's or renter's inbox"""
+    bookings_df = load_bookings_data()
+    booking = bookings_df[bookings_df['id'] == booking_id]
+    if booking.empty or event not in BOOKING_EVENT_RECIPIENTS:
+        return
+    booking = booking.iloc[0]
+    tool = get_tool(booking['tool_id'])
+    if tool is None:
+        return
+
+    dates = f"{booking['start_date']} to {booking['end_date']}"
+    if BOOKING_EVENT_RECIPIENTS[event] == "owner":
+        message = f"{booking['renter_username']} {event.lower()} {tool['title']} ({dates})"
+        if event == "Requested":
+            message = f"{booking['renter_username']} requested {tool['title']} for {dates}"
+        recipient = tool['owner_username']
+    else:
+        message = f"Your booking of {tool['title']} ({dates}) was {event.lower()}"
+        recipient = booking['renter_username']
+
+    load_inbox().add_many([(recipient, f"booking_{event.lower()}", message, "bookings")])
+
+
+@job("swap_event")
+def run_swap_event(swap_id, event):
+    """Fan a tool swap event out to the other party's inbox"""
+    swap_df = load_tool_swap_data()
+    swap = swap_df[swap_df['id'] == swap_id]
+    if swap.empty or event not in SWAP_EVENT_RECIPIENTS:
+        return
+    swap = swap.iloc[0]
+    proposer_tool = get_tool(swap['proposer_tool_id'])
+    receiver_tool = get_tool(swap['receiver_tool_id'])
+    titles = (proposer_tool['title'] if proposer_tool is not None else "a tool",
+              receiver_tool['title'] if receiver_tool is not None else "a tool")
+
+    if SWAP_EVENT_RECIPIENTS[event] == "receiver":
+        recipient = swap['receiver_username']
+        message = f"{swap['proposer_username']} proposed swapping {titles[0]} for your {titles[1]}"
+    else:
+        recipient = swap['proposer_username']
+        message = f"{swap['receiver_username']} {event.lower()} your swap of {titles[0]} for {titles[1]}"
+
+    load_inbox().add_many([(recipient, f"swap_{event.lower()}", message, "tool_swap")])
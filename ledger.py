@@ -0,0 +1,302 @@
+import csv
+import io
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Append-only double-entry ledger for booking payments.
+#
+# Every transaction is two or more postings (account, amount_cents) that sum
+# to zero, written as rows of ledger.csv and never rewritten. Accounts:
+#   wallet:<user>     money a user has paid (negative) or been paid (positive)
+#   deposits:<user>   security deposits held for a renter
+#   payable:<user>    rental income earned by an owner, awaiting settlement
+#   escrow:rentals    rental charges held until the booking completes
+#
+# Booking status changes post transactions (charge and deposit hold on
+# approval, deposit release on return, owner earnings on completion), and a
+# batched settlement job moves every payable balance into its owner's wallet.
+# Account balances and per-kind totals are kept in memory and updated as rows
+# are appended, so per-user summaries are dictionary reads.
+#
+# Several processes append to the same file. Posting and settlement run under
+# a write lock shared with them (data_store passes its cross-process lock),
+# and the time of the last settlement is read from the payout rows in the
+# file, so only one process settles per interval.
+
+LEDGER_COLUMNS = [
+    "entry_id", "txn_id", "batch_id", "booking_id", "kind", "account",
+    "amount_cents", "created_at"
+]
+
+RENTAL_ESCROW = "escrow:rentals"
+
+# Each kind of booking transaction is posted at most once per booking, so the
+# ledger tracks which ones a booking has (as bits) to make retries idempotent
+BOOKING_KIND_BITS = {"charge": 1, "deposit_hold": 2, "deposit_release": 4, "earning": 8, "refund": 16}
+SETTLEMENT_INTERVAL_SECONDS = 3600
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def wallet(username):
+    return f"wallet:{username}"
+
+
+def deposits(username):
+    return f"deposits:{username}"
+
+
+def payable(username):
+    return f"payable:{username}"
+
+
+def to_cents(amount):
+    """Convert a dollar amount (scalar or array) to integer cents"""
+    return np.round(np.asarray(amount, dtype=np.float64) * 100).astype(np.int64)
+
+
+# Booking status changes the app makes: the renter cancels or returns, the
+# owner approves, declines or confirms the return, and an approved booking can
+# still be cancelled or declined (and is refunded). booking_transactions posts
+# the payments of each of these.
+BOOKING_TRANSITIONS = {
+    "Pending": ("Approved", "Declined", "Cancelled"),
+    "Approved": ("Returned", "Cancelled", "Declined"),
+    "Returned": ("Completed",),
+}
+
+
+def booking_transition_allowed(old_status, new_status):
+    """Return True if a booking may move from old_status to new_status"""
+    return new_status in BOOKING_TRANSITIONS.get(old_status, ())
+
+
+def booking_transactions(renter, owner, total_cents, deposit_cents, old_status, new_status):
+    """Return the (kind, postings) transactions for one booking status change"""
+    txns = []
+    if old_status == "Pending" and new_status == "Approved":
+        txns.append(("charge", [(wallet(renter), -total_cents), (RENTAL_ESCROW, total_cents)]))
+        if deposit_cents:
+            txns.append(("deposit_hold", [(wallet(renter), -deposit_cents),
+                                          (deposits(renter), deposit_cents)]))
+    elif old_status == "Approved" and new_status == "Returned":
+        if deposit_cents:
+            txns.append(("deposit_release", [(deposits(renter), -deposit_cents),
+                                             (wallet(renter), deposit_cents)]))
+    elif old_status == "Returned" and new_status == "Completed":
+        txns.append(("earning", [(RENTAL_ESCROW, -total_cents), (payable(owner), total_cents)]))
+    elif old_status == "Approved" and new_status in ("Cancelled", "Declined"):
+        txns.append(("refund", [(RENTAL_ESCROW, -total_cents), (wallet(renter), total_cents)]))
+        if deposit_cents:
+            txns.append(("deposit_release", [(deposits(renter), -deposit_cents),
+                                             (wallet(renter), deposit_cents)]))
+    return txns
+
+
+class Ledger:
+    """Append-only ledger file plus in-memory balances"""
+
+    def __init__(self, path, write_lock=None):
+        self.path = path
+        self.last_settlement = 0.0  # time of the newest payout in the file
+        self._last_run = 0.0  # last settlement run by this process (it may post nothing)
+        self._lock = threading.RLock()
+        # Held around every append; pass a cross-process lock when several
+        # processes write the file. Always taken before self._lock.
+        self._write_lock = write_lock if write_lock is not None else self._lock
+        self._offset = 0
+        self._next_entry = 1
+        self._next_txn = 1
+        self.balances = defaultdict(int)
+        self.totals = defaultdict(int)  # (kind, account) -> cents
+        self._booking_kinds = np.zeros(0, dtype=np.uint8)  # booking id -> BOOKING_KIND_BITS
+        self.refresh()
+
+    def __len__(self):
+        return self._next_entry - 1
+
+    def refresh(self):
+        """Apply rows appended to the file since the last read (e.g. by another process)"""
+        with self._lock:
+            if not os.path.exists(self.path) or os.path.getsize(self.path) <= self._offset:
+                return
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                chunk = f.read()
+            # Only consume complete lines; a concurrent writer may be mid-row
+            end = chunk.rfind(b"\n") + 1
+            if end == 0:
+                return
+            text = chunk[:end].decode("utf-8")
+            header = 0 if self._offset == 0 else None
+            df = pd.read_csv(io.StringIO(text), header=header, names=LEDGER_COLUMNS,
+                             dtype={"booking_id": "Int64", "amount_cents": np.int64})
+            self._offset += end
+            self._apply(df)
+
+    def _apply(self, df):
+        if df.empty:
+            return
+        for account, cents in df.groupby("account")["amount_cents"].sum().items():
+            self.balances[account] += int(cents)
+        for key, cents in df.groupby(["kind", "account"])["amount_cents"].sum().items():
+            self.totals[key] += int(cents)
+        self._next_entry = max(self._next_entry, int(df["entry_id"].max()) + 1)
+        self._next_txn = max(self._next_txn, int(df["txn_id"].max()) + 1)
+
+        payouts = df.loc[df["kind"] == "payout", "created_at"]
+        if not payouts.empty:
+            settled = datetime.strptime(str(payouts.max()), TIMESTAMP_FORMAT).timestamp()
+            self.last_settlement = max(self.last_settlement, settled)
+
+        booked = df[df["booking_id"].notna() & df["kind"].isin(BOOKING_KIND_BITS)]
+        if not booked.empty:
+            ids = booked["booking_id"].to_numpy(dtype=np.int64)
+            if ids.max() >= len(self._booking_kinds):
+                grown = np.zeros(max(int(ids.max()) + 1, 2 * len(self._booking_kinds)), dtype=np.uint8)
+                grown[:len(self._booking_kinds)] = self._booking_kinds
+                self._booking_kinds = grown
+            np.bitwise_or.at(self._booking_kinds, ids,
+                             booked["kind"].map(BOOKING_KIND_BITS).to_numpy(dtype=np.uint8))
+
+    def append(self, df):
+        """Append pre-built rows (entry and txn ids must already be assigned)"""
+        with self._lock:
+            write_header = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            df[LEDGER_COLUMNS].to_csv(self.path, mode="a", header=write_header, index=False)
+            self._offset = os.path.getsize(self.path)
+            self._apply(df)
+
+    def post(self, transactions, booking_id=None, batch_id=""):
+        """Post (kind, postings) transactions in one append; returns their txn ids"""
+        with self._write_lock, self._lock:
+            self.refresh()
+            rows = []
+            txn_ids = []
+            created_at = datetime.now().strftime(TIMESTAMP_FORMAT)
+            for kind, postings in transactions:
+                if sum(cents for _, cents in postings) != 0:
+                    raise ValueError(f"Unbalanced {kind} transaction: {postings}")
+                txn_id = self._next_txn + len(txn_ids)
+                txn_ids.append(txn_id)
+                for account, cents in postings:
+                    rows.append([self._next_entry + len(rows), txn_id, batch_id, booking_id,
+                                 kind, account, int(cents), created_at])
+            if rows:
+                self.append(pd.DataFrame(rows, columns=LEDGER_COLUMNS))
+            return txn_ids
+
+    def post_booking(self, booking_id, transactions):
+        """Post a booking's transactions, skipping kinds already posted for it.
+
+        A status change retried after a failure therefore posts its payments
+        exactly once. Returns the txn ids of the transactions posted now.
+        """
+        with self._write_lock, self._lock:
+            self.refresh()
+            posted = int(self._booking_kinds[booking_id]) if booking_id < len(self._booking_kinds) else 0
+            return self.post([(kind, postings) for kind, postings in transactions
+                              if not posted & BOOKING_KIND_BITS[kind]], booking_id=booking_id)
+
+    def settle(self):
+        """Batch-settle every outstanding payable balance into owner wallets"""
+        with self._write_lock, self._lock:
+            self.refresh()
+            batch_id = datetime.now().strftime("S%Y%m%d%H%M%S")
+            transactions = [
+                ("payout", [(account, -cents), (wallet(account.split(":", 1)[1]), cents)])
+                for account, cents in self.balances.items()
+                if account.startswith("payable:") and cents > 0
+            ]
+            self.post(transactions, batch_id=batch_id)
+            self._last_run = time.time()
+            return len(transactions)
+
+    def settle_if_due(self, interval=SETTLEMENT_INTERVAL_SECONDS):
+        """Run settlement if no process has settled in the last `interval` seconds"""
+        def due():
+            return time.time() - max(self.last_settlement, self._last_run) >= interval
+
+        self.refresh()
+        if not due():
+            return 0
+        with self._write_lock, self._lock:
+            self.refresh()  # another process may have settled while we waited
+            return self.settle() if due() else 0
+
+    def user_summary(self, username):
+        """Return a user's income, rental spend, held deposits and pending payout in dollars"""
+        totals, balances = self.totals, self.balances
+        return {
+            "income": totals.get(("payout", wallet(username)), 0) / 100,
+            "spent": -(totals.get(("charge", wallet(username)), 0)
+                       + totals.get(("refund", wallet(username)), 0)) / 100,
+            "deposits_held": balances.get(deposits(username), 0) / 100,
+            "pending_payout": balances.get(payable(username), 0) / 100
+        }
+
+
+def backfill_rows(bookings_df, owners, deposit_cents, start_txn=1, start_entry=1):
+    """Build ledger rows for bookings that predate the ledger.
+
+    Replays the transitions each booking must have gone through to reach its
+    current status (Cancelled/Declined are assumed to have left Pending).
+    owners and deposit_cents are aligned with bookings_df rows.
+    """
+    status = bookings_df["status"].to_numpy()
+    renters = bookings_df["renter_username"].to_numpy(dtype=object)
+    booking_ids = bookings_df["id"].to_numpy()
+    totals = to_cents(bookings_df["total_cost"].fillna(0))
+    owners = np.asarray(owners, dtype=object)
+    deposit_cents = np.asarray(deposit_cents, dtype=np.int64)
+
+    approved = np.isin(status, ["Approved", "Returned", "Completed"])
+    returned = np.isin(status, ["Returned", "Completed"])
+    completed = status == "Completed"
+    held = approved & (deposit_cents > 0)
+    released = returned & (deposit_cents > 0)
+
+    # (kind, mask, debit account, credit account, amount)
+    steps = [
+        ("charge", approved, "wallet:" + renters, np.full(len(renters), RENTAL_ESCROW, dtype=object), totals),
+        ("deposit_hold", held, "wallet:" + renters, "deposits:" + renters, deposit_cents),
+        ("deposit_release", released, "deposits:" + renters, "wallet:" + renters, deposit_cents),
+        ("earning", completed, np.full(len(renters), RENTAL_ESCROW, dtype=object), "payable:" + owners, totals),
+    ]
+
+    frames = []
+    txn = start_txn
+    for kind, mask, debit, credit, amount in steps:
+        n = int(mask.sum())
+        if n == 0:
+            continue
+        txn_ids = np.arange(txn, txn + n)
+        txn += n
+        frames.append(pd.DataFrame({
+            "txn_id": np.repeat(txn_ids, 2),
+            "booking_id": np.repeat(booking_ids[mask], 2),
+            "kind": kind,
+            "account": np.column_stack([debit[mask], credit[mask]]).ravel(),
+            "amount_cents": np.column_stack([-amount[mask], amount[mask]]).ravel()
+        }))
+
+    if not frames:
+        return pd.DataFrame(columns=LEDGER_COLUMNS)
+    df = pd.concat(frames, ignore_index=True)
+    df["entry_id"] = np.arange(start_entry, start_entry + len(df))
+    df["batch_id"] = "backfill"
+    df["created_at"] = datetime.now().strftime(TIMESTAMP_FORMAT)
+    return df[LEDGER_COLUMNS]
+
+
+def write_ledger_csv(path, rows):
+    """Write a fresh ledger file (header only if rows is empty)"""
+    with open(path, "w", newline="") as f:
+        csv.writer(f).writerow(LEDGER_COLUMNS)
+    if len(rows):
+        rows.to_csv(path, mode="a", header=False, index=False)
@@ -0,0 +1,117 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+import streamlit as st
+
+from data_store import DATA_DIR, initialize_data_directories
+
+# Per-user notification inbox.
+#
+# Notifications live in SQLite (data/notifications.db) next to an
+# unread_counts table that is updated in the same transaction as every insert
+# or mark-as-read, so the sidebar badge is a single primary-key lookup rather
+# than a count over notifications (or a scan of bookings). Fan-out is batched:
+# all notifications produced by one event are inserted in one transaction.
+
+NOTIFICATIONS_PATH = os.path.join(DATA_DIR, "notifications.db")
+INBOX_PAGE_SIZE = 20
+
+
+class NotificationInbox:
+    """SQLite-backed notifications with incrementally maintained unread counters"""
+
+    def __init__(self, path=NOTIFICATIONS_PATH):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS notifications (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                message TEXT NOT NULL,
+                link_page TEXT,
+                created_at REAL NOT NULL,
+                read INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS notifications_user ON notifications (username, id)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS unread_counts (
+                username TEXT PRIMARY KEY,
+                unread INTEGER NOT NULL
+            )
+        """)
+
+    def _conn(self):
+        # sqlite3 connections are per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            initialize_data_directories()
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def add_many(self, notifications):
+        """Insert (username, kind, message, link_page) rows in one transaction"""
+        if not notifications:
+            return
+        now = time.time()
+        per_user = Counter(username for username, *_ in notifications)
+
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO notifications (username, kind, message, link_page, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(*row, now) for row in notifications]
+            )
+            conn.executemany(
+                "INSERT INTO unread_counts (username, unread) VALUES (?, ?) "
+                "ON CONFLICT(username) DO UPDATE SET unread = unread + excluded.unread",
+                per_user.items()
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def unread_count(self, username):
+        """Return the user's unread count (one primary-key lookup)"""
+        row = self._conn().execute(
+            "SELECT unread FROM unread_counts WHERE username = ?", (username,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def recent(self, username, limit=INBOX_PAGE_SIZE, before_id=None):
+        """Return the user's newest notifications as dicts (keyset-paginated)"""
+        rows = self._conn().execute(
+            "SELECT id, kind, message, link_page, created_at, read FROM notifications "
+            "WHERE username = ? AND id < ? ORDER BY id DESC LIMIT ?",
+            (username, before_id if before_id is not None else 2 ** 63 - 1, limit)
+        ).fetchall()
+        columns = ["id", "kind", "message", "link_page", "created_at", "read"]
+        return [dict(zip(columns, row)) for row in rows]
+
+    def mark_all_read(self, username):
+        """Mark every notification of the user as read and reset the counter"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("UPDATE notifications SET read = 1 WHERE username = ? AND read = 0",
+                         (username,))
+            conn.execute("UPDATE unread_counts SET unread = 0 WHERE username = ?", (username,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+@st.cache_resource
+def load_inbox():
+    """Return the process-wide notification inbox"""
+    return NotificationInbox()
@@ -0,0 +1,329 @@
+import atexit
+import contextlib
+import heapq
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from data_store import load_tool_catalog
+from instrumentation import span
+from ranking import distance_score, haversine_km, load_neighborhood_index, top_order
+
+# Parallel filter-and-rank for very large catalogs.
+#
+# The columns a search reads (type and neighborhood codes, price, rating,
+# availability and coordinates) are copied once into shared memory, ordered
+# by neighborhood group so that every group is one contiguous range. A pool of
+# worker processes attaches to those blocks without copying. Each search gives
+# every worker its share of every group; a worker walks the groups nearest
+# first exactly like rank_tools (stopping once no further group can beat its
+# n-th best), filters and scores contiguous slices, and returns only its local
+# top-N (and, when asked, how many rows of its share pass the filters). The
+# parent merges the partial results. Per search, only the query and N rows
+# per worker cross process boundaries, in one round trip.
+#
+# Callers lease an executor (`with load_parallel_search(city) as executor`).
+# When the catalog changes, the old executor is retired and only shut down
+# once its last lease ends, so searches in flight never hit a closed pool or
+# unlinked shared memory.
+#
+# Below PARALLEL_MIN_ROWS the single-process rank_tools path is faster (a
+# search there takes a few milliseconds), so callers only switch over for
+# catalogs of millions of listings.
+
+PARALLEL_MIN_ROWS = 2_000_000
+
+SEARCH_COLUMNS = ["tool_type", "neighborhood", "daily_rate", "rating", "available",
+                  "latitude", "longitude"]
+CODE_COLUMNS = ["tool_type", "neighborhood"]
+
+
+class SharedColumns:
+    """Catalog search columns, in neighborhood group order, in shared memory blocks"""
+
+    def __init__(self, catalog, index):
+        order = np.concatenate(index.members) if index.members else np.zeros(0, dtype=np.int32)
+        # Group g occupies rows group_starts[g]:group_starts[g + 1]
+        self.group_starts = np.concatenate([[0], np.cumsum([len(m) for m in index.members])])
+        self.layout = {}
+        self._blocks = []
+        for column in SEARCH_COLUMNS + ["position"]:
+            if column == "position":
+                values = order
+            elif column in CODE_COLUMNS:
+                values = catalog.codes(column)[0][order]
+            else:
+                values = catalog.column(column)[order]
+            values = np.ascontiguousarray(values)
+            block = SharedMemory(create=True, size=max(values.nbytes, 1))
+            np.ndarray(values.shape, values.dtype, buffer=block.buf)[:] = values
+            self._blocks.append(block)
+            self.layout[column] = (block.name, values.dtype.str, len(values))
+        self.rows = len(order)
+
+    def close(self):
+        """Release and remove the shared blocks"""
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+
+# Worker side: the attached arrays of this process's executor
+_worker_columns = {}
+_worker_blocks = []
+_worker_groups = {}
+
+
+def _attach(layout, group_starts):
+    for column, (name, dtype, length) in layout.items():
+        # Spawned workers share the parent's resource tracker, and the parent
+        # unlinks the blocks in close()
+        block = SharedMemory(name=name)
+        _worker_blocks.append(block)
+        array = np.ndarray((length,), np.dtype(dtype), buffer=block.buf)
+        array.setflags(write=False)
+        _worker_columns[column] = array
+    _worker_groups["starts"] = group_starts
+
+
+def _filter(start, stop, query):
+    """Return the rows in [start, stop) that pass the query filters"""
+    cols = _worker_columns
+    mask = np.ones(stop - start, dtype=bool)
+    if query["available_only"]:
+        mask &= cols["available"][start:stop]
+    for column in CODE_COLUMNS:
+        if query[column] is not None:
+            mask &= cols[column][start:stop] == query[column]
+    if query["max_price"] is not None:
+        mask &= cols["daily_rate"][start:stop] <= query["max_price"]
+    return np.flatnonzero(mask) + start
+
+
+def _count_partition(part, parts, query):
+    """Count the rows of this worker's contiguous share that pass the filters"""
+    total = _worker_groups["starts"][-1]
+    return len(_filter(total * part // parts, total * (part + 1) // parts, query))
+
+
+def _top(n, *arrays):
+    # arrays[1] holds the scores; ties go to the lower arrays[0]
+    if len(arrays[0]) <= n:
+        return arrays
+    top = top_order(arrays[1], arrays[0], n)
+    return tuple(a[top] for a in arrays)
+
+
+def _search_partition(part, parts, query):
+    """Search this worker's share of the rows and return its local top n.
+
+    Returns (positions, scores, km, matches); matches counts the rows of the
+    share that pass the filters if query["count"] is set, else it is 0.
+    """
+    cols = _worker_columns
+    starts = _worker_groups["starts"]
+    n = query["n"]
+
+    if query["origin"] is None:
+        # No origin: best rated first, as search_tools orders them
+        rows = _filter(starts[-1] * part // parts, starts[-1] * (part + 1) // parts, query)
+        # Ties are broken by catalog position, as in the serial search
+        positions, scores, km = _top(n, cols["position"][rows].astype(np.int64),
+                                     cols["rating"][rows].astype(np.float64), np.full(len(rows), np.nan))
+        return positions, scores, km, len(rows)
+
+    matches = _count_partition(part, parts, query) if query["count"] else 0
+
+    w_dist, w_price, w_rating = query["weights"]
+    lower_km, max_km = query["lower_km"], query["max_km"]
+    best_possible = w_dist * distance_score(lower_km) + w_price + w_rating
+    if query["neighborhood"] is None:
+        groups = np.argsort(lower_km, kind="stable")
+    else:
+        groups = [query["neighborhood"]] if query["neighborhood"] >= 0 else []
+
+    heap = []  # min-heap of (score, row, km), as in rank_tools
+    for group in groups:
+        if max_km is not None and lower_km[group] > max_km:
+            break
+        if len(heap) == n and best_possible[group] <= heap[0][0]:
+            break
+        size = starts[group + 1] - starts[group]
+        rows = _filter(starts[group] + size * part // parts,
+                       starts[group] + size * (part + 1) // parts, query)
+        if len(rows) == 0:
+            continue
+
+        km = haversine_km(query["origin"][0], query["origin"][1],
+                          cols["latitude"][rows], cols["longitude"][rows])
+        scores = w_dist * distance_score(km) + \
+            w_price * (1.0 - cols["daily_rate"][rows] / query["price_scale"]) + \
+            w_rating * cols["rating"][rows] / 5.0
+        if max_km is not None:
+            keep = km <= max_km
+            rows, scores, km = rows[keep], scores[keep], km[keep]
+        rows, scores, km = _top(n, rows, scores, km)
+
+        for score, row, dist in zip(scores.tolist(), rows.tolist(), km.tolist()):
+            if len(heap) < n:
+                heapq.heappush(heap, (score, row, dist))
+            elif score > heap[0][0]:
+                heapq.heapreplace(heap, (score, row, dist))
+
+    rows = np.array([r for _, r, _ in heap], dtype=np.int64)
+    return (cols["position"][rows].astype(np.int64), np.array([s for s, _, _ in heap]),
+            np.array([d for _, _, d in heap]), matches)
+
+
+class ParallelSearch:
+    """Process-pool search over one catalog version held in shared memory"""
+
+    def __init__(self, catalog, index, workers=None):
+        self.catalog = catalog
+        self.index = index
+        self.version = catalog.version
+        self.workers = workers or os.cpu_count() or 1
+        self.columns = SharedColumns(catalog, index)
+        self._leases = 0
+        self._retired = False
+        self._lease_lock = threading.Lock()
+        # spawn: forking a multithreaded Streamlit server is unsafe
+        self._pool = ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_attach, initargs=(self.columns.layout, self.columns.group_starts)
+        )
+
+    def _query(self, tool_type, neighborhood, max_price, origin, max_km, weights, n, available_only,
+               count=False):
+        codes = {}
+        for column, value in (("tool_type", tool_type), ("neighborhood", neighborhood)):
+            code = None
+            if value is not None:
+                categories = self.catalog.codes(column)[1]
+                matches = np.flatnonzero(categories == value)
+                code = int(matches[0]) if len(matches) else -2  # -2 matches nothing
+            codes[column] = code
+        if isinstance(origin, str):
+            point = self.index.origin(origin)
+            if point is None:
+                raise ValueError(f"Unknown neighborhood: {origin}")
+            origin = point
+        return {
+            **codes,
+            "max_price": max_price,
+            "available_only": available_only,
+            "origin": tuple(float(v) for v in origin) if origin is not None else None,
+            "max_km": max_km,
+            "lower_km": self.index.lower_bounds(origin) if origin is not None else None,
+            "weights": weights,
+            "price_scale": self.index.max_price or 1.0,
+            "n": n,
+            "count": count,
+        }
+
+    def search(self, tool_type=None, neighborhood=None, max_price=None, origin=None, max_km=None,
+               weights=(0.5, 0.25, 0.25), n=60, available_only=True):
+        """Return (positions, scores, distances_km) of the n best matches, best first.
+
+        Scores match rank_tools (and, without an origin, the rating order of
+        search_tools); equal scores are ordered by catalog position.
+        """
+        query = self._query(tool_type, neighborhood, max_price, origin, max_km, weights, n,
+                            available_only)
+        return self._search(query)[:3]
+
+    def search_and_count(self, tool_type=None, neighborhood=None, max_price=None, origin=None,
+                         max_km=None, weights=(0.5, 0.25, 0.25), n=60, available_only=True):
+        """Return search() plus count() of the same filters, in one round trip to the workers"""
+        query = self._query(tool_type, neighborhood, max_price, origin, max_km, weights, n,
+                            available_only, count=True)
+        return self._search(query)
+
+    def _search(self, query):
+        n = query["n"]
+        with span("parallel_search", workers=self.workers, n=n):
+            parts = list(self._pool.map(
+                _search_partition, range(self.workers), [self.workers] * self.workers,
+                [query] * self.workers
+            ))
+            positions = np.concatenate([p for p, _, _, _ in parts])
+            scores = np.concatenate([s for _, s, _, _ in parts])
+            km = np.concatenate([d for _, _, d, _ in parts])
+
+            # Best score first, ties by position (the rank_tools order)
+            order = top_order(scores, positions, n)
+        return positions[order], scores[order], km[order], sum(m for _, _, _, m in parts)
+
+    def count(self, tool_type=None, neighborhood=None, max_price=None, available_only=True):
+        """Return how many tools pass the filters (before any distance limit)"""
+        query = self._query(tool_type, neighborhood, max_price, None, None, None, 0, available_only)
+        return sum(self._pool.map(_count_partition, range(self.workers), [self.workers] * self.workers,
+                                  [query] * self.workers))
+
+    def close(self):
+        """Stop the workers and free the shared memory"""
+        self._pool.shutdown()
+        self.columns.close()
+
+    def _lease(self):
+        with self._lease_lock:
+            self._leases += 1
+
+    def _release(self):
+        with self._lease_lock:
+            self._leases -= 1
+            close = self._retired and self._leases == 0
+        if close:
+            self.close()
+
+    def retire(self):
+        """Close once the last lease ends (right away if there is none)"""
+        with self._lease_lock:
+            self._retired = True
+            close = self._leases == 0
+        if close:
+            self.close()
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def load_parallel_search(city=None):
+    """Lease the parallel executor for a city's current catalog version.
+
+    Use as `with load_parallel_search(city) as executor:`. One executor is
+    kept per city; when the catalog changes a new one is started, and the old
+    one's workers and shared memory are released when its last lease ends.
+    """
+    catalog = load_tool_catalog(city)
+    stale = None
+    with _executors_lock:
+        executor = _executors.get(city)
+        if executor is None or executor.version != catalog.version:
+            stale = executor
+            with span("start_parallel_search", rows=len(catalog)):
+                executor = _executors[city] = ParallelSearch(catalog, load_neighborhood_index(city))
+        # Taken under _executors_lock, so a retired executor is never leased
+        executor._lease()
+    # Retired outside the lock: its shutdown waits for in-flight searches,
+    # which must not hold up other cities' lookups
+    if stale is not None:
+        stale.retire()
+    try:
+        yield executor
+    finally:
+        executor._release()
+
+
+@atexit.register
+def _close_executors():
+    for executor in _executors.values():
+        executor.close()
+    _executors.clear()
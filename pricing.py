@@ -0,0 +1,159 @@
+import time
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from data_store import load_bookings_data, load_tool_catalog
+from instrumentation import span
+
+# Batch pricing engine. Suggested daily rates are computed for the whole
+# catalog at once from three signals:
+#   - utilization: share of the last UTILIZATION_WINDOW_DAYS each tool was booked
+#   - neighborhood demand: booked days per tool in its neighborhood vs the
+#     catalog average
+#   - tool_type supply: available listings of that type vs the average type
+# and anchored on the median daily rate of the tool's type. The result is keyed
+# by tool id, recomputed once per PRICING_INTERVAL_SECONDS, and shared by every
+# session, so pages only do lookups.
+
+PRICING_INTERVAL_SECONDS = 3600
+UTILIZATION_WINDOW_DAYS = 90
+ACTIVE_BOOKING_STATUSES = ["Pending", "Approved", "Returned", "Completed"]
+
+TARGET_UTILIZATION = 0.3
+UTILIZATION_SENSITIVITY = 0.5
+DEMAND_SENSITIVITY = 0.3
+SUPPLY_SENSITIVITY = 0.2
+
+# Suggestions stay within this multiple of the owner's current rate
+MIN_FACTOR = 0.7
+MAX_FACTOR = 1.5
+
+
+def _round_price(values):
+    """Round prices to the nearest $0.50"""
+    return np.round(np.asarray(values) * 2) / 2
+
+
+def _booked_days(catalog, bookings_df, as_of):
+    """Return booked days per catalog position inside the utilization window"""
+    booked = np.zeros(len(catalog))
+    if bookings_df.empty:
+        return booked
+
+    active = bookings_df[bookings_df['status'].isin(ACTIVE_BOOKING_STATUSES)]
+    positions = catalog.positions(active['tool_id'].to_numpy())
+    window_start = as_of - pd.Timedelta(days=UTILIZATION_WINDOW_DAYS)
+
+    start = pd.to_datetime(active['start_date'], errors="coerce").clip(lower=window_start)
+    end = pd.to_datetime(active['end_date'], errors="coerce").clip(upper=as_of)
+    days = ((end - start).dt.days.fillna(0).clip(lower=0)).to_numpy(dtype=np.float64)
+
+    found = positions >= 0
+    return np.bincount(positions[found], weights=days[found], minlength=len(catalog))
+
+
+class PriceSuggestions:
+    """Suggested daily rates per tool and per (tool_type, neighborhood)"""
+
+    def __init__(self, ids, rates, segment_rates, tool_types, neighborhoods, fallback,
+                 computed_at):
+        self._ids = ids
+        self._rates = rates
+        self._segment_rates = segment_rates
+        self._type_index = {name: i for i, name in enumerate(tool_types)}
+        self._neighborhood_index = {name: i for i, name in enumerate(neighborhoods)}
+        self._fallback = fallback
+        self.computed_at = computed_at
+
+    def for_tool(self, tool_id):
+        """Return the suggested daily rate for a listed tool, or None"""
+        i = np.searchsorted(self._ids, tool_id)
+        if i >= len(self._ids) or self._ids[i] != tool_id:
+            return None
+        return float(self._rates[i])
+
+    def for_listing(self, tool_type, neighborhood):
+        """Return the suggested daily rate for a new listing of a type and area"""
+        t = self._type_index.get(tool_type)
+        h = self._neighborhood_index.get(neighborhood)
+        if t is None:
+            return self._fallback
+        if h is None:
+            return float(_round_price(np.median(self._segment_rates[t])))
+        return float(self._segment_rates[t, h])
+
+
+def compute_price_suggestions(catalog, bookings_df, as_of=None):
+    """Compute suggested daily rates for every tool in the catalog"""
+    if as_of is None:
+        # Anchor the window on the latest booking so historical data still has
+        # a utilization signal, but never in the future
+        latest = pd.to_datetime(bookings_df['end_date'], errors="coerce").max() \
+            if not bookings_df.empty else pd.NaT
+        now = pd.Timestamp.now().normalize()
+        as_of = now if pd.isna(latest) else min(latest, now)
+
+    type_codes, tool_types = catalog.codes("tool_type")
+    hood_codes, neighborhoods = catalog.codes("neighborhood")
+    type_codes = np.maximum(type_codes, 0)
+    hood_codes = np.maximum(hood_codes, 0)
+    n_types, n_hoods = max(len(tool_types), 1), max(len(neighborhoods), 1)
+
+    rates = catalog.column("daily_rate").astype(np.float64)
+    available = catalog.column("available")
+    ids = catalog.column("id")
+
+    with span("compute_price_suggestions", tools=len(catalog)):
+        booked = _booked_days(catalog, bookings_df, as_of)
+        if bookings_df.empty:
+            # No booking history yet: leave utilization neutral
+            utilization = np.full(len(catalog), TARGET_UTILIZATION)
+        else:
+            utilization = np.minimum(booked / UTILIZATION_WINDOW_DAYS, 1.0)
+
+        # Market anchor: median daily rate of each tool type
+        type_median = pd.Series(rates).groupby(type_codes).median() \
+            .reindex(range(n_types)).fillna(np.median(rates) if len(rates) else 0).to_numpy()
+
+        # Demand: booked days per tool in the neighborhood vs the catalog mean
+        hood_tools = np.bincount(hood_codes, minlength=n_hoods)
+        hood_booked = np.bincount(hood_codes, weights=booked, minlength=n_hoods)
+        mean_booked = booked.mean() if len(booked) and booked.mean() > 0 else 1.0
+        demand = np.where(hood_tools > 0, hood_booked / np.maximum(hood_tools, 1) / mean_booked, 1.0)
+        demand_factor = np.maximum(demand, 0.1) ** DEMAND_SENSITIVITY
+
+        # Supply: available listings of each type vs the mean per type
+        type_supply = np.bincount(type_codes[available], minlength=n_types).astype(np.float64)
+        supply = type_supply / max(type_supply.mean(), 1.0)
+        supply_factor = np.maximum(supply, 0.1) ** -SUPPLY_SENSITIVITY
+
+        utilization_factor = 1.0 + UTILIZATION_SENSITIVITY * \
+            (utilization - TARGET_UTILIZATION) / TARGET_UTILIZATION
+
+        anchor = 0.5 * rates + 0.5 * type_median[type_codes]
+        suggested = anchor * utilization_factor * demand_factor[hood_codes] * supply_factor[type_codes]
+        suggested = _round_price(np.clip(suggested, MIN_FACTOR * rates, MAX_FACTOR * rates))
+
+        segment_rates = _round_price(
+            type_median[:, None] * supply_factor[:, None] * demand_factor[None, :]
+        )
+
+    order = np.argsort(ids, kind="stable")
+    return PriceSuggestions(
+        ids[order], suggested[order].astype(np.float32), segment_rates,
+        list(tool_types), list(neighborhoods),
+        float(_round_price(np.median(rates))) if len(rates) else None,
+        computed_at=time.time()
+    )
+
+
+@st.cache_resource(max_entries=1)
+def _scheduled_suggestions(slot):
+    return compute_price_suggestions(load_tool_catalog(), load_bookings_data())
+
+
+def load_price_suggestions():
+    """Return the current batch of price suggestions (recomputed hourly)"""
+    return _scheduled_suggestions(int(time.time() // PRICING_INTERVAL_SECONDS))
@@ -0,0 +1,202 @@
+import heapq
+
+import numpy as np
+import streamlit as st
+
+from data_store import MAX_CACHED_SHARDS, load_tool_catalog
+from instrumentation import span
+
+# Distance-aware ranking for Find Tools.
+#
+# Each listing gets a score in [0, 1] mixing closeness to the user, price and
+# rating. Tools are grouped by neighborhood, and a small neighborhood index
+# (data centroids, the radius every tool lies within, and the centroid-to-
+# centroid distance matrix) gives a lower bound on the distance to any tool in
+# a neighborhood. Neighborhoods are scanned nearest-first into a top-N heap,
+# and the scan stops as soon as no tool in the next neighborhood could beat the
+# heap's worst entry, so distant neighborhoods are never scored or sorted.
+
+EARTH_RADIUS_KM = 6371.0088
+
+DISTANCE_WEIGHT = 0.5
+PRICE_WEIGHT = 0.25
+RATING_WEIGHT = 0.25
+DISTANCE_SCALE_KM = 2.0
+
+DEFAULT_RESULTS = 60
+MAX_SEARCH_KM = 30
+
+# (distance, price, rating) weights for each Find Tools sort option
+SORT_WEIGHTS = {
+    "Best Match": (DISTANCE_WEIGHT, PRICE_WEIGHT, RATING_WEIGHT),
+    "Nearest": (1.0, 0.0, 0.0),
+    "Lowest Price": (0.1, 0.9, 0.0),
+    "Top Rated": (0.1, 0.0, 0.9)
+}
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km (vectorized over NumPy arrays)"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64))
+                              for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + \
+        np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def distance_score(km):
+    """Map a distance to (0, 1], 1 meaning right next door"""
+    return 1.0 / (1.0 + np.asarray(km) / DISTANCE_SCALE_KM)
+
+
+def top_order(scores, keys, n):
+    """Return the indices of the n best scores, best first, ties by ascending key.
+
+    Only the candidates scoring at least the n-th best are sorted, so ties
+    come back in the same order whichever way the rows were split.
+    """
+    scores = np.asarray(scores)
+    if n <= 0:
+        return np.zeros(0, dtype=np.int64)
+    candidates = np.arange(len(scores))
+    if len(scores) > n:
+        nth = np.partition(scores, len(scores) - n)[len(scores) - n]
+        candidates = np.flatnonzero(scores >= nth)
+    return candidates[np.lexsort((np.asarray(keys)[candidates], -scores[candidates]))[:n]]
+
+
+class NeighborhoodIndex:
+    """Per-neighborhood tool groups, centroids, radii and distance matrix"""
+
+    def __init__(self, catalog):
+        codes, names = catalog.codes("neighborhood")
+        lat = catalog.column("latitude").astype(np.float64)
+        lon = catalog.column("longitude").astype(np.float64)
+        k = len(names)
+
+        # Tools without a neighborhood go into an extra group k that is
+        # always scanned (its lower bound is 0)
+        groups = np.where(codes >= 0, codes, k)
+        order = np.argsort(groups, kind="stable").astype(np.int32)
+        counts = np.bincount(groups, minlength=k + 1)
+        self.members = np.split(order, np.cumsum(counts)[:-1])
+
+        known = groups < k
+        safe_counts = np.maximum(counts[:k], 1)
+        self.centroids = np.column_stack([
+            np.bincount(groups[known], weights=lat[known], minlength=k) / safe_counts,
+            np.bincount(groups[known], weights=lon[known], minlength=k) / safe_counts
+        ])
+
+        self.radii = np.zeros(k)
+        if known.any():
+            spread = haversine_km(lat[known], lon[known],
+                                  self.centroids[groups[known], 0],
+                                  self.centroids[groups[known], 1])
+            np.maximum.at(self.radii, groups[known], spread)
+
+        self.names = list(names)
+        self.codes = {name: i for i, name in enumerate(self.names)}
+        self.distance_matrix = haversine_km(
+            self.centroids[:, None, 0], self.centroids[:, None, 1],
+            self.centroids[None, :, 0], self.centroids[None, :, 1]
+        )
+        self.max_price = float(catalog.column("daily_rate").max()) if len(catalog) else 0.0
+        self.version = catalog.version
+
+    def origin(self, neighborhood):
+        """Return the (lat, lon) centroid of a neighborhood, or None"""
+        code = self.codes.get(neighborhood)
+        return tuple(self.centroids[code]) if code is not None else None
+
+    def lower_bounds(self, origin):
+        """Return the minimum possible distance (km) from origin to each group.
+
+        origin is a neighborhood name (one row of the distance matrix) or a
+        (lat, lon) pair.
+        """
+        code = self.codes.get(origin) if isinstance(origin, str) else None
+        if code is not None:
+            to_centroid = self.distance_matrix[code]
+        else:
+            to_centroid = haversine_km(origin[0], origin[1],
+                                       self.centroids[:, 0], self.centroids[:, 1])
+        return np.append(np.maximum(to_centroid - self.radii, 0.0), 0.0)
+
+
+@st.cache_resource(max_entries=MAX_CACHED_SHARDS)
+def _build_neighborhood_index(city, version):
+    return NeighborhoodIndex(load_tool_catalog(city))
+
+
+def load_neighborhood_index(city=None):
+    """Return the neighborhood index for a city's current catalog version"""
+    catalog = load_tool_catalog(city)
+    with span("load_neighborhood_index"):
+        return _build_neighborhood_index(city, catalog.version)
+
+
+def rank_tools(catalog, index, origin, allowed=None, n=DEFAULT_RESULTS, max_km=None,
+               weights=(DISTANCE_WEIGHT, PRICE_WEIGHT, RATING_WEIGHT)):
+    """Return (positions, scores, distances_km) of the n best tools, best first.
+
+    allowed is an optional boolean mask over catalog positions (the active
+    filters); max_km drops tools further than that from origin.
+    """
+    w_dist, w_price, w_rating = weights
+    if isinstance(origin, str):
+        origin_point = index.origin(origin)
+        if origin_point is None:
+            raise ValueError(f"Unknown neighborhood: {origin}")
+    else:
+        origin_point = origin
+    lower_bounds = index.lower_bounds(origin)
+
+    lat = catalog.column("latitude")
+    lon = catalog.column("longitude")
+    price = catalog.column("daily_rate")
+    rating = catalog.column("rating")
+    max_price = index.max_price or 1.0
+
+    # Best score any tool in a group could reach: right at the lower bound,
+    # free, and rated 5/5
+    best_possible = w_dist * distance_score(lower_bounds) + w_price + w_rating
+
+    heap = []  # min-heap of (score, position, km)
+    with span("rank_tools", n=n):
+        for group in np.argsort(lower_bounds, kind="stable"):
+            if max_km is not None and lower_bounds[group] > max_km:
+                break
+            if len(heap) == n and best_possible[group] <= heap[0][0]:
+                break
+
+            members = index.members[group]
+            if allowed is not None:
+                members = members[allowed[members]]
+            if len(members) == 0:
+                continue
+
+            km = haversine_km(origin_point[0], origin_point[1], lat[members], lon[members])
+            scores = w_dist * distance_score(km) + \
+                w_price * (1.0 - price[members] / max_price) + \
+                w_rating * rating[members] / 5.0
+            if max_km is not None:
+                keep = km <= max_km
+                members, km, scores = members[keep], km[keep], scores[keep]
+
+            # Only this group's own top n can enter the heap
+            if len(members) > n:
+                top = np.argpartition(-scores, n - 1)[:n]
+                members, km, scores = members[top], km[top], scores[top]
+
+            for score, position, dist in zip(scores.tolist(), members.tolist(), km.tolist()):
+                if len(heap) < n:
+                    heapq.heappush(heap, (score, position, dist))
+                elif score > heap[0][0]:
+                    heapq.heapreplace(heap, (score, position, dist))
+
+    ranked = sorted(heap, key=lambda item: (-item[0], item[1]))
+    positions = np.array([p for _, p, _ in ranked], dtype=np.int64)
+    scores = np.array([s for s, _, _ in ranked])
+    distances = np.array([d for _, _, d in ranked])
+    return positions, scores, distances
@@ -0,0 +1,289 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from data_store import bookings_version, load_bookings_data, load_tool_catalog, tools_version
+from instrumentation import span
+
+# "Similar tools" and "people also rented" recommendations.
+#
+# Both lists are precomputed into compact (n_tools, K) int32 arrays of catalog
+# positions (-1 padded) with float32 scores alongside, so the details page
+# reads a tool's recommendations with one O(K) row lookup.
+#
+# Item-item similarity scores tool_type, brand, price band and distance. To
+# stay O(n) on large catalogs, candidates for each tool are the WINDOW tools on
+# either side of it after sorting by (tool_type, neighborhood, price band,
+# brand), rather than every other tool.
+#
+# Co-rentals count pairs of tools rented by the same renter, looking at each
+# renter's most recent HISTORY bookings.
+
+TOP_K = 8
+WINDOW = 16
+HISTORY = 10
+PRICE_BANDS = 5
+
+TYPE_WEIGHT = 3.0
+BRAND_WEIGHT = 1.0
+PRICE_WEIGHT = 1.0
+DISTANCE_WEIGHT = 1.0
+DISTANCE_SCALE_KM = 2.0
+
+# Rows are scored in blocks to bound the (rows x 2*WINDOW) score matrix
+SCORE_BLOCK_ROWS = 262_144
+
+# Appended tools are scored one by one against every tool of their type, so
+# past this many (or 5% of the catalog) a full windowed rebuild is cheaper
+MAX_INCREMENTAL_TOOLS = 256
+
+
+def _approx_km(lat1, lon1, lat2, lon2):
+    """Equirectangular distance in km (accurate at neighborhood scale)"""
+    dy = (lat2 - lat1) * 110.57
+    dx = (lon2 - lon1) * 111.32 * np.cos(np.radians((lat1 + lat2) / 2))
+    return np.sqrt(dx * dx + dy * dy)
+
+
+def _top_k(scores, candidates, k):
+    """Return the k best (candidates, scores) per row, best first, -1 padded"""
+    if scores.shape[1] < k:
+        pad = k - scores.shape[1]
+        scores = np.pad(scores, ((0, 0), (0, pad)), constant_values=-np.inf)
+        candidates = np.pad(candidates, ((0, 0), (0, pad)), constant_values=-1)
+    best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    best_scores = np.take_along_axis(scores, best, axis=1)
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    best = np.take_along_axis(best, order, axis=1)
+    best_scores = np.take_along_axis(best_scores, order, axis=1)
+    best_candidates = np.take_along_axis(candidates, best, axis=1)
+    best_candidates[~np.isfinite(best_scores)] = -1
+    return best_candidates.astype(np.int32), best_scores.astype(np.float32)
+
+
+class RecommendationIndex:
+    """Precomputed top-K similar and co-rented tools for one catalog"""
+
+    def __init__(self, k=TOP_K):
+        self.k = k
+        self.similar = np.full((0, k), -1, dtype=np.int32)
+        self.similar_scores = np.zeros((0, k), dtype=np.float32)
+        self.co_rented = np.full((0, k), -1, dtype=np.int32)
+        self.co_rented_counts = np.zeros((0, k), dtype=np.float32)
+        self.tools_version = None
+        self.bookings_version = None
+        self.last_booking_id = 0
+        self._history = {}
+        self._lock = threading.Lock()
+
+    # Feature extraction ---------------------------------------------------
+    def _features(self, catalog):
+        type_codes, _ = catalog.codes("tool_type")
+        brand_codes, _ = catalog.codes("brand")
+        hood_codes, _ = catalog.codes("neighborhood")
+        rates = catalog.column("daily_rate").astype(np.float64)
+        edges = np.quantile(rates, np.linspace(0, 1, PRICE_BANDS + 1)[1:-1]) if len(rates) else []
+        return {
+            "type": type_codes,
+            "brand": brand_codes,
+            "hood": hood_codes,
+            "band": np.digitize(rates, edges).astype(np.int8),
+            "lat": catalog.column("latitude").astype(np.float64),
+            "lon": catalog.column("longitude").astype(np.float64)
+        }
+
+    def _score(self, f, rows, candidates):
+        """Score candidate positions (rows x C) against each row's tool"""
+        r = rows[:, None]
+        score = TYPE_WEIGHT * (f["type"][candidates] == f["type"][r])
+        score = score + BRAND_WEIGHT * (f["brand"][candidates] == f["brand"][r])
+        band_gap = np.minimum(np.abs(f["band"][candidates].astype(np.int16) - f["band"][r]), 2)
+        score = score + PRICE_WEIGHT * (1 - band_gap / 2)
+        km = _approx_km(f["lat"][r], f["lon"][r], f["lat"][candidates], f["lon"][candidates])
+        score = score + DISTANCE_WEIGHT * np.exp(-km / DISTANCE_SCALE_KM)
+        return np.where(candidates == r, -np.inf, score)
+
+    # Item-item similarity -------------------------------------------------
+    def build_similar(self, catalog):
+        """Recompute the similar-tools table for the whole catalog"""
+        n = len(catalog)
+        self.similar = np.full((n, self.k), -1, dtype=np.int32)
+        self.similar_scores = np.zeros((n, self.k), dtype=np.float32)
+        if n < 2:
+            return
+
+        f = self._features(catalog)
+        order = np.lexsort((f["brand"], f["band"], f["hood"], f["type"]))
+        rank = np.empty(n, dtype=np.int64)
+        rank[order] = np.arange(n)
+        offsets = np.concatenate([np.arange(-WINDOW, 0), np.arange(1, WINDOW + 1)])
+
+        for start in range(0, n, SCORE_BLOCK_ROWS):
+            rows = order[start:start + SCORE_BLOCK_ROWS]
+            # Clip the window at the ends of the sorted order (duplicates are
+            # harmless: they only repeat a candidate that is scored the same)
+            window = np.clip(rank[rows][:, None] + offsets, 0, n - 1)
+            candidates = order[window]
+            scores = self._score(f, rows, candidates)
+            self.similar[rows], self.similar_scores[rows] = self._dedupe_top_k(candidates, scores)
+
+    def _dedupe_top_k(self, candidates, scores):
+        """Top-K per row after dropping repeated candidates"""
+        sort = np.argsort(candidates, axis=1, kind="stable")
+        sorted_candidates = np.take_along_axis(candidates, sort, axis=1)
+        repeated = np.zeros_like(sorted_candidates, dtype=bool)
+        repeated[:, 1:] = sorted_candidates[:, 1:] == sorted_candidates[:, :-1]
+        sorted_scores = np.take_along_axis(scores, sort, axis=1)
+        sorted_scores[repeated] = -np.inf
+        return _top_k(sorted_scores, sorted_candidates, self.k)
+
+    def refresh_similar(self, catalog, positions):
+        """Incrementally score new or changed tools against the catalog.
+
+        Each refreshed tool gets a fresh row (scored against every tool of the
+        same type) and is offered to its neighbors' rows, so existing tools
+        pick it up if it beats their current K-th neighbor.
+        """
+        n = len(catalog)
+        self._grow(n)
+
+        f = self._features(catalog)
+        for position in np.asarray(positions, dtype=np.int64):
+            candidates = np.flatnonzero(f["type"] == f["type"][position])
+            if len(candidates) < self.k + 1:
+                candidates = np.arange(n)
+            scores = self._score(f, np.array([position]), candidates[None, :])
+            row, row_scores = self._dedupe_top_k(candidates[None, :], scores)
+            self.similar[position], self.similar_scores[position] = row[0], row_scores[0]
+            for neighbor, score in zip(row[0], row_scores[0]):
+                if neighbor >= 0:
+                    self._offer(self.similar, self.similar_scores, neighbor, position, score)
+
+    def _grow(self, n):
+        """Extend every table with empty rows up to n tools"""
+        for name, fill, dtype in (("similar", -1, np.int32), ("similar_scores", 0, np.float32),
+                                  ("co_rented", -1, np.int32), ("co_rented_counts", 0, np.float32)):
+            table = getattr(self, name)
+            if len(table) < n:
+                extra = np.full((n - len(table), self.k), fill, dtype=dtype)
+                setattr(self, name, np.vstack([table, extra]))
+
+    @staticmethod
+    def _offer(table, scores, row, candidate, score):
+        """Insert candidate into a top-K row if it beats the row's worst entry"""
+        entries = table[row]
+        if candidate in entries:
+            return
+        worst = np.argmin(np.where(entries >= 0, scores[row], -np.inf))
+        if entries[worst] >= 0 and scores[row, worst] >= score:
+            return
+        entries[worst] = candidate
+        scores[row, worst] = score
+        order = np.argsort(-np.where(entries >= 0, scores[row], -np.inf), kind="stable")
+        table[row] = entries[order]
+        scores[row] = scores[row][order]
+
+    # Co-rentals -----------------------------------------------------------
+    def build_co_rented(self, catalog, bookings_df):
+        """Recompute the people-also-rented table from all bookings"""
+        n = len(catalog)
+        self.co_rented = np.full((n, self.k), -1, dtype=np.int32)
+        self.co_rented_counts = np.zeros((n, self.k), dtype=np.float32)
+        self._history = {}
+        self.last_booking_id = int(bookings_df['id'].max()) if not bookings_df.empty else 0
+        if bookings_df.empty or n == 0:
+            return
+
+        rentals = pd.DataFrame({
+            "renter": bookings_df['renter_username'].to_numpy(),
+            "booking": bookings_df['id'].to_numpy(),
+            "tool": catalog.positions(bookings_df['tool_id'].to_numpy())
+        })
+        rentals = rentals[rentals['tool'] >= 0].sort_values(["renter", "booking"], ascending=[True, False])
+        rentals = rentals[rentals.groupby("renter", sort=False).cumcount() < HISTORY]
+
+        for renter, tools in rentals.groupby("renter", sort=False)['tool']:
+            self._history[renter] = tools.to_numpy()[::-1].tolist()
+
+        pairs = rentals.merge(rentals, on="renter", suffixes=("_a", "_b"))
+        pairs = pairs[pairs['tool_a'] != pairs['tool_b']]
+        if pairs.empty:
+            return
+
+        counts = pairs.groupby(["tool_a", "tool_b"]).size().reset_index(name="count")
+        counts = counts.sort_values(["tool_a", "count"], ascending=[True, False])
+        counts = counts[counts.groupby("tool_a").cumcount() < self.k]
+        slot = counts.groupby("tool_a").cumcount().to_numpy()
+        rows = counts['tool_a'].to_numpy()
+        self.co_rented[rows, slot] = counts['tool_b'].to_numpy()
+        self.co_rented_counts[rows, slot] = counts['count'].to_numpy()
+
+    def add_booking(self, renter, position):
+        """Fold one new booking into the co-rental table in O(HISTORY * K)"""
+        self._grow(position + 1)
+        history = self._history.setdefault(renter, [])
+        for previous in set(history):
+            if previous == position:
+                continue
+            for a, b in ((previous, position), (position, previous)):
+                hit = np.flatnonzero(self.co_rented[a] == b)
+                count = self.co_rented_counts[a, hit[0]] + 1 if len(hit) else 1.0
+                if len(hit):
+                    self.co_rented[a, hit[0]] = -1
+                self._offer(self.co_rented, self.co_rented_counts, a, b, count)
+        history.append(position)
+        del history[:-HISTORY]
+
+    # Lookups --------------------------------------------------------------
+    def similar_to(self, position, k=4):
+        """Return up to k catalog positions most similar to a tool"""
+        row = self.similar[position, :k]
+        return row[row >= 0]
+
+    def also_rented(self, position, k=4):
+        """Return up to k catalog positions most often co-rented with a tool"""
+        row = self.co_rented[position, :k]
+        return row[row >= 0]
+
+    def sync(self, catalog, bookings_df, tools_stamp, bookings_stamp):
+        """Bring the index up to date with the given table versions"""
+        with self._lock:
+            if tools_stamp != self.tools_version:
+                known = len(self.similar)
+                added = len(catalog) - known
+                if self.tools_version is None or added < 0 or \
+                        added > min(MAX_INCREMENTAL_TOOLS, known // 20):
+                    self.build_similar(catalog)
+                    self.bookings_version = None  # positions may have moved
+                else:
+                    self.refresh_similar(catalog, np.arange(known, len(catalog)))
+                self.tools_version = tools_stamp
+
+            if bookings_stamp != self.bookings_version:
+                new = bookings_df[bookings_df['id'] > self.last_booking_id] \
+                    if self.bookings_version is not None else None
+                if new is None or len(new) > len(bookings_df) // 2:
+                    self.build_co_rented(catalog, bookings_df)
+                else:
+                    for renter, tool_id in zip(new['renter_username'], new['tool_id']):
+                        position = catalog.position(tool_id)
+                        if position >= 0:
+                            self.add_booking(renter, position)
+                    if not new.empty:
+                        self.last_booking_id = int(new['id'].max())
+                self.bookings_version = bookings_stamp
+
+
+@st.cache_resource
+def _shared_index():
+    return RecommendationIndex()
+
+
+def load_recommendations():
+    """Return the process-wide recommendation index, refreshed incrementally"""
+    index = _shared_index()
+    with span("load_recommendations"):
+        index.sync(load_tool_catalog(), load_bookings_data(), tools_version(), bookings_version())
+    return index
@@ -0,0 +1,186 @@
+import csv
+import io
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from data_store import DATA_DIR, _write_lock, initialize_data_directories
+from instrumentation import span
+
+# Persisted reviews with running aggregates.
+#
+# Reviews are appended to data/reviews.csv, one per completed booking. For
+# each tool and each owner the store keeps [count, sum, 1-star .. 5-star
+# histogram] and updates it on insert, so ratings never rescan the table. Each
+# tool's reviews are also kept in insertion order, so a page of reviews is a
+# list slice no matter how many the tool has.
+#
+# Other processes append to the same file: the store reads only the bytes
+# added since its last read (like the ledger), and a review is checked for
+# duplicates and appended under the cross-process write lock.
+
+REVIEWS_PATH = os.path.join(DATA_DIR, "reviews.csv")
+REVIEW_COLUMNS = [
+    "id", "booking_id", "tool_id", "owner_username", "reviewer_username",
+    "rating", "comment", "created_at"
+]
+
+REVIEWS_PER_PAGE = 5
+
+# Aggregate layout: [count, sum, stars_1, ..., stars_5]
+_COUNT, _SUM, _HIST = 0, 1, 2
+
+
+def _empty_aggregate():
+    return np.zeros(7, dtype=np.int64)
+
+
+def _summarize(aggregate):
+    count = int(aggregate[_COUNT])
+    return {
+        "count": count,
+        "average": aggregate[_SUM] / count if count else 0.0,
+        "histogram": aggregate[_HIST:].tolist()
+    }
+
+
+class ReviewStore:
+    """Append-only review table with per-tool and per-owner aggregates"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._offset = 0
+        self._tool_aggregates = {}
+        self._owner_aggregates = {}
+        self._tool_reviews = {}
+        self._reviewed_bookings = set()
+        self._next_id = 1
+        self.refresh()
+
+    def refresh(self):
+        """Apply reviews appended to the file since the last read (e.g. by another process)"""
+        with self._lock:
+            if not os.path.exists(self.path) or os.path.getsize(self.path) <= self._offset:
+                return
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                chunk = f.read()
+            # Only consume complete rows; each review is appended in one write
+            end = chunk.rfind(b"\n") + 1
+            if end == 0:
+                return
+            header = 0 if self._offset == 0 else None
+            df = pd.read_csv(io.StringIO(chunk[:end].decode("utf-8")), header=header,
+                             names=REVIEW_COLUMNS, dtype={"comment": str}, keep_default_na=False)
+            self._offset += end
+            self._apply(df)
+
+    def _apply(self, df):
+        if df.empty:
+            return
+        ratings = df['rating'].to_numpy(dtype=np.int64)
+        for aggregates, keys in ((self._tool_aggregates, df['tool_id'].astype(int)),
+                                 (self._owner_aggregates, df['owner_username'])):
+            codes, uniques = pd.factorize(keys)
+            table = np.zeros((len(uniques), 7), dtype=np.int64)
+            table[:, _COUNT] = np.bincount(codes, minlength=len(uniques))
+            table[:, _SUM] = np.bincount(codes, weights=ratings, minlength=len(uniques))
+            np.add.at(table, (codes, _HIST + ratings - 1), 1)
+            for key, row in zip(uniques.tolist(), table):
+                if key in aggregates:
+                    aggregates[key] += row
+                else:
+                    aggregates[key] = row
+
+        for review in df[REVIEW_COLUMNS].to_dict("records"):
+            self._tool_reviews.setdefault(int(review['tool_id']), []).append(review)
+        self._reviewed_bookings.update(df['booking_id'].astype(int).tolist())
+        self._next_id = max(self._next_id, int(df['id'].max()) + 1)
+
+    def has_review(self, booking_id):
+        """Return True if the booking has already been reviewed"""
+        return int(booking_id) in self._reviewed_bookings
+
+    def add_review(self, booking, owner_username, rating, comment):
+        """Add a review for a completed booking and update the aggregates"""
+        rating = int(rating)
+        if not 1 <= rating <= 5:
+            raise ValueError("Rating must be between 1 and 5.")
+        if booking['status'] != 'Completed':
+            raise ValueError("Only completed bookings can be reviewed.")
+
+        # The duplicate check and the append see every other process's reviews
+        with _write_lock, self._lock:
+            self.refresh()
+            if self.has_review(booking['id']):
+                raise ValueError("This booking has already been reviewed.")
+
+            review_id = self._next_id
+            review = {
+                "id": review_id,
+                "booking_id": int(booking['id']),
+                "tool_id": int(booking['tool_id']),
+                "owner_username": owner_username,
+                "reviewer_username": booking['renter_username'],
+                "rating": rating,
+                "comment": comment.strip(),
+                "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            }
+
+            initialize_data_directories()
+            row = io.StringIO()
+            writer = csv.writer(row)
+            if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+                writer.writerow(REVIEW_COLUMNS)
+            writer.writerow([review[c] for c in REVIEW_COLUMNS])
+            with span("write_csv"), open(self.path, "a", newline="") as f:
+                f.write(row.getvalue())
+
+            # Reading the new row back updates the aggregates and the offset
+            self.refresh()
+            return review_id
+
+    def tool_stats(self, tool_id):
+        """Return count, average and star histogram for a tool"""
+        return _summarize(self._tool_aggregates.get(int(tool_id), _empty_aggregate()))
+
+    def owner_stats(self, username):
+        """Return count, average and star histogram across an owner's tools"""
+        return _summarize(self._owner_aggregates.get(username, _empty_aggregate()))
+
+    def page(self, tool_id, page=0, per_page=REVIEWS_PER_PAGE):
+        """Return one page of a tool's reviews (newest first) and the page count"""
+        reviews = self._tool_reviews.get(int(tool_id), [])
+        pages = max(1, -(-len(reviews) // per_page))
+        page = min(max(page, 0), pages - 1)
+        end = len(reviews) - page * per_page
+        return reviews[max(end - per_page, 0):end][::-1], pages
+
+
+def tool_rating(store, tool):
+    """Return (average, count) for a tool.
+
+    Listings imported with a rating keep it until they receive reviews here.
+    """
+    stats = store.tool_stats(tool['id'])
+    if stats['count']:
+        return stats['average'], stats['count']
+    return float(tool['rating']), int(tool['review_count'])
+
+
+@st.cache_resource
+def _open_review_store():
+    return ReviewStore(REVIEWS_PATH)
+
+
+def load_review_store():
+    """Return the process-wide review store, picking up reviews added by other processes"""
+    with span("load_review_store"):
+        store = _open_review_store()
+        store.refresh()
+        return store
@@ -0,0 +1,112 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from data_store import load_bookings_data, load_tool_catalog
+from instrumentation import span
+
+# Deposit risk scoring. Once a day every renter and every tool gets a risk
+# score in [0, 1) from booking history, computed in one vectorized pass:
+#   - cancellations: bookings the renter cancelled
+#   - late returns: approved bookings still not returned after their end date
+# Rates are smoothed towards PRIOR_RISK so users with little history are
+# neither trusted nor penalized much. The booking form then reads a suggested
+# deposit from the cached scores instead of scanning bookings per request.
+#
+# The bookings table has no dispute or actual-return-date columns, so
+# "overdue and still Approved" stands in for late returns and disputes are
+# not scored.
+
+CANCEL_WEIGHT = 1.0
+LATE_WEIGHT = 2.0
+PRIOR_RISK = 0.1
+PRIOR_BOOKINGS = 5
+
+TOOL_RISK_SHARE = 0.3
+MAX_DEPOSIT_MULTIPLIER = 3.0
+DEPOSIT_STEP = 5.0
+
+
+def _smoothed_risk(incidents, counts):
+    """Bayesian-smoothed incident rate, squashed into [0, 1)"""
+    rate = (incidents + PRIOR_RISK * PRIOR_BOOKINGS) / (counts + PRIOR_BOOKINGS)
+    return 1.0 - np.exp(-rate * 2)
+
+
+class RiskScores:
+    """Per-renter and per-tool risk scores with O(1) lookups"""
+
+    def __init__(self, renters, renter_risk, tool_ids, tool_risk, computed_on):
+        self._renter_index = {name: i for i, name in enumerate(renters)}
+        self._renter_risk = renter_risk
+        self._tool_ids = tool_ids
+        self._tool_risk = tool_risk
+        self.default_risk = float(_smoothed_risk(0, 0))
+        self.computed_on = computed_on
+
+    def renter_risk(self, username):
+        """Return a renter's risk score (the prior for unknown renters)"""
+        i = self._renter_index.get(username)
+        return float(self._renter_risk[i]) if i is not None else self.default_risk
+
+    def tool_risk(self, tool_id):
+        """Return a tool's risk score (the prior for unknown tools)"""
+        i = np.searchsorted(self._tool_ids, tool_id)
+        if i >= len(self._tool_ids) or self._tool_ids[i] != tool_id:
+            return self.default_risk
+        return float(self._tool_risk[i])
+
+    def suggested_deposit(self, username, tool):
+        """Scale a tool's deposit by the combined renter and tool risk"""
+        risk = (1 - TOOL_RISK_SHARE) * self.renter_risk(username) + \
+            TOOL_RISK_SHARE * self.tool_risk(tool['id'])
+        # How far above an average newcomer this booking is, in [0, 1)
+        excess = max(risk - self.default_risk, 0.0) / (1.0 - self.default_risk)
+        multiplier = 1.0 + (MAX_DEPOSIT_MULTIPLIER - 1.0) * excess
+
+        # Tools listed without a deposit still get one for risky renters
+        base = float(tool['deposit']) if tool['deposit'] > 0 else float(tool['daily_rate']) * excess
+        return float(np.ceil(base * multiplier / DEPOSIT_STEP) * DEPOSIT_STEP)
+
+
+def compute_risk_scores(catalog, bookings_df, as_of=None):
+    """Score every renter and tool from the full bookings table"""
+    as_of = pd.Timestamp(as_of or date.today())
+
+    with span("compute_risk_scores", bookings=len(bookings_df)):
+        status = bookings_df['status'].to_numpy(dtype=object)
+        end = pd.to_datetime(bookings_df['end_date'], errors="coerce")
+        cancelled = status == "Cancelled"
+        late = (status == "Approved") & (end < as_of).to_numpy()
+        incidents = CANCEL_WEIGHT * cancelled + LATE_WEIGHT * late
+
+        renter_codes, renters = pd.factorize(bookings_df['renter_username'])
+        renter_counts = np.bincount(renter_codes[renter_codes >= 0], minlength=len(renters))
+        renter_incidents = np.bincount(renter_codes[renter_codes >= 0],
+                                       weights=incidents[renter_codes >= 0], minlength=len(renters))
+        renter_risk = _smoothed_risk(renter_incidents, renter_counts)
+
+        # Tools are only charged for late returns; cancellations are the renter's
+        positions = catalog.positions(bookings_df['tool_id'].to_numpy(dtype=np.int64))
+        found = positions >= 0
+        tool_counts = np.bincount(positions[found], minlength=len(catalog))
+        tool_incidents = np.bincount(positions[found], weights=(LATE_WEIGHT * late)[found],
+                                     minlength=len(catalog))
+        tool_risk = _smoothed_risk(tool_incidents, tool_counts)
+
+    ids = catalog.column("id")
+    order = np.argsort(ids, kind="stable")
+    return RiskScores(list(renters), renter_risk.astype(np.float32),
+                      ids[order], tool_risk[order].astype(np.float32), as_of.date())
+
+
+@st.cache_resource(max_entries=1)
+def _nightly_scores(day):
+    return compute_risk_scores(load_tool_catalog(), load_bookings_data(), day)
+
+
+def load_risk_scores():
+    """Return today's risk scores (computed once per day and shared)"""
+    return _nightly_scores(date.today().isoformat())
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+from data_generator import TOOL_COLUMNS
+
+# Explicit dtypes for the tools table. Low-cardinality text columns are
+# categoricals (stored as small integer codes, so equality filters compare
+# codes instead of strings), coordinates and prices are float32, and
+# `available` is always a real bool.
+
+TOOL_CATEGORY_COLUMNS = [
+    "tool_type", "brand", "condition", "neighborhood",
+    "owner_username", "owner_name", "image_url"
+]
+
+TOOL_DTYPES = {
+    "id": np.int32,
+    "title": object,
+    "description": object,
+    "hourly_rate": np.float32,
+    "daily_rate": np.float32,
+    "deposit": np.float32,
+    "latitude": np.float32,
+    "longitude": np.float32,
+    "rating": np.float64,
+    "review_count": np.int32,
+    "image_path": object,
+    "available": bool,
+    **{column: "category" for column in TOOL_CATEGORY_COLUMNS}
+}
+
+_TRUE_STRINGS = {"true", "1", "yes"}
+
+
+def to_bool(series):
+    """Coerce a column holding bools, 0/1 or 'True'/'False' strings to bool"""
+    if series.dtype == bool:
+        return series
+    if pd.api.types.is_numeric_dtype(series):
+        return series.fillna(0).astype(bool)
+    return series.astype(str).str.strip().str.lower().isin(_TRUE_STRINGS)
+
+
+def enforce_tools_schema(df):
+    """Return the tools table with every known column cast to its schema dtype.
+
+    Missing numeric values become 0 so integer columns stay integers; columns
+    outside the schema are kept as-is after the known ones.
+    """
+    df = df.copy()
+    for column, dtype in TOOL_DTYPES.items():
+        if column not in df.columns:
+            continue
+        if column == "available":
+            df[column] = to_bool(df[column])
+        elif dtype == "category":
+            if not isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype("category")
+        elif dtype is object:
+            df[column] = df[column].astype(object)
+        else:
+            df[column] = pd.to_numeric(df[column], errors="coerce").fillna(0).astype(dtype)
+
+    known = [c for c in TOOL_COLUMNS if c in df.columns]
+    return df[known + [c for c in df.columns if c not in known]]
+
+
+def read_tools_csv(path):
+    """Read tools.csv (a path or an open file) straight into the schema dtypes"""
+    # Categoricals are parsed directly by read_csv; numeric and bool columns
+    # are coerced afterwards so legacy files with blanks or 'True' strings load.
+    # Free-text columns are read as str so sparsely filled ones (e.g. imported
+    # listings without a description) don't get mixed-type chunks.
+    df = pd.read_csv(path, dtype={
+        **{c: str for c, dtype in TOOL_DTYPES.items() if dtype is object},
+        **{c: "category" for c in TOOL_CATEGORY_COLUMNS}
+    })
+    return enforce_tools_schema(df)
+
+
+def memory_usage_per_row(df):
+    """Return the deep memory footprint of a table in bytes per row"""
+    return df.memory_usage(deep=True).sum() / max(len(df), 1)
@@ -0,0 +1,170 @@
+import argparse
+import json
+import os
+import re
+
+import numpy as np
+
+from data_generator import NEIGHBORHOODS
+
+# Multi-city sharding of the tools table.
+#
+# Each city's listings live in their own shard (a tools.csv of its own), so a
+# search only reads, caches and ranks one city and adding a city never grows
+# another city's tables or indexes. The default city keeps the original
+# data/tools.csv; other cities are registered in data/cities.json and stored
+# under data/shards/<city>/tools.csv.
+#
+# The router maps a neighborhood (or a coordinate, via the nearest
+# neighborhood) to its city, and a tool id to its city without any lookup:
+# shard k owns ids k * ID_BLOCK + 1 ... (k + 1) * ID_BLOCK.
+
+DATA_DIR = "data"
+CITIES_PATH = os.path.join(DATA_DIR, "cities.json")
+SHARDS_DIR = os.path.join(DATA_DIR, "shards")
+
+DEFAULT_CITY = "New York"
+ID_BLOCK = 10_000_000  # tool ids stay within int32 for up to 214 shards
+
+
+def city_slug(city):
+    """Return the directory name used for a city's shard"""
+    return re.sub(r"[^a-z0-9]+", "-", city.lower()).strip("-")
+
+
+class ShardRouter:
+    """Routes neighborhoods, coordinates and tool ids to city shards"""
+
+    def __init__(self, cities):
+        # cities: [(name, {neighborhood: (lat, lon)})], shard k = position k
+        self.cities = [name for name, _ in cities]
+        self._shard = {name: k for k, name in enumerate(self.cities)}
+        self.neighborhoods = {name: dict(hoods) for name, hoods in cities}
+        self._city_of = {hood: name for name, hoods in reversed(cities) for hood in hoods}
+
+        points = [(hood, name, lat, lon) for name, hoods in cities for hood, (lat, lon) in hoods.items()]
+        self._point_cities = [name for _, name, _, _ in points]
+        self._points = np.array([(lat, lon) for *_, lat, lon in points], dtype=np.float64).reshape(-1, 2)
+
+    def shard(self, city):
+        """Return the shard number of a city"""
+        if city not in self._shard:
+            raise ValueError(f"Unknown city: {city}")
+        return self._shard[city]
+
+    def tools_path(self, city=None):
+        """Return the tools.csv path of a city's shard"""
+        city = city or DEFAULT_CITY
+        if self.shard(city) == 0:
+            return os.path.join(DATA_DIR, "tools.csv")
+        return os.path.join(SHARDS_DIR, city_slug(city), "tools.csv")
+
+    def first_id(self, city=None):
+        """Return the first tool id of a city's id block"""
+        return self.shard(city or DEFAULT_CITY) * ID_BLOCK + 1
+
+    def last_id(self, city=None):
+        """Return the last tool id of a city's id block"""
+        return (self.shard(city or DEFAULT_CITY) + 1) * ID_BLOCK
+
+    def city_for_neighborhood(self, neighborhood):
+        """Return the city a neighborhood belongs to.
+
+        Neighborhoods outside the registry (e.g. synthetic ones from the data
+        generator) belong to the default city.
+        """
+        return self._city_of.get(neighborhood, DEFAULT_CITY)
+
+    def city_for_point(self, lat, lon):
+        """Return the city of the registered neighborhood nearest to a coordinate"""
+        if not len(self._points):
+            return DEFAULT_CITY
+        # Equirectangular distance is enough to pick the nearest centroid
+        d_lat = self._points[:, 0] - lat
+        d_lon = (self._points[:, 1] - lon) * np.cos(np.radians(lat))
+        return self._point_cities[int(np.argmin(d_lat ** 2 + d_lon ** 2))]
+
+    def shards_for_tools(self, tool_ids):
+        """Return the shard number of each tool id (-1 outside every registered block)"""
+        tool_ids = np.asarray(tool_ids, dtype=np.int64)
+        shards = (tool_ids - 1) // ID_BLOCK
+        return np.where((tool_ids > 0) & (shards < len(self.cities)), shards, -1)
+
+    def city_for_tool(self, tool_id):
+        """Return the city whose id block contains tool_id (ids below 1 map to the default city)"""
+        shard = int(self.shards_for_tools(max(int(tool_id), 1)))
+        return self.cities[shard] if shard >= 0 else None
+
+
+def _read_registry(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f).get("cities", [])
+
+
+_router_cache = {}
+
+
+def load_router(path=CITIES_PATH):
+    """Return the router for the current city registry (re-read when it changes)"""
+    version = os.stat(path).st_mtime_ns if os.path.exists(path) else 0
+    router = _router_cache.get(path)
+    if router is None or router.version != version:
+        cities = [(DEFAULT_CITY, NEIGHBORHOODS)] + [
+            (city["name"], {hood: tuple(loc) for hood, loc in city["neighborhoods"].items()})
+            for city in _read_registry(path)
+        ]
+        router = ShardRouter(cities)
+        router.version = version
+        _router_cache[path] = router
+    return router
+
+
+def add_city(name, neighborhoods, path=CITIES_PATH):
+    """Register a city with its {neighborhood: (lat, lon)} table"""
+    if not neighborhoods:
+        raise ValueError("A city needs at least one neighborhood")
+    if name in load_router(path).cities:
+        raise ValueError(f"City already registered: {name}")
+
+    registry = _read_registry(path)
+    registry.append({"name": name, "neighborhoods": {h: list(loc) for h, loc in neighborhoods.items()}})
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"cities": registry}, f, indent=2)
+    return load_router(path).shard(name)
+
+
+def main(argv=None):
+    """Command line entry point for registering cities"""
+    parser = argparse.ArgumentParser(description="Manage ToolShare city shards")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list")
+    add = sub.add_parser("add")
+    add.add_argument("name")
+    add.add_argument("neighborhoods", help='JSON object, e.g. {"Back Bay": [42.350, -71.081]}')
+    add.add_argument("--listings", type=int, default=0, help="also generate demo listings")
+    add.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.command == "add":
+        neighborhoods = {h: tuple(loc) for h, loc in json.loads(args.neighborhoods).items()}
+        shard = add_city(args.name, neighborhoods)
+        print(f"Registered {args.name} as shard {shard}")
+        if args.listings:
+            from data_generator import generate_tools
+            from data_store import append_tools, load_user_data
+
+            tools = generate_tools(args.listings, load_user_data(), neighborhoods, args.seed)
+            ids = append_tools([tools.drop(columns="id")])
+            print(f"Generated {sum(len(r) for r in ids.values()):,} listings in {args.name}")
+
+    router = load_router()
+    for city in router.cities:
+        print(f"{router.shard(city):>3}  {city:<20} {router.tools_path(city)}  "
+              f"{len(router.neighborhoods[city])} neighborhoods")
+
+
+if __name__ == "__main__":
+    main()
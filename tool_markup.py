@@ -0,0 +1,168 @@
+import threading
+
+import numpy as np
+import streamlit as st
+
+from data_store import load_tool_catalog
+from instrumentation import span
+from shards import load_router
+
+# Escaped HTML for the Find Tools map popups and the tool cards.
+#
+# The markup of a set of tools is rendered in one pass over the catalog
+# columns: each column is read for all the tools at once, escaped by a NumPy
+# ufunc (categorical columns escape each distinct category once) and joined
+# into the template with element-wise string concatenation, instead of one
+# f-string per row. Every listing value is escaped, so a title containing
+# HTML shows as text instead of breaking the page. Backticks and "$" are
+# escaped too: folium puts popups and tooltips inside JavaScript template
+# literals, and Streamlit markdown reads "$...$" as LaTeX.
+#
+# Rendered markup is memoized per (tool id, catalog version), so a rerun, or
+# a search whose results overlap earlier ones, only renders the tools not
+# seen since the tools table last changed.
+
+MAX_CACHED_MARKUP = 20_000
+
+_ESCAPES = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#x27;",
+                          "`": "&#96;", "$": "&#36;"})
+
+
+def _escape_value(value, length):
+    if value is None or value != value:  # None or NaN
+        return ""
+    return str(value)[:length].translate(_ESCAPES)
+
+
+_escape = np.frompyfunc(_escape_value, 2, 1)
+
+
+def escape_text(values, length=None):
+    """HTML-escape an array of values (missing values become empty strings).
+
+    With `length`, each value is cut to that many characters before escaping.
+    """
+    return _escape(np.asarray(values, dtype=object), length).astype(object)
+
+
+def _format(pattern, values):
+    return np.char.mod(pattern, np.asarray(values)).astype(object)
+
+
+def _text(catalog, column, positions, length=None):
+    if catalog.is_categorical(column):
+        codes, categories = catalog.codes(column)
+        used, inverse = np.unique(codes[positions], return_inverse=True)
+        # Each distinct category is escaped once
+        values = np.where(used >= 0, categories[np.maximum(used, 0)], None)
+        return escape_text(values, length)[inverse]
+    return escape_text(catalog.take(column, positions), length)
+
+
+def _popup_head(catalog, positions):
+    # Everything up to the distance, which differs between searches
+    return ('<div style="width: 200px;"><img src="' + _text(catalog, "image_url", positions) +
+            '" style="width: 100%; height: auto; border-radius: 4px; margin-bottom: 8px;"><h4>' +
+            _text(catalog, "title", positions) + "</h4><p><strong>$" +
+            _format("%.2f", catalog.take("daily_rate", positions)) + "/day</strong></p><p>" +
+            _text(catalog, "neighborhood", positions) + " · ")
+
+
+def _popup_tail(catalog, positions):
+    return (" km away</p><p>Rating: " + _format("%s", catalog.take("rating", positions)) + "/5 (" +
+            _format("%d", catalog.take("review_count", positions)) + " reviews)</p>" +
+            "<p><a href=\"#\" onclick=\"parent.postMessage({type: 'tool_selected', id: " +
+            _format("%d", catalog.take("id", positions)) + "}, '*');\">View Details</a></p></div>")
+
+
+def _tooltip(catalog, positions):
+    return _text(catalog, "title", positions)
+
+
+def _card(catalog, positions):
+    return ("<h3>" + _text(catalog, "title", positions) + "</h3><p><strong>$" +
+            _format("%.2f", catalog.take("daily_rate", positions)) + "/day</strong> · " +
+            _text(catalog, "neighborhood", positions) + "</p><p>" +
+            _text(catalog, "description", positions, 100) + "...</p>")
+
+
+def _profile_card(catalog, positions):
+    status = np.where(catalog.take("available", positions), "Available", "Not Available")
+    return ("<h3>" + _text(catalog, "title", positions) + "</h3><p><strong>$" +
+            _format("%.2f", catalog.take("daily_rate", positions)) + "/day</strong> · " +
+            _text(catalog, "neighborhood", positions) + "</p><p><strong>Status:</strong> " +
+            status.astype(object) + "</p>")
+
+
+TEMPLATES = {
+    "popup_head": _popup_head,
+    "popup_tail": _popup_tail,
+    "tooltip": _tooltip,
+    "card": _card,
+    "profile_card": _profile_card,
+}
+
+
+class MarkupCache:
+    """Rendered markup of one template per tool id, tagged with its catalog version"""
+
+    def __init__(self, render, max_entries=MAX_CACHED_MARKUP):
+        self._render = render
+        self._max_entries = max_entries
+        self._entries = {}  # tool id -> (catalog version, markup)
+        self._lock = threading.Lock()
+
+    def get(self, catalog, positions):
+        """Return the markup of the tools at `positions`, rendering only the missing ones"""
+        positions = np.asarray(positions, dtype=np.int64)
+        ids = catalog.take("id", positions).tolist()
+        with self._lock:
+            cached = [self._entries.get(tool_id) for tool_id in ids]
+        markup = np.empty(len(ids), dtype=object)
+        markup[:] = [entry[1] if entry is not None and entry[0] == catalog.version else None
+                     for entry in cached]
+        missing = np.flatnonzero([value is None for value in markup])
+        if len(missing) == 0:
+            return markup
+
+        with span("render_markup", rows=len(missing)):
+            markup[missing] = self._render(catalog, positions[missing])
+        with self._lock:
+            for k in missing.tolist():
+                self._entries.pop(ids[k], None)
+                self._entries[ids[k]] = (catalog.version, markup[k])
+            # Dicts keep insertion order, so the first entries are the oldest
+            while len(self._entries) > self._max_entries:
+                del self._entries[next(iter(self._entries))]
+        return markup
+
+
+@st.cache_resource
+def _shared_markup():
+    return {name: MarkupCache(render) for name, render in TEMPLATES.items()}
+
+
+def tool_markup(template, catalog, positions):
+    """Return a template's escaped HTML for the tools at catalog positions"""
+    return _shared_markup()[template].get(catalog, positions)
+
+
+def tool_markup_for_ids(template, tool_ids):
+    """Return a template's HTML for tool ids from any city (None for unknown ids)"""
+    tool_ids = np.asarray(tool_ids, dtype=np.int64)
+    markup = np.full(len(tool_ids), None, dtype=object)
+    router = load_router()
+    shard_of = router.shards_for_tools(tool_ids)
+    for shard in np.unique(shard_of[shard_of >= 0]):
+        rows = np.flatnonzero(shard_of == shard)
+        catalog = load_tool_catalog(router.cities[shard])
+        positions = catalog.positions(tool_ids[rows])
+        found = positions >= 0
+        markup[rows[found]] = tool_markup(template, catalog, positions[found])
+    return markup
+
+
+def map_popups(catalog, positions, distances):
+    """Return the map popup HTML of the tools at positions, with their distances in km"""
+    return (tool_markup("popup_head", catalog, positions) + _format("%.1f", distances) +
+            tool_markup("popup_tail", catalog, positions))
@@ -1,28 +1,12 @@
 import streamlit as st
 import pandas as pd
-import folium
-from streamlit_folium import folium_static
-import plotly.express as px
 from datetime import datetime, timedelta
 import os
-import random
-from utils import create_tool_map, generate_mock_reviews, format_currency, get_placeholder_image_url
-
-
-# UI Component for tool cards in grid view
-def render_tool_card(tool, key_prefix="tool"):
-    """Render a card for a tool in grid view"""
-    st.image(get_placeholder_image_url(tool['title']), use_column_width=True)
-    st.markdown(f"### {tool['title']}")
-    st.write(f"**{format_currency(tool['daily_rate'])}/day** · {tool['neighborhood']}")
-    st.write(f"Rating: {tool['rating']}/5 ({tool['review_count']} reviews)")
-
-    if st.button(f"View Details", key=f"{key_prefix}_{tool['id']}"):
-        st.session_state.selected_tool = tool['id']
-        st.session_state.page = 'tool_details'
-        st.rerun()
-
-    st.divider()
+import html
+from data_store import get_tool, random_location
+from notifications import load_inbox
+from reviews import load_review_store
+from utils import format_currency, get_placeholder_image_url
 
 
 # UI Component for the metrics dashboard
@@ -122,6 +106,13 @@ def render_sidebar(users_df):
                 st.session_state.page = 'bookings'
                 st.rerun()
 
+            # Badge reads the maintained unread counter, not the bookings table
+            unread = load_inbox().unread_count(st.session_state.current_user)
+            if st.button(f"🔔 Notifications ({unread})" if unread else "🔔 Notifications",
+                         use_container_width=True):
+                st.session_state.page = 'notifications'
+                st.rerun()
+
         st.divider()
         st.markdown("### About")
         st.markdown("""
@@ -176,7 +167,7 @@ def render_booking_form(tool):
             if duration_days == 0:
                 duration_days = 1  # Minimum 1 day
 
-            total_cost = duration_days * tool['daily_rate']
+            total_cost = round(duration_days * float(tool['daily_rate']), 2)
             st.write(f"**Duration:** {duration_days} days")
             st.write(f"**Total Cost:** {format_currency(total_cost)}")
 
@@ -251,21 +242,8 @@ def render_add_tool_form(tools_df, users_df):
             # Get user data
             user_data = users_df[users_df['username'] == st.session_state.current_user].iloc[0]
 
-            # Prepare neighborhood coordinates (in a real app, would use geocoding)
-            neighborhood_data = {
-                "Downtown": (40.7128, -74.0060),
-                "Midtown": (40.7549, -73.9840),
-                "Uptown": (40.8075, -73.9626),
-                "Brooklyn Heights": (40.6950, -73.9950),
-                "Williamsburg": (40.7081, -73.9571),
-                "Astoria": (40.7636, -73.9232),
-                "Park Slope": (40.6710, -73.9814),
-                "Long Island City": (40.7447, -73.9485)
-            }
-
-            base_lat, base_lon = neighborhood_data.get(neighborhood, (40.7128, -74.0060))
-            lat = base_lat + random.uniform(-0.01, 0.01)
-            lon = base_lon + random.uniform(-0.01, 0.01)
+            # Neighborhood coordinates come from the shared lookup (in a real app, would use geocoding)
+            lat, lon = random_location(neighborhood)
 
             # Return tool data
             return {
@@ -306,15 +284,12 @@ def render_user_bookings(bookings_df, tools_df, is_owner=False):
 
     # Display bookings in cards
     for _, booking in bookings_df.iterrows():
-        # Get tool details
-        tool_id = booking['tool_id']
-        tool_data = tools_df[tools_df['id'] == tool_id]
+        # Get tool details (from whichever city shard holds the tool)
+        tool = get_tool(booking['tool_id'])
 
-        if tool_data.empty:
+        if tool is None:
             continue
 
-        tool = tool_data.iloc[0]
-
         col1, col2, col3 = st.columns([2, 2, 1])
 
         with col1:
@@ -359,65 +334,45 @@ def render_user_bookings(bookings_df, tools_df, is_owner=False):
     return None
 
 
-# UI Component for displaying user's tools
-def render_user_tools(user_tools):
-    """Render the user's tool listings"""
-    if user_tools.empty:
-        st.info("You haven't listed any tools yet.")
-        if st.button("Add Your First Tool"):
-            st.session_state.page = 'add_listing'
-            st.rerun()
-        return None
-
-    for _, tool in user_tools.iterrows():
-        col1, col2, col3 = st.columns([3, 2, 1])
-
-        with col1:
-            st.markdown(f"### {tool['title']}")
-            st.markdown(f"{tool['description'][:100]}...")
-
-        with col2:
-            st.markdown(f"**Daily Rate:** {format_currency(tool['daily_rate'])}")
-            st.markdown(f"**Status:** {'Available' if tool['available'] else 'Not Available'}")
-
-        with col3:
-            if st.button("Edit", key=f"edit_{tool['id']}"):
-                # In a real app, this would take you to an edit page
-                st.info("Edit functionality not implemented in the demo.")
-                return None
+# UI Component for displaying tool reviews
+def render_tool_reviews(tool):
+    """Render one page of a tool's reviews with a star histogram"""
+    store = load_review_store()
+    stats = store.tool_stats(tool['id'])
 
-            if tool['available']:
-                if st.button("Mark Unavailable", key=f"unavail_{tool['id']}"):
-                    return {'action': 'mark_unavailable', 'tool_id': tool['id']}
-            else:
-                if st.button("Mark Available", key=f"avail_{tool['id']}"):
-                    return {'action': 'mark_available', 'tool_id': tool['id']}
+    st.markdown("### Reviews")
 
-        st.divider()
+    if stats['count'] == 0:
+        st.info("This tool has no reviews yet.")
+        return
 
-    return None
+    st.markdown(f"**{stats['average']:.1f}/5** from {stats['count']} reviews")
+    for stars in range(5, 0, -1):
+        share = stats['histogram'][stars - 1] / stats['count']
+        st.progress(share, text=f"{'⭐' * stars} {stats['histogram'][stars - 1]}")
 
+    # Only the current page is fetched, however many reviews the tool has
+    page_key = f"review_page_{tool['id']}"
+    reviews, pages = store.page(tool['id'], st.session_state.get(page_key, 0))
 
-# UI Component for displaying tool reviews
-def render_tool_reviews(tool):
-    """Render reviews for a tool"""
-    st.markdown("### Reviews")
+    for review in reviews:
+        st.markdown(f"""
+        <div class="card">
+            <p>{'⭐' * int(review['rating'])} - {html.escape(str(review['reviewer_username']))} ({review['created_at'][:10]})</p>
+            <p><em>"{html.escape(str(review['comment']))}"</em></p>
+        </div>
+        """, unsafe_allow_html=True)
 
-    # Generate some mock reviews
-    review_count = min(3, tool['review_count'])
-    if review_count > 0:
-        reviews = generate_mock_reviews(review_count)
-
-        for review in reviews:
-            st.markdown(f"""
-            <div class="card">
-                <p>⭐ {review['rating']}/5</p>
-                <p><em>"{review['comment']}"</em></p>
-                <p>- Anonymous User, {review['date']}</p>
-            </div>
-            """, unsafe_allow_html=True)
-
-        if tool['review_count'] > 3:
-            st.button(f"View all {tool['review_count']} reviews")
-    else:
-        st.info("This tool has no reviews yet.")
\ No newline at end of file
+    if pages > 1:
+        page = min(st.session_state.get(page_key, 0), pages - 1)
+        prev_col, info_col, next_col = st.columns([1, 2, 1])
+        with prev_col:
+            if st.button("← Newer", key=f"{page_key}_prev", disabled=page == 0):
+                st.session_state[page_key] = page - 1
+                st.rerun()
+        with info_col:
+            st.write(f"Page {page + 1} of {pages}")
+        with next_col:
+            if st.button("Older →", key=f"{page_key}_next", disabled=page >= pages - 1):
+                st.session_state[page_key] = page + 1
+                st.rerun()
@@ -0,0 +1,181 @@
+import os
+import threading
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from data_store import (
+    bookings_version, get_bookings, get_swaps, load_bookings_data, load_tool_catalog,
+    load_tool_swap_data, swaps_version, tools_version
+)
+from instrumentation import span
+from schema import enforce_tools_schema
+from shards import DEFAULT_CITY, load_router
+
+# Per-user materialized views for the profile, bookings and tool swap pages.
+#
+# For every user the views hold the ids of the tools they own (per city
+# shard), the bookings they made, the bookings of their tools (rental
+# requests), and the swaps they proposed and received. Pages read their rows
+# by id through data_store's hash indexes, so they cost O(the user's own
+# rows) however large the tables are.
+#
+# The views are built with one pass over each table and then maintained
+# incrementally: rows are only ever appended to these tables (edits change a
+# status or availability, never an owner, renter or tool id), so when a
+# table's version changes only the rows past the last one seen are folded in.
+# Status updates fold in nothing. A table that was rewritten rather than
+# appended to (it shrank, or the last row seen changed) is regrouped.
+
+_EMPTY_IDS = np.zeros(0, dtype=np.int64)
+
+
+def _tool_owners(tool_ids):
+    """Return the owner username of each tool id (None if the tool is unknown)"""
+    tool_ids = np.asarray(tool_ids, dtype=np.int64)
+    owners = np.full(len(tool_ids), None, dtype=object)
+    router = load_router()
+    shard_of = router.shards_for_tools(tool_ids)
+    for shard in np.unique(shard_of[shard_of >= 0]):
+        rows = np.flatnonzero(shard_of == shard)
+        catalog = load_tool_catalog(router.cities[shard])
+        positions = catalog.positions(tool_ids[rows])
+        found = positions >= 0
+        codes, names = catalog.codes('owner_username')
+        codes = codes[positions[found]]
+        owners[rows[found]] = np.where(codes >= 0, names[np.maximum(codes, 0)], None)
+    return owners
+
+
+class UserViews:
+    """Per-user tool, booking and swap ids, caught up from each table's new rows"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._synced = {}  # table -> (version, rows seen, last id seen)
+        self._views = {}   # table -> {view name -> {username -> [ids]}}
+
+    def _view(self, table, name):
+        return self._views.setdefault(table, {}).setdefault(name, defaultdict(list))
+
+    def _sync_table(self, table, version, ids, add):
+        synced = self._synced.get(table)
+        if synced is not None and synced[0] == version:
+            return
+        start = 0
+        if synced is not None:
+            _, seen, last_id = synced
+            if seen <= len(ids) and (seen == 0 or ids[seen - 1] == last_id):
+                start = seen
+        if start == 0:
+            self._views.pop(table, None)
+        if start < len(ids):
+            with span("sync_user_views", table=table, rows=len(ids) - start):
+                add(start)
+        self._synced[table] = (version, len(ids), ids[-1] if len(ids) else None)
+
+    def _add(self, table, name, usernames, ids):
+        # Grouped with one sort, so the first build is vectorized (None and NaN are skipped)
+        view = self._view(table, name)
+        codes, uniques = pd.factorize(np.asarray(usernames, dtype=object))
+        keep = codes >= 0
+        codes, ids = codes[keep], np.asarray(ids)[keep]
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        for i, username in enumerate(uniques.tolist()):
+            view[username].extend(ids[order[bounds[i]:bounds[i + 1]]].tolist())
+
+    def sync(self):
+        """Bring the views up to date with the current table versions"""
+        with self._lock:
+            router = load_router()
+            for city in router.cities:
+                if city != DEFAULT_CITY and not os.path.exists(router.tools_path(city)):
+                    continue
+                catalog = load_tool_catalog(city)
+                ids = catalog.column('id')
+
+                def add_tools(start, catalog=catalog, ids=ids, city=city):
+                    codes, names = catalog.codes('owner_username')
+                    codes = codes[start:]
+                    owners = np.where(codes >= 0, names[np.maximum(codes, 0)], None)
+                    self._add(("tools", city), "owned", owners, ids[start:])
+
+                self._sync_table(("tools", city), tools_version(city), ids, add_tools)
+
+            bookings_df = load_bookings_data()
+            booking_ids = bookings_df['id'].to_numpy()
+
+            def add_bookings(start):
+                new = bookings_df.iloc[start:]
+                self._add("bookings", "rentals", new['renter_username'].to_numpy(), booking_ids[start:])
+                self._add("bookings", "requests", _tool_owners(new['tool_id'].to_numpy()),
+                          booking_ids[start:])
+
+            self._sync_table("bookings", bookings_version(), booking_ids, add_bookings)
+
+            swap_df = load_tool_swap_data()
+            swap_ids = swap_df['id'].to_numpy()
+
+            def add_swaps(start):
+                new = swap_df.iloc[start:]
+                self._add("swaps", "outgoing", new['proposer_username'].to_numpy(), swap_ids[start:])
+                self._add("swaps", "incoming", new['receiver_username'].to_numpy(), swap_ids[start:])
+
+            self._sync_table("swaps", swaps_version(), swap_ids, add_swaps)
+
+    def _ids(self, table, name, username):
+        with self._lock:
+            ids = self._views.get(table, {}).get(name, {}).get(username)
+            return np.array(ids, dtype=np.int64) if ids else _EMPTY_IDS
+
+    def _owned_by_city(self, username):
+        with self._lock:
+            cities = [table[1] for table in self._views if table[0] == "tools"]
+        return [(city, self._ids(("tools", city), "owned", username)) for city in cities]
+
+    def owned_tools(self, username):
+        """Return the user's listings in every city as a tools DataFrame"""
+        frames = []
+        for city, ids in self._owned_by_city(username):
+            if len(ids):
+                catalog = load_tool_catalog(city)
+                positions = catalog.positions(ids)
+                frames.append(catalog.to_frame(positions[positions >= 0]))
+        if not frames:
+            return load_tool_catalog().to_frame(_EMPTY_IDS)
+        if len(frames) == 1:
+            return frames[0]
+        # Union the categories so shards with different neighborhoods concat cleanly
+        return enforce_tools_schema(pd.concat([f.astype(object) for f in frames], ignore_index=True))
+
+    def rentals(self, username):
+        """Return the bookings the user made"""
+        return get_bookings(self._ids("bookings", "rentals", username))
+
+    def rental_requests(self, username):
+        """Return the bookings of the user's tools"""
+        return get_bookings(self._ids("bookings", "requests", username))
+
+    def outgoing_swaps(self, username):
+        """Return the swaps the user proposed"""
+        return get_swaps(self._ids("swaps", "outgoing", username))
+
+    def incoming_swaps(self, username):
+        """Return the swaps proposed to the user"""
+        return get_swaps(self._ids("swaps", "incoming", username))
+
+
+@st.cache_resource
+def _shared_views():
+    return UserViews()
+
+
+def load_user_views():
+    """Return the process-wide per-user views, caught up with every table"""
+    views = _shared_views()
+    with span("load_user_views"):
+        views.sync()
+    return views
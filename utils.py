@@ -1,11 +1,7 @@
 import streamlit as st
 import pandas as pd
-import folium
-from streamlit_folium import folium_static
-import plotly.express as px
 from datetime import datetime, timedelta
 import os
-from PIL import Image
 import random
 import base64
 
@@ -74,7 +70,10 @@ def load_css():
 
 # Function to create a map with tool markers
 def create_tool_map(tools_df, center_lat=None, center_lon=None, zoom_start=13):
-    """Create a Folium map with markers for tool locations"""
+    """Create a Folium map with markers for tool locations (listing text is HTML-escaped)"""
+    import folium
+    from tool_markup import escape_text
+
     if center_lat is None or center_lon is None:
         # Use average coordinates if not specified
         center_lat = tools_df['latitude'].mean()
@@ -82,12 +81,15 @@ def create_tool_map(tools_df, center_lat=None, center_lon=None, zoom_start=13):
 
     m = folium.Map(location=[center_lat, center_lon], zoom_start=zoom_start)
 
+    titles = escape_text(tools_df['title'])
+    neighborhoods = escape_text(tools_df['neighborhood'])
+
     # Add markers for each tool
-    for _, tool in tools_df.iterrows():
+    for (_, tool), title, neighborhood in zip(tools_df.iterrows(), titles, neighborhoods):
         popup_html = f"""
-        <strong>{tool['title']}</strong><br>
-        ${tool['daily_rate']}/day<br>
-        {tool['neighborhood']}<br>
+        <strong>{title}</strong><br>
+        &#36;{tool['daily_rate']:.2f}/day<br>
+        {neighborhood}<br>
         Rating: {tool['rating']}/5 ({tool['review_count']} reviews)<br>
         <a href="#" onclick="parent.postMessage({{type: 'tool_selected', id: {tool['id']}}}, '*');">View Details</a>
         """
@@ -95,7 +97,7 @@ def create_tool_map(tools_df, center_lat=None, center_lon=None, zoom_start=13):
         folium.Marker(
             [tool['latitude'], tool['longitude']],
             popup=folium.Popup(popup_html, max_width=300),
-            tooltip=tool['title'],
+            tooltip=title,
             icon=folium.Icon(color="green", icon="wrench", prefix="fa")
         ).add_to(m)
 
@@ -105,6 +107,8 @@ def create_tool_map(tools_df, center_lat=None, center_lon=None, zoom_start=13):
 # Function to create impact visualizations
 def create_impact_chart(chart_type="money_saved"):
     """Create a Plotly chart for community impact visualization"""
+    import plotly.express as px
+
     # Sample data for the hackathon demo
     months = ["Jan", "Feb", "Mar", "Apr", "May"]
     impact_data = pd.DataFrame({
@@ -159,7 +163,7 @@ def get_placeholder_image_url(text, width=300, height=200):
 # Function to calculate metrics for the dashboard
 def calculate_dashboard_metrics(tools_df, bookings_df):
     """Calculate metrics for the dashboard"""
-    available_tools = len(tools_df[tools_df['available'] == True])
+    available_tools = len(tools_df[tools_df['available']])
 
     # For demo purposes, we'll use fixed values for some metrics
     # In a real app, these would be calculated from actual data